@@ -0,0 +1,349 @@
+"""
+Columnar, indexed store for Wireshark CSV exports of MQTT captures.
+
+A capture such as challenge2023_2.csv (No., Time, Source, Destination,
+Protocol, Length, Source Port, Destination Port, Info, Message) is
+converted once into a directory of NumPy columns, memory-mapped back in
+when opened:
+
+    python capturestore.py convert ../resources/challenge2023_2.csv capture.cols
+    python capturestore.py query capture.cols --kind "Publish Message" --unit C
+
+There are two tables.  frames has one row per CSV row; messages has one
+row per item of the Info column ("Publish Message [hospital/room1]",
+"Ping Request", ...), with its kind, MQTT message id and topic, and for
+publish messages the fields of the JSON payload matched to it from the
+Message column: unit, type, description, range (range_low, range_high),
+lat and long.  Strings are dictionary encoded: the column holds integer
+codes into a list of values kept in meta.json.  Numeric payload fields
+are float32 and NaN where the payload lacks them or is not valid JSON.
+
+Filters work on whole columns at once:
+
+    store = CaptureStore.open("capture.cols")
+    rows = store.where(kind="Publish Message", unit="C", range_high=(40, None))
+    store.messages["range_high"][rows]
+    store.frame_time(rows)
+
+Frames are indexed by frame number (frame_rows()) and by time
+(frames_between()); messages.frame links every message to its frame row
+and frames.first_message every frame to its messages.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+import numpy
+
+VERSION = 1
+META = "meta.json"
+
+FRAME_COLUMNS = ("number", "time", "source", "destination", "protocol", "length",
+                 "source_port", "destination_port", "first_message")
+MESSAGE_COLUMNS = ("frame", "kind", "msg_id", "topic", "unit", "type", "description",
+                   "range_low", "range_high", "lat", "long", "valid")
+DICTIONARY_COLUMNS = ("source", "destination", "protocol", "kind", "topic", "unit",
+                      "type", "description")
+TEXT_COLUMNS = ("info", "message")
+
+_ITEM = re.compile(r"^(.*?)(?: \(id=(\d+)\))?(?: \[(.*)\])?$")
+
+
+class CaptureFormatError(ValueError):
+    pass
+
+
+class _Dictionary(object):
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _int(text, default=0):
+    try:
+        return int(text)
+    except ValueError:
+        return default
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float("nan")
+
+
+def _payloads(message):
+    """Split the Message column into one JSON text per publish message."""
+    if not message:
+        return []
+    contents = message.split("},")
+    return [c + "}" for c in contents[:-1]] + contents[-1:]
+
+
+def convert(csv_path, out_dir):
+    """Convert a capture CSV into a store directory; returns the frame count."""
+    dictionaries = dict((name, _Dictionary()) for name in DICTIONARY_COLUMNS)
+    for name in ("unit", "type", "description", "topic"):
+        dictionaries[name].code("")
+    frames = dict((name, []) for name in FRAME_COLUMNS)
+    messages = dict((name, []) for name in MESSAGE_COLUMNS)
+    texts = dict((name, []) for name in TEXT_COLUMNS)
+
+    f = open(csv_path, "r", newline="")
+    try:
+        for row in csv.DictReader(f):
+            frame = len(frames["number"])
+            frames["number"].append(_int(row["No."]))
+            frames["time"].append(float(row["Time"]))
+            frames["source"].append(dictionaries["source"].code(row["Source"]))
+            frames["destination"].append(dictionaries["destination"].code(row["Destination"]))
+            frames["protocol"].append(dictionaries["protocol"].code(row["Protocol"]))
+            frames["length"].append(_int(row["Length"]))
+            frames["source_port"].append(_int(row["Source Port"]))
+            frames["destination_port"].append(_int(row["Destination Port"]))
+            frames["first_message"].append(len(messages["frame"]))
+            info, message = row["Info"], row.get("Message") or ""
+            texts["info"].append(info)
+            texts["message"].append(message)
+
+            payloads = _payloads(message)
+            published = 0
+            for item in info.split(", "):
+                kind, msg_id, topic = _ITEM.match(item.strip()).groups()
+                fields = {}
+                valid = False
+                if kind == "Publish Message" and published < len(payloads):
+                    try:
+                        fields = json.loads(payloads[published])
+                        valid = isinstance(fields, dict)
+                    except ValueError:
+                        pass
+                    published += 1
+                if not valid:
+                    fields = {}
+                value_range = fields.get("range")
+                if not (isinstance(value_range, list) and len(value_range) == 2):
+                    value_range = (None, None)
+                messages["frame"].append(frame)
+                messages["kind"].append(dictionaries["kind"].code(kind))
+                messages["msg_id"].append(int(msg_id) if msg_id else -1)
+                messages["topic"].append(dictionaries["topic"].code(topic or ""))
+                for name in ("unit", "type", "description"):
+                    messages[name].append(dictionaries[name].code(str(fields.get(name, ""))))
+                messages["range_low"].append(_number(value_range[0]))
+                messages["range_high"].append(_number(value_range[1]))
+                messages["lat"].append(_number(fields.get("lat")))
+                messages["long"].append(_number(fields.get("long")))
+                messages["valid"].append(valid)
+    finally:
+        f.close()
+
+    dtypes = {
+        "number": numpy.uint32, "time": numpy.float64, "length": numpy.uint32,
+        "source_port": numpy.uint16, "destination_port": numpy.uint16,
+        "first_message": numpy.uint32, "frame": numpy.uint32, "msg_id": numpy.int32,
+        "range_low": numpy.float32, "range_high": numpy.float32,
+        "lat": numpy.float32, "long": numpy.float32, "valid": numpy.bool_,
+    }
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    for table, columns in (("frames", frames), ("messages", messages)):
+        for name, values in columns.items():
+            dtype = dtypes.get(name, numpy.uint32)
+            numpy.save(os.path.join(out_dir, "%s.%s.npy" % (table, name)),
+                       numpy.asarray(values).astype(dtype))
+    for name, values in texts.items():
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.uint64)
+        numpy.cumsum([len(v) for v in encoded], out=offsets[1:])
+        numpy.save(os.path.join(out_dir, "frames.%s.offsets.npy" % name), offsets)
+        numpy.save(os.path.join(out_dir, "frames.%s.data.npy" % name),
+                   numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8))
+
+    times = numpy.asarray(frames["time"], dtype=numpy.float64)
+    numbers = numpy.asarray(frames["number"], dtype=numpy.uint32)
+    numpy.save(os.path.join(out_dir, "index.time.npy"), numpy.argsort(times, kind="mergesort"))
+    numpy.save(os.path.join(out_dir, "index.number.npy"), numpy.argsort(numbers, kind="mergesort"))
+    meta = {
+        "version": VERSION,
+        "source": os.path.basename(csv_path),
+        "frames": len(times),
+        "messages": len(messages["frame"]),
+        "dictionaries": dict((name, d.values) for name, d in dictionaries.items()),
+    }
+    f = open(os.path.join(out_dir, META), "w")
+    try:
+        json.dump(meta, f, indent=1)
+    finally:
+        f.close()
+    return len(times)
+
+
+class CaptureStore(object):
+    """A converted capture, memory-mapped column by column."""
+
+    def __init__(self, directory, meta, frames, messages, texts, indexes):
+        self.directory = directory
+        self.meta = meta
+        self.dictionaries = meta["dictionaries"]
+        self.frames = frames
+        self.messages = messages
+        self._texts = texts
+        self._by_time, self._by_number = indexes
+        self._sorted_times = frames["time"][self._by_time]
+        self._sorted_numbers = frames["number"][self._by_number]
+
+    @classmethod
+    def open(cls, directory):
+        f = open(os.path.join(directory, META), "r")
+        try:
+            meta = json.load(f)
+        finally:
+            f.close()
+        if meta.get("version") != VERSION:
+            raise CaptureFormatError("%s: not a version %d capture store" % (directory, VERSION))
+
+        def load(name):
+            return numpy.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+        frames = dict((name, load("frames." + name)) for name in FRAME_COLUMNS)
+        messages = dict((name, load("messages." + name)) for name in MESSAGE_COLUMNS)
+        texts = dict((name, (load("frames.%s.offsets" % name), load("frames.%s.data" % name)))
+                     for name in TEXT_COLUMNS)
+        return cls(directory, meta, frames, messages, texts,
+                   (load("index.time"), load("index.number")))
+
+    def __len__(self):
+        return len(self.frames["number"])
+
+    def code(self, column, value):
+        """Code of value in a dictionary column, or -1 if it never occurs."""
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return -1
+
+    def decode(self, column, codes):
+        values = self.dictionaries[column]
+        return [values[c] for c in numpy.asarray(codes).tolist()]
+
+    def text(self, column, row):
+        """The original Info or Message text of a frame row."""
+        offsets, data = self._texts[column]
+        return data[int(offsets[row]):int(offsets[row + 1])].tobytes().decode("utf-8")
+
+    def mask(self, **conditions):
+        """Boolean mask over the messages matching every condition.
+
+        Dictionary columns take a value or a list of values, numeric ones
+        a value or a (low, high) range with None for an open end, and
+        "time" a (start, end) range of frame times in seconds.
+        """
+        messages = self.messages
+        mask = numpy.ones(len(messages["frame"]), dtype=bool)
+        for name, wanted in conditions.items():
+            if name == "time":
+                column = self.frames["time"][messages["frame"]]
+            elif name in messages:
+                column = messages[name]
+            else:
+                raise KeyError("unknown message column %r" % name)
+            if name in self.dictionaries:
+                values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+                codes = [self.code(name, v) for v in values]
+                mask &= numpy.isin(column, [c for c in codes if c >= 0])
+            elif isinstance(wanted, tuple):
+                low, high = wanted
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            else:
+                mask &= column == wanted
+        return mask
+
+    def where(self, **conditions):
+        """Indices of the messages matching every condition (see mask())."""
+        return numpy.nonzero(self.mask(**conditions))[0]
+
+    def frame_time(self, rows):
+        """Frame time of each message row."""
+        return self.frames["time"][self.messages["frame"][rows]]
+
+    def frames_between(self, start, end):
+        """Frame rows with start <= time < end, in time order."""
+        low = numpy.searchsorted(self._sorted_times, start, "left")
+        high = numpy.searchsorted(self._sorted_times, end, "left")
+        return self._by_time[low:high]
+
+    def frame_rows(self, numbers):
+        """Frame rows of the given frame numbers ("No."), -1 where absent."""
+        numbers = numpy.asarray(numbers)
+        pos = numpy.searchsorted(self._sorted_numbers, numbers)
+        pos = numpy.minimum(pos, len(self._sorted_numbers) - 1)
+        rows = numpy.asarray(self._by_number[pos], dtype=numpy.int64)
+        rows[self._sorted_numbers[pos] != numbers] = -1
+        return rows
+
+    def frame_messages(self, row):
+        """Message rows of frame row."""
+        first = self.frames["first_message"]
+        start = int(first[row])
+        end = int(first[row + 1]) if row + 1 < len(first) else len(self.messages["frame"])
+        return numpy.arange(start, end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar store for MQTT capture CSVs.")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("convert")
+    p.add_argument("capture")
+    p.add_argument("store")
+    p = sub.add_parser("query")
+    p.add_argument("store")
+    for name in ("kind", "topic", "unit", "type"):
+        p.add_argument("--" + name)
+    p.add_argument("--start", type=float)
+    p.add_argument("--end", type=float)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        start = time.time()
+        count = convert(args.capture, args.store)
+        print("Converted %d frames in %.2f s" % (count, time.time() - start))
+        return 0
+    if args.command != "query":
+        parser.error("expected convert or query")
+
+    store = CaptureStore.open(args.store)
+    conditions = dict((name, getattr(args, name)) for name in ("kind", "topic", "unit", "type")
+                      if getattr(args, name) is not None)
+    if args.start is not None or args.end is not None:
+        conditions["time"] = (args.start, args.end)
+    start = time.time()
+    rows = store.where(**conditions)
+    elapsed = time.time() - start
+    print("%d of %d messages match (%.2f ms)"
+          % (len(rows), len(store.messages["frame"]), elapsed * 1000))
+    for row in rows[:10]:
+        frame = int(store.messages["frame"][row])
+        print("  frame %d at %.3f s: %s %s" % (
+            store.frames["number"][frame], store.frames["time"][frame],
+            store.decode("topic", [store.messages["topic"][row]])[0],
+            store.decode("unit", [store.messages["unit"][row]])[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""
+Minimal asyncio MQTT 3.1.1: a client and a local stand-in broker.
+
+Just enough of the protocol to replay traffic at high rates without a
+network or a third-party library: CONNECT, PUBLISH at QoS 0 and 1,
+SUBSCRIBE with the + and # wildcards, PINGREQ and DISCONNECT.  The broker
+acknowledges QoS 1 publishes, forwards every message at QoS 0 and keeps
+no retained messages or sessions; QoS 2 is not supported.
+
+    broker = Broker()
+    server = await broker.start("127.0.0.1", 1883)
+
+    client = Client("replay")
+    await client.connect("127.0.0.1", 1883)
+    await client.subscribe("/polimi/#", on_message)
+    client.publish(topic, payload)       # buffered
+    await client.flush()                 # one drain for the whole batch
+
+publish() only encodes the packet into the transport buffer; callers
+batch as many as they like and then await flush(), which is where the
+client yields to the event loop and the socket write happens.
+"""
+
+import asyncio
+import struct
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+_U16 = struct.Struct(">H")
+
+# Subscribers whose unsent output grows past this are drained before the
+# broker reads the next packet from a publisher.
+HIGH_WATER = 1024 * 1024
+
+
+class MQTTError(Exception):
+    pass
+
+
+def _remaining_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7f, n >> 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def _string(text):
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    return _U16.pack(len(data)) + data
+
+
+def packet(kind, flags, body):
+    return bytes(bytearray([kind << 4 | flags])) + _remaining_length(len(body)) + body
+
+
+def publish_packet(topic, payload, qos=0, packet_id=0, retain=False):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    body = _string(topic)
+    if qos:
+        body += _U16.pack(packet_id)
+    return packet(PUBLISH, qos << 1 | int(retain), body + payload)
+
+
+async def read_packet(reader):
+    """Return (type, flags, body) of the next packet, or None at EOF."""
+    try:
+        first = await reader.readexactly(1)
+        length = shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+            if shift > 21:
+                raise MQTTError("malformed remaining length")
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return first[0] >> 4, first[0] & 0x0f, body
+
+
+def parse_publish(flags, body):
+    """Return (topic, payload, qos, packet_id) of a PUBLISH body."""
+    (size,) = _U16.unpack_from(body)
+    topic = body[2:2 + size].decode("utf-8")
+    offset = 2 + size
+    qos = flags >> 1 & 3
+    packet_id = 0
+    if qos:
+        (packet_id,) = _U16.unpack_from(body, offset)
+        offset += 2
+    return topic, body[offset:], qos, packet_id
+
+
+def _connect_client_id(body):
+    # Protocol name, level, flags and keep alive come before the client id.
+    (size,) = _U16.unpack_from(body)
+    offset = 2 + size + 4
+    (size,) = _U16.unpack_from(body, offset)
+    return body[offset + 2:offset + 2 + size].decode("utf-8")
+
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter matching with the + and # wildcards."""
+    if pattern == topic:
+        return True
+    levels = topic.split("/")
+    filters = pattern.split("/")
+    for i, level in enumerate(filters):
+        if level == "#":
+            return True
+        if i >= len(levels) or (level != "+" and level != levels[i]):
+            return False
+    return len(filters) == len(levels)
+
+
+class _Session(object):
+    __slots__ = ("client_id", "writer", "filters")
+
+    def __init__(self, writer):
+        self.client_id = None
+        self.writer = writer
+        self.filters = []
+
+
+class Broker(object):
+    """Local stand-in for an MQTT broker such as broker.hivemq.com."""
+
+    def __init__(self):
+        self.sessions = set()
+        self.received = 0
+        self.delivered = 0
+
+    async def start(self, host="127.0.0.1", port=1883):
+        return await asyncio.start_server(self._serve, host, port)
+
+    async def _serve(self, reader, writer):
+        session = _Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                message = await read_packet(reader)
+                if message is None:
+                    break
+                kind, flags, body = message
+                if kind == PUBLISH:
+                    qos, packet_id = await self._publish(flags, body)
+                    if qos:
+                        writer.write(packet(PUBACK, 0, _U16.pack(packet_id)))
+                elif kind == CONNECT:
+                    session.client_id = _connect_client_id(body)
+                    writer.write(packet(CONNACK, 0, b"\x00\x00"))
+                elif kind == SUBSCRIBE:
+                    writer.write(self._subscribe(session, body))
+                elif kind == UNSUBSCRIBE:
+                    writer.write(self._unsubscribe(session, body))
+                elif kind == PINGREQ:
+                    writer.write(packet(PINGRESP, 0, b""))
+                elif kind == DISCONNECT:
+                    break
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def _subscribe(self, session, body):
+        packet_id = body[:2]
+        offset, granted = 2, bytearray()
+        while offset < len(body):
+            (size,) = _U16.unpack_from(body, offset)
+            session.filters.append(body[offset + 2:offset + 2 + size].decode("utf-8"))
+            offset += 2 + size + 1
+            granted.append(0)
+        return packet(SUBACK, 0, packet_id + bytes(granted))
+
+    def _unsubscribe(self, session, body):
+        offset = 2
+        while offset < len(body):
+            (size,) = _U16.unpack_from(body, offset)
+            name = body[offset + 2:offset + 2 + size].decode("utf-8")
+            if name in session.filters:
+                session.filters.remove(name)
+            offset += 2 + size
+        return packet(UNSUBACK, 0, body[:2])
+
+    async def _publish(self, flags, body):
+        topic, payload, qos, packet_id = parse_publish(flags, body)
+        self.received += 1
+        forward = None
+        slow = []
+        for session in self.sessions:
+            for pattern in session.filters:
+                if topic_matches(pattern, topic):
+                    if forward is None:
+                        # Encoded once, the same bytes go to every subscriber.
+                        forward = publish_packet(topic, payload)
+                    session.writer.write(forward)
+                    self.delivered += 1
+                    if session.writer.transport.get_write_buffer_size() > HIGH_WATER:
+                        slow.append(session.writer)
+                    break
+        for writer in slow:
+            await writer.drain()
+        return qos, packet_id
+
+
+class Client(object):
+    """A publishing and subscribing MQTT client."""
+
+    def __init__(self, client_id, keepalive=60):
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.reader = self.writer = None
+        self.callbacks = []
+        self.received = 0
+        self._next_id = 0
+        self._acks = {}
+        self._task = None
+
+    async def connect(self, host="127.0.0.1", port=1883):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        body = (_string("MQTT") + b"\x04\x02" + _U16.pack(self.keepalive)
+                + _string(self.client_id))
+        self.writer.write(packet(CONNECT, 0, body))
+        await self.writer.drain()
+        reply = await read_packet(self.reader)
+        if reply is None or reply[0] != CONNACK or reply[2][1:2] != b"\x00":
+            raise MQTTError("connection refused: %r" % (reply,))
+        self._task = asyncio.ensure_future(self._receive())
+
+    def _packet_id(self):
+        self._next_id = self._next_id % 0xffff + 1
+        return self._next_id
+
+    async def _request(self, kind, flags, body, reply):
+        packet_id = self._packet_id()
+        future = self._acks[(reply, packet_id)] = asyncio.get_event_loop().create_future()
+        self.writer.write(packet(kind, flags, _U16.pack(packet_id) + body))
+        await self.writer.drain()
+        return await future
+
+    async def subscribe(self, pattern, callback):
+        """Call callback(topic, payload) for every message matching pattern."""
+        self.callbacks.append((pattern, callback))
+        await self._request(SUBSCRIBE, 2, _string(pattern) + b"\x00", SUBACK)
+
+    def publish(self, topic, payload, qos=0):
+        """Queue one message; nothing is sent before flush() yields."""
+        packet_id = self._packet_id() if qos else 0
+        self.writer.write(publish_packet(topic, payload, qos, packet_id))
+        return packet_id
+
+    def publish_many(self, topic, payloads):
+        """Queue a batch of QoS 0 messages on one topic as a single write."""
+        self.writer.write(b"".join(publish_packet(topic, p) for p in payloads))
+
+    async def flush(self):
+        await self.writer.drain()
+
+    async def ping(self):
+        self.writer.write(packet(PINGREQ, 0, b""))
+        await self.writer.drain()
+
+    async def _receive(self):
+        while True:
+            message = await read_packet(self.reader)
+            if message is None:
+                break
+            kind, flags, body = message
+            if kind == PUBLISH:
+                topic, payload, _, _ = parse_publish(flags, body)
+                self.received += 1
+                for pattern, callback in self.callbacks:
+                    if topic_matches(pattern, topic):
+                        callback(topic, payload)
+            elif kind in (SUBACK, UNSUBACK, PUBACK):
+                future = self._acks.pop((kind, _U16.unpack_from(body)[0]), None)
+                if future is not None and not future.done():
+                    future.set_result(body[2:])
+        for future in self._acks.values():
+            if not future.done():
+                future.set_exception(MQTTError("connection closed"))
+
+    async def disconnect(self):
+        if self.writer is None:
+            return
+        self.writer.write(packet(DISCONNECT, 0, b""))
+        await self.writer.drain()
+        self.writer.close()
+        if self._task is not None:
+            await self._task
+        self.writer = None
@@ -0,0 +1,215 @@
+"""
+High-throughput replay of the Challenge 2 MQTT capture.
+
+The Node-RED flow (resources/flow_node_red.json) loads every row of
+challenge2023_2.csv into a global array and, for each ID it receives,
+picks frame (ID + 2022) % 7711, splits its Info and Message columns and
+publishes one message per publish message of the frame, 100 IDs at most.
+Here the capture is parsed once into a list indexed like that array,
+with the payloads of every publish frame already split and encoded, so
+an ID costs one index and one string join:
+
+    capture = Capture.from_csv("../resources/challenge2023_2.csv")
+    capture.messages(42, timestamp)     # what the flow publishes for ID 42
+
+Replayer publishes the messages for a sequence of IDs, between the
+"START" and "END" markers of the flow, at a configurable rate.  Messages
+are written in batches and the client only yields to the event loop
+once per batch, so a local broker sustains thousands of messages per
+second.  With --broker the stand-in broker of mqttlite.py is started in
+the same process, with a subscriber counting what comes back:
+
+    python replay.py ../resources/challenge2023_2.csv --broker --count 10000 --rate 5000
+
+--follow takes the IDs from the ID generator topic instead, as the flow
+does.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+
+from mqttlite import Broker, Client
+
+FRAME_OFFSET = 2022
+TOPIC = "/polimi/iot2023/challenge2/10372022"
+ID_TOPIC = "polimi/challenge_2/2023/id_code_generator/4"
+START, END = "START", "END"
+
+
+def split_contents(message):
+    """Split the Message column like get_contents() in the flow."""
+    if not message:
+        return []
+    contents = message.split("},")
+    return [c + "}" for c in contents[:-1]] + contents[-1:]
+
+
+class Capture(object):
+    """The publish payloads of every frame of a Wireshark CSV export."""
+
+    def __init__(self, frames):
+        # frames[n] is a tuple of encoded payloads, empty unless frame n
+        # (row n + 1 of the capture) holds publish messages.
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    @classmethod
+    def from_csv(cls, path):
+        frames = []
+        f = open(path, "r", newline="")
+        try:
+            for row in csv.DictReader(f):
+                info = row["Info"]
+                if not info.startswith("Publish Message"):
+                    frames.append(())
+                    continue
+                contents = split_contents(row["Message"])
+                count = len(info.split(", "))
+                frames.append(tuple((contents[i] if i < len(contents) else "{}").encode("utf-8")
+                                    for i in range(count)))
+        finally:
+            f.close()
+        return cls(frames)
+
+    def frame_index(self, ID):
+        return (ID + FRAME_OFFSET) % len(self.frames)
+
+    def messages(self, ID, timestamp):
+        """Return the payloads the flow publishes for ID, as bytes."""
+        contents = self.frames[self.frame_index(ID)]
+        if not contents:
+            return []
+        head = ('{ "timestamp": "%d", "id": "%d", "payload": ' % (timestamp, ID)).encode("utf-8")
+        return [head + content + b" }" for content in contents]
+
+    def publish_frames(self):
+        return sum(1 for contents in self.frames if contents)
+
+
+class Replayer(object):
+    """Publishes the capture messages for a sequence of IDs."""
+
+    def __init__(self, capture, client, topic=TOPIC, rate=None, batch=100):
+        self.capture = capture
+        self.client = client
+        self.topic = topic
+        self.rate = rate
+        self.batch = batch
+        self.ids = 0
+        self.published = 0
+        self._pending = 0
+        self._started = None
+
+    async def _throttle(self):
+        await self.client.flush()
+        self._pending = 0
+        if self.rate:
+            delay = self._started + self.published / float(self.rate) - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def start(self):
+        self._started = time.time()
+        self.client.publish(self.topic, START)
+        await self.client.flush()
+
+    async def publish(self, ID):
+        """Publish the messages of one ID, flushing once per batch."""
+        payloads = self.capture.messages(ID, int(time.time() * 1000))
+        self.client.publish_many(self.topic, payloads)
+        self.ids += 1
+        self.published += len(payloads)
+        self._pending += len(payloads)
+        if self._pending >= self.batch:
+            await self._throttle()
+
+    async def end(self):
+        self.client.publish(self.topic, END)
+        await self._throttle()
+        return time.time() - self._started
+
+    async def replay(self, ids):
+        """Publish START, the messages of every ID in ids and END.
+
+        Returns the elapsed seconds.
+        """
+        await self.start()
+        for ID in ids:
+            await self.publish(ID)
+        return await self.end()
+
+    async def follow(self, count, id_topic=ID_TOPIC):
+        """Like replay(), for the first count IDs received on id_topic."""
+        queue = asyncio.Queue()
+
+        def on_id(topic, payload):
+            try:
+                queue.put_nowait(int(json.loads(payload.decode("utf-8"))["id"]))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        await self.client.subscribe(id_topic, on_id)
+        await self.start()
+        for _ in range(count):
+            await self.publish(await queue.get())
+        return await self.end()
+
+
+async def run(args):
+    capture = Capture.from_csv(args.capture)
+    server = None
+    counter = None
+    if args.broker:
+        server = await Broker().start(args.host, args.port)
+        counter = Client("replay-counter")
+        await counter.connect(args.host, args.port)
+        await counter.subscribe(args.topic, lambda topic, payload: None)
+
+    client = Client("replay")
+    await client.connect(args.host, args.port)
+    replayer = Replayer(capture, client, args.topic, args.rate, args.batch)
+    if args.follow:
+        elapsed = await replayer.follow(args.count)
+    else:
+        elapsed = await replayer.replay(range(args.first_id, args.first_id + args.count))
+    await client.disconnect()
+
+    print("Published %d messages for %d IDs in %.2f s (%.0f messages/s)"
+          % (replayer.published, replayer.ids, elapsed, replayer.published / max(elapsed, 1e-9)))
+    if counter is not None:
+        # START and END come back too.
+        expected = replayer.published + 2
+        deadline = time.time() + 5
+        while counter.received < expected and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        print("Subscriber received %d of %d messages" % (counter.received, expected))
+        await counter.disconnect()
+        server.close()
+        await server.wait_closed()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the Challenge 2 capture over MQTT.")
+    parser.add_argument("capture", help="Wireshark CSV export, e.g. challenge2023_2.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--broker", action="store_true", help="start a local stand-in broker")
+    parser.add_argument("--topic", default=TOPIC)
+    parser.add_argument("--count", type=int, default=100, help="number of IDs to replay")
+    parser.add_argument("--first-id", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=0, help="messages/s, 0 for no limit")
+    parser.add_argument("--batch", type=int, default=100, help="messages per flush")
+    parser.add_argument("--follow", action="store_true", help="take the IDs from " + ID_TOPIC)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
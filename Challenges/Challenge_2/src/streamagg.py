@@ -0,0 +1,348 @@
+"""
+Incremental windowed aggregation of sensor publish streams.
+
+The Node-RED flow of Challenge 2 keeps its running state in globals
+(temperatures_received, max_temperature, count) and rebuilds it on the
+START and END markers.  This module does the same kind of bookkeeping as
+stream operators with constant memory per key:
+
+    def celsius(record):
+        return record.payload.get("unit") == "C"
+
+    windows = WindowedAggregator(size=10.0, slide=5.0, key=by_type, where=celsius,
+                                 emit=print)
+    totals = RunningAggregator(key=by_type, where=celsius)
+    session = Session([windows, totals])
+    session.feed(topic, payload)     # raw MQTT payloads, START/END included
+
+A Session only passes on the records between START and END: START
+resets every operator and END flushes the windows still open.  Records
+are the messages of replay.py ({"timestamp", "id", "payload"}) or bare
+sensor payloads ({unit, range, type, lat, long}); the event time is the
+"timestamp" in milliseconds when present, the arrival time otherwise.
+The aggregated value is range[1], the value the flow charts, unless
+another value function is given.
+
+Windows are tumbling (slide == size) or sliding (size a multiple of
+slide).  Each key keeps one Stats (count, sum, min, max) per slide-long
+pane of the open windows, so memory depends on the number of keys and
+size / slide, never on the message rate.  A window is emitted, as a
+WindowResult, once a record from a later pane arrives (from any key) or
+the session ends.  Records older than every open window are dropped and
+counted in late.
+
+    python streamagg.py ../resources/challenge2023_2.csv --size 10 --slide 5 --unit C
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+
+START, END = b"START", b"END"
+
+WindowResult = namedtuple("WindowResult", "key start end count mean min max")
+
+
+class Record(object):
+    """One sensor message: topic, event time in seconds and payload dict."""
+
+    __slots__ = ("topic", "time", "payload", "id")
+
+    def __init__(self, topic, time, payload, id=None):
+        self.topic = topic
+        self.time = time
+        self.payload = payload
+        self.id = id
+
+
+def parse_record(topic, data, now=None):
+    """Turn a raw payload into a Record, or None if it is not a JSON object."""
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(message, dict):
+        return None
+    payload = message.get("payload", message)
+    if not isinstance(payload, dict):
+        return None
+    stamp = message.get("timestamp")
+    try:
+        when = float(stamp) / 1000.0
+    except (TypeError, ValueError):
+        when = time.time() if now is None else now
+    return Record(topic, when, payload, message.get("id"))
+
+
+def by_type(record):
+    return record.payload.get("type")
+
+
+def by_unit(record):
+    return record.payload.get("unit")
+
+
+def by_topic(record):
+    return record.topic
+
+
+def range_high(record):
+    """range[1] of the payload, or None."""
+    value_range = record.payload.get("range")
+    if isinstance(value_range, list) and len(value_range) == 2:
+        return value_range[1]
+    return None
+
+
+class Stats(object):
+    """Count, sum, minimum and maximum of a series, in constant memory."""
+
+    __slots__ = ("count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class _Operator(object):
+    """Shared key, value and filter handling of the aggregators.
+
+    process() passes every accepted reading to add(when, key, value).
+    Subclasses implement add(), reset(), which drops all state at the
+    start of a session, and flush(), which returns or emits the results
+    at its end.
+    """
+
+    def __init__(self, key=by_type, value=range_high, where=None):
+        self.key = key
+        self.value = value
+        self.where = where
+
+    def process(self, record):
+        if self.where is not None and not self.where(record):
+            return
+        value = self.value(record)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.add(record.time, self.key(record), value)
+
+
+class RunningAggregator(_Operator):
+    """Session totals per key, like temperatures_received and max_temperature."""
+
+    def __init__(self, key=by_type, value=range_high, where=None):
+        _Operator.__init__(self, key, value, where)
+        self.stats = {}
+
+    def add(self, when, key, value):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = Stats()
+        stats.add(value)
+
+    def reset(self):
+        self.stats = {}
+
+    def flush(self):
+        return dict((key, WindowResult(key, None, None, s.count, s.mean, s.minimum, s.maximum))
+                    for key, s in self.stats.items())
+
+
+class WindowedAggregator(_Operator):
+    """Tumbling or sliding window count, mean, min and max per key."""
+
+    def __init__(self, size, slide=None, key=by_type, value=range_high, where=None, emit=None):
+        _Operator.__init__(self, key, value, where)
+        self.size = float(size)
+        self.slide = float(slide or size)
+        self.panes_per_window = int(round(self.size / self.slide))
+        if self.panes_per_window < 1 or abs(self.panes_per_window * self.slide - self.size) > 1e-9:
+            raise ValueError("the window size must be a multiple of the slide")
+        self.emit = emit
+        self.results = [] if emit is None else None
+        self.reset()
+
+    def reset(self):
+        self.panes = {}
+        self.current = None
+        self.late = 0
+
+    def add(self, when, key, value):
+        pane = int(when // self.slide)
+        current = self.current
+        if current is None:
+            self.current = pane
+        elif pane > current:
+            self._advance(pane)
+        elif pane <= current - self.panes_per_window:
+            self.late += 1
+            return
+        panes = self.panes.get(key)
+        if panes is None:
+            panes = self.panes[key] = {}
+        stats = panes.get(pane)
+        if stats is None:
+            stats = panes[pane] = Stats()
+        stats.add(value)
+
+    def _advance(self, pane):
+        # Close every window ending before pane; after panes_per_window
+        # empty panes there is nothing left to emit.
+        k = self.panes_per_window
+        last = min(pane, self.current + k)
+        for end in range(self.current, last):
+            for key, panes in self.panes.items():
+                window = Stats()
+                for p in range(end - k + 1, end + 1):
+                    stats = panes.get(p)
+                    if stats is not None:
+                        window.merge(stats)
+                if window.count:
+                    self._emit(WindowResult(key, (end - k + 1) * self.slide, (end + 1) * self.slide,
+                                            window.count, window.mean, window.minimum,
+                                            window.maximum))
+        oldest = pane - k + 1
+        for key in list(self.panes):
+            panes = self.panes[key]
+            for p in [p for p in panes if p < oldest]:
+                del panes[p]
+            if not panes:
+                del self.panes[key]
+        self.current = pane
+
+    def _emit(self, result):
+        if self.emit is None:
+            self.results.append(result)
+        else:
+            self.emit(result)
+
+    def flush(self):
+        """Emit every window still open; returns the collected results if
+        there is no emit callback."""
+        if self.current is not None:
+            self._advance(self.current + self.panes_per_window)
+        self.reset()
+        if self.results is None:
+            return None
+        results, self.results = self.results, []
+        return results
+
+
+class Session(object):
+    """Feeds raw publish payloads between START and END to the operators."""
+
+    def __init__(self, operators, on_end=None):
+        self.operators = list(operators)
+        self.on_end = on_end
+        self.active = False
+        self.records = 0
+        self.ignored = 0
+        self.malformed = 0
+
+    def start(self):
+        for operator in self.operators:
+            operator.reset()
+        self.active = True
+        self.records = self.ignored = self.malformed = 0
+
+    def end(self):
+        results = [operator.flush() for operator in self.operators]
+        self.active = False
+        if self.on_end is not None:
+            self.on_end(results)
+        return results
+
+    def feed(self, topic, data, now=None):
+        """Process one raw payload (bytes or str)."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        marker = data.strip()
+        if marker == START:
+            self.start()
+            return
+        if marker == END:
+            if self.active:
+                self.end()
+            return
+        if not self.active:
+            self.ignored += 1
+            return
+        record = parse_record(topic, data, now)
+        if record is None:
+            self.malformed += 1
+            return
+        self.records += 1
+        for operator in self.operators:
+            operator.process(record)
+
+
+def main(argv=None):
+    from replay import Capture, TOPIC
+
+    parser = argparse.ArgumentParser(
+        description="Aggregate the replayed Challenge 2 publish stream in windows.")
+    parser.add_argument("capture", help="Wireshark CSV export, e.g. challenge2023_2.csv")
+    parser.add_argument("--count", type=int, default=100000, help="number of IDs to replay")
+    parser.add_argument("--interval", type=float, default=50.0, help="ms of event time per ID")
+    parser.add_argument("--size", type=float, default=10.0, help="window size [s]")
+    parser.add_argument("--slide", type=float, help="window slide [s], default tumbling")
+    parser.add_argument("--unit", help="only aggregate payloads with this unit, e.g. C")
+    parser.add_argument("--key", choices=("type", "unit"), default="unit")
+    args = parser.parse_args(argv)
+
+    capture = Capture.from_csv(args.capture)
+    where = None
+    if args.unit:
+        def where(record):
+            return record.payload.get("unit") == args.unit
+    key = by_type if args.key == "type" else by_unit
+    windows = WindowedAggregator(args.size, args.slide, key=key, where=where)
+    totals = RunningAggregator(key=key, where=where)
+    session = Session([windows, totals])
+
+    session.feed(TOPIC, START)
+    start = time.time()
+    for ID in range(args.count):
+        for payload in capture.messages(ID, int(ID * args.interval)):
+            session.feed(TOPIC, payload)
+    results, summary = session.end()
+    elapsed = time.time() - start
+
+    print("%d records (%d malformed) in %.2f s, %.0f records/s; %d windows"
+          % (session.records, session.malformed, elapsed,
+             (session.records + session.malformed) / max(elapsed, 1e-9), len(results)))
+    for result in results[-5:]:
+        print("  %s [%.0f, %.0f) s: %d, mean %.1f, min %s, max %s" % result)
+    for result in summary.values():
+        print("session %s: %d, mean %.1f, min %s, max %s"
+              % (result.key, result.count, result.mean, result.min, result.max))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,268 +1,280 @@
-# This file was automatically generated by SWIG (http://www.swig.org).
-# Version 1.3.33
+# This file was originally generated by SWIG (http://www.swig.org) 1.3.33
+# and has since been replaced by a hand-written proxy layer over the same
+# _TOSSIM extension.
 #
-# Don't modify this file, modify the SWIG interface instead.
-# This file is compatible with both classic and new-style classes.
+# The generated proxies sent every call through a Python trampoline
+# ("def f(*args): return _TOSSIM.X(*args)") and every attribute miss or
+# assignment through __getattr__/__setattr__ lambdas.  Here the extension's
+# builtin functions are bound to the classes directly as methods (on
+# Python 3 to the instances, on first use), so a call such as
+# t.runNextEvent() goes straight into _TOSSIM.  Tossim, the one class only
+# ever created from Python, also keeps "this" in a slot.  The other
+# proxies keep an instance __dict__, because SWIG 1.3.33 stores "this" in
+# the __dict__ of the proxy objects it creates for pointers returned from
+# C++ (Tossim.getNode(), Tossim.radio(), ...).
+#
+# The public API is the same as that of the generated module.  Add new
+# _TOSSIM functions to the binding lists below the classes.
 
 import _TOSSIM
-import new
-new_instancemethod = new.instancemethod
+from array import array as _array
+from mmap import mmap as _mmap
 try:
-    _swig_property = property
-except NameError:
-    pass # Python < 2.2 doesn't have 'property'.
-def _swig_setattr_nondynamic(self,class_type,name,value,static=1):
-    if (name == "thisown"): return self.this.own(value)
-    if (name == "this"):
-        if type(value).__name__ == 'PySwigObject':
-            self.__dict__[name] = value
-            return
-    method = class_type.__swig_setmethods__.get(name,None)
-    if method: return method(self,value)
-    if (not static) or hasattr(self,name):
-        self.__dict__[name] = value
-    else:
-        raise AttributeError("You cannot add attributes to %s" % self)
-
-def _swig_setattr(self,class_type,name,value):
-    return _swig_setattr_nondynamic(self,class_type,name,value,0)
-
-def _swig_getattr(self,class_type,name):
-    if (name == "thisown"): return self.this.own()
-    method = class_type.__swig_getmethods__.get(name,None)
-    if method: return method(self)
-    raise AttributeError,name
+    from itertools import izip as _zip
+except ImportError:
+    _zip = zip
+try:
+    from new import instancemethod as _instancemethod
+    def _method(func, cls, name):
+        return _instancemethod(func, None, cls)
+except ImportError:
+    from types import MethodType as _MethodType
+    class _method(object):
+        # Python 3 has no unbound methods and builtins do not bind, so the
+        # first lookup on a proxy binds the builtin to its "this" and keeps
+        # the bound method in the proxy's __dict__; later lookups find it
+        # there and calls go straight into _TOSSIM.  Looked up on the class
+        # it is the builtin itself, so Tossim.time(t) still works.
+        __slots__ = ('func', 'name')
+        def __init__(self, func, cls, name):
+            self.func = func
+            self.name = name
+        def __get__(self, obj, cls=None):
+            if obj is None:
+                return self.func
+            bound = _MethodType(self.func, obj.this)
+            obj.__dict__[self.name] = bound
+            return bound
 
 def _swig_repr(self):
     try: strthis = "proxy of " + self.this.__repr__()
     except: strthis = ""
     return "<%s.%s; %s >" % (self.__class__.__module__, self.__class__.__name__, strthis,)
 
-import types
-try:
-    _object = types.ObjectType
-    _newclass = 1
-except AttributeError:
-    class _object : pass
-    _newclass = 0
-del types
+def _bind(cls, prefix, names):
+    for name in names:
+        setattr(cls, name, _method(getattr(_TOSSIM, prefix + name), cls, name))
+
+def _noise_trace(trace):
+    """Return trace as an iterable of integer noise readings (dBm).
+
+    Plain sequences and arrays are used as they are; any other object
+    exposing the buffer protocol is read through a memoryview, with raw
+    byte buffers interpreted as signed 8 bit samples.
+    """
+    if isinstance(trace, (_array, list, tuple)):
+        return trace
+    try:
+        view = memoryview(trace)
+    except TypeError:
+        if isinstance(trace, _mmap):
+            # Python 2 mmaps only implement the old buffer interface.
+            return _array('b', trace[:])
+        return trace
+    if view.format in ('B', 'c'):
+        return _array('b', view.tobytes())
+    return view.tolist()
 
+def _plain(values):
+    # NumPy scalars are not accepted by every SWIG typemap; tolist() turns
+    # arrays (NumPy or array.array) into plain Python numbers.
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return values
 
-class MAC(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, MAC, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, MAC, name)
+def _bytes(buffer):
+    # Arrays, NumPy records and memoryviews all have tobytes(); NumPy
+    # scalars on Python 2 do not expose the buffer protocol.
+    if hasattr(buffer, 'tobytes'):
+        return buffer.tobytes()
+    return memoryview(buffer).tobytes()
+
+def _add_noise_trace(motes, samples):
+    add = _TOSSIM.Mote_addNoiseTraceReading
+    count = 0
+    for val in samples:
+        for this in motes:
+            add(this, val)
+        count += 1
+    return count
+
+
+class _Proxy(object):
+    __slots__ = ()
     __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_MAC(*args)
-        try: self.this.append(this)
-        except: self.this = this
+    thisown = property(lambda self: self.this.own(),
+                       lambda self, value: self.this.own(value))
+
+class MAC(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_MAC(*args)
     __swig_destroy__ = _TOSSIM.delete_MAC
-    __del__ = lambda self : None;
-    def initHigh(*args): return _TOSSIM.MAC_initHigh(*args)
-    def initLow(*args): return _TOSSIM.MAC_initLow(*args)
-    def high(*args): return _TOSSIM.MAC_high(*args)
-    def low(*args): return _TOSSIM.MAC_low(*args)
-    def symbolsPerSec(*args): return _TOSSIM.MAC_symbolsPerSec(*args)
-    def bitsPerSymbol(*args): return _TOSSIM.MAC_bitsPerSymbol(*args)
-    def preambleLength(*args): return _TOSSIM.MAC_preambleLength(*args)
-    def exponentBase(*args): return _TOSSIM.MAC_exponentBase(*args)
-    def maxIterations(*args): return _TOSSIM.MAC_maxIterations(*args)
-    def minFreeSamples(*args): return _TOSSIM.MAC_minFreeSamples(*args)
-    def rxtxDelay(*args): return _TOSSIM.MAC_rxtxDelay(*args)
-    def ackTime(*args): return _TOSSIM.MAC_ackTime(*args)
-    def setInitHigh(*args): return _TOSSIM.MAC_setInitHigh(*args)
-    def setInitLow(*args): return _TOSSIM.MAC_setInitLow(*args)
-    def setHigh(*args): return _TOSSIM.MAC_setHigh(*args)
-    def setLow(*args): return _TOSSIM.MAC_setLow(*args)
-    def setSymbolsPerSec(*args): return _TOSSIM.MAC_setSymbolsPerSec(*args)
-    def setBitsBerSymbol(*args): return _TOSSIM.MAC_setBitsBerSymbol(*args)
-    def setPreambleLength(*args): return _TOSSIM.MAC_setPreambleLength(*args)
-    def setExponentBase(*args): return _TOSSIM.MAC_setExponentBase(*args)
-    def setMaxIterations(*args): return _TOSSIM.MAC_setMaxIterations(*args)
-    def setMinFreeSamples(*args): return _TOSSIM.MAC_setMinFreeSamples(*args)
-    def setRxtxDelay(*args): return _TOSSIM.MAC_setRxtxDelay(*args)
-    def setAckTime(*args): return _TOSSIM.MAC_setAckTime(*args)
+_bind(MAC, "MAC_", (
+    "initHigh", "initLow", "high", "low", "symbolsPerSec", "bitsPerSymbol",
+    "preambleLength", "exponentBase", "maxIterations", "minFreeSamples",
+    "rxtxDelay", "ackTime", "setInitHigh", "setInitLow", "setHigh", "setLow",
+    "setSymbolsPerSec", "setBitsBerSymbol", "setPreambleLength",
+    "setExponentBase", "setMaxIterations", "setMinFreeSamples",
+    "setRxtxDelay", "setAckTime",
+))
 MAC_swigregister = _TOSSIM.MAC_swigregister
 MAC_swigregister(MAC)
 
-class Radio(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, Radio, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, Radio, name)
-    __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_Radio(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class Radio(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_Radio(*args)
     __swig_destroy__ = _TOSSIM.delete_Radio
-    __del__ = lambda self : None;
-    def add(*args): return _TOSSIM.Radio_add(*args)
-    def gain(*args): return _TOSSIM.Radio_gain(*args)
-    def connected(*args): return _TOSSIM.Radio_connected(*args)
-    def remove(*args): return _TOSSIM.Radio_remove(*args)
-    def setNoise(*args): return _TOSSIM.Radio_setNoise(*args)
-    def setSensitivity(*args): return _TOSSIM.Radio_setSensitivity(*args)
+    def addLinks(self, src, dst, gain):
+        """Add one link per position of the src, dst and gain sequences.
+
+        Lists, arrays and NumPy arrays are all accepted.  Returns the
+        number of links added.
+        """
+        add = _TOSSIM.Radio_add
+        this = self.this
+        count = 0
+        for s, d, g in _zip(_plain(src), _plain(dst), _plain(gain)):
+            add(this, s, d, g)
+            count += 1
+        return count
+_bind(Radio, "Radio_", (
+    "add", "gain", "connected", "remove", "setNoise", "setSensitivity",
+))
 Radio_swigregister = _TOSSIM.Radio_swigregister
 Radio_swigregister(Radio)
 
-class Packet(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, Packet, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, Packet, name)
-    __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_Packet(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class Packet(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_Packet(*args)
     __swig_destroy__ = _TOSSIM.delete_Packet
-    __del__ = lambda self : None;
-    def setSource(*args): return _TOSSIM.Packet_setSource(*args)
-    def source(*args): return _TOSSIM.Packet_source(*args)
-    def setDestination(*args): return _TOSSIM.Packet_setDestination(*args)
-    def destination(*args): return _TOSSIM.Packet_destination(*args)
-    def setLength(*args): return _TOSSIM.Packet_setLength(*args)
-    def length(*args): return _TOSSIM.Packet_length(*args)
-    def setType(*args): return _TOSSIM.Packet_setType(*args)
-    def type(*args): return _TOSSIM.Packet_type(*args)
-    def data(*args): return _TOSSIM.Packet_data(*args)
-    def setData(*args): return _TOSSIM.Packet_setData(*args)
-    def maxLength(*args): return _TOSSIM.Packet_maxLength(*args)
-    def setStrength(*args): return _TOSSIM.Packet_setStrength(*args)
-    def deliver(*args): return _TOSSIM.Packet_deliver(*args)
-    def deliverNow(*args): return _TOSSIM.Packet_deliverNow(*args)
+    def payload(self):
+        """Return the payload as a read-only memoryview of length() bytes.
+
+        data() is the one copy out of the message buffer; slices of the
+        view and messages.py decoding copy nothing more.
+        """
+        this = self.this
+        return memoryview(_TOSSIM.Packet_data(this))[:_TOSSIM.Packet_length(this)]
+    def setPayload(self, buffer):
+        """setData() for any object exposing the buffer protocol."""
+        _TOSSIM.Packet_setData(self.this, _bytes(buffer))
+_bind(Packet, "Packet_", (
+    "setSource", "source", "setDestination", "destination", "setLength",
+    "length", "setType", "type", "data", "setData", "maxLength",
+    "setStrength", "deliver", "deliverNow",
+))
 Packet_swigregister = _TOSSIM.Packet_swigregister
 Packet_swigregister(Packet)
 
-class variable_string_t(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, variable_string_t, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, variable_string_t, name)
-    __repr__ = _swig_repr
-    __swig_setmethods__["type"] = _TOSSIM.variable_string_t_type_set
-    __swig_getmethods__["type"] = _TOSSIM.variable_string_t_type_get
-    if _newclass:type = _swig_property(_TOSSIM.variable_string_t_type_get, _TOSSIM.variable_string_t_type_set)
-    __swig_setmethods__["ptr"] = _TOSSIM.variable_string_t_ptr_set
-    __swig_getmethods__["ptr"] = _TOSSIM.variable_string_t_ptr_get
-    if _newclass:ptr = _swig_property(_TOSSIM.variable_string_t_ptr_get, _TOSSIM.variable_string_t_ptr_set)
-    __swig_setmethods__["len"] = _TOSSIM.variable_string_t_len_set
-    __swig_getmethods__["len"] = _TOSSIM.variable_string_t_len_get
-    if _newclass:len = _swig_property(_TOSSIM.variable_string_t_len_get, _TOSSIM.variable_string_t_len_set)
-    __swig_setmethods__["isArray"] = _TOSSIM.variable_string_t_isArray_set
-    __swig_getmethods__["isArray"] = _TOSSIM.variable_string_t_isArray_get
-    if _newclass:isArray = _swig_property(_TOSSIM.variable_string_t_isArray_get, _TOSSIM.variable_string_t_isArray_set)
-    def __init__(self, *args): 
-        this = _TOSSIM.new_variable_string_t(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class variable_string_t(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_variable_string_t(*args)
     __swig_destroy__ = _TOSSIM.delete_variable_string_t
-    __del__ = lambda self : None;
+    type = property(_TOSSIM.variable_string_t_type_get, _TOSSIM.variable_string_t_type_set)
+    ptr = property(_TOSSIM.variable_string_t_ptr_get, _TOSSIM.variable_string_t_ptr_set)
+    len = property(_TOSSIM.variable_string_t_len_get, _TOSSIM.variable_string_t_len_set)
+    isArray = property(_TOSSIM.variable_string_t_isArray_get, _TOSSIM.variable_string_t_isArray_set)
 variable_string_t_swigregister = _TOSSIM.variable_string_t_swigregister
 variable_string_t_swigregister(variable_string_t)
 
-class nesc_app_t(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, nesc_app_t, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, nesc_app_t, name)
-    __repr__ = _swig_repr
-    __swig_setmethods__["numVariables"] = _TOSSIM.nesc_app_t_numVariables_set
-    __swig_getmethods__["numVariables"] = _TOSSIM.nesc_app_t_numVariables_get
-    if _newclass:numVariables = _swig_property(_TOSSIM.nesc_app_t_numVariables_get, _TOSSIM.nesc_app_t_numVariables_set)
-    __swig_setmethods__["variableNames"] = _TOSSIM.nesc_app_t_variableNames_set
-    __swig_getmethods__["variableNames"] = _TOSSIM.nesc_app_t_variableNames_get
-    if _newclass:variableNames = _swig_property(_TOSSIM.nesc_app_t_variableNames_get, _TOSSIM.nesc_app_t_variableNames_set)
-    __swig_setmethods__["variableTypes"] = _TOSSIM.nesc_app_t_variableTypes_set
-    __swig_getmethods__["variableTypes"] = _TOSSIM.nesc_app_t_variableTypes_get
-    if _newclass:variableTypes = _swig_property(_TOSSIM.nesc_app_t_variableTypes_get, _TOSSIM.nesc_app_t_variableTypes_set)
-    __swig_setmethods__["variableArray"] = _TOSSIM.nesc_app_t_variableArray_set
-    __swig_getmethods__["variableArray"] = _TOSSIM.nesc_app_t_variableArray_get
-    if _newclass:variableArray = _swig_property(_TOSSIM.nesc_app_t_variableArray_get, _TOSSIM.nesc_app_t_variableArray_set)
-    def __init__(self, *args): 
-        this = _TOSSIM.new_nesc_app_t(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class nesc_app_t(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_nesc_app_t(*args)
     __swig_destroy__ = _TOSSIM.delete_nesc_app_t
-    __del__ = lambda self : None;
+    numVariables = property(_TOSSIM.nesc_app_t_numVariables_get, _TOSSIM.nesc_app_t_numVariables_set)
+    variableNames = property(_TOSSIM.nesc_app_t_variableNames_get, _TOSSIM.nesc_app_t_variableNames_set)
+    variableTypes = property(_TOSSIM.nesc_app_t_variableTypes_get, _TOSSIM.nesc_app_t_variableTypes_set)
+    variableArray = property(_TOSSIM.nesc_app_t_variableArray_get, _TOSSIM.nesc_app_t_variableArray_set)
 nesc_app_t_swigregister = _TOSSIM.nesc_app_t_swigregister
 nesc_app_t_swigregister(nesc_app_t)
 
-class Variable(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, Variable, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, Variable, name)
-    __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_Variable(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class Variable(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_Variable(*args)
     __swig_destroy__ = _TOSSIM.delete_Variable
-    __del__ = lambda self : None;
-    def getData(*args): return _TOSSIM.Variable_getData(*args)
+_bind(Variable, "Variable_", (
+    "getData",
+))
 Variable_swigregister = _TOSSIM.Variable_swigregister
 Variable_swigregister(Variable)
 
-class Mote(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, Mote, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, Mote, name)
-    __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_Mote(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class Mote(_Proxy):
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_Mote(*args)
     __swig_destroy__ = _TOSSIM.delete_Mote
-    __del__ = lambda self : None;
-    def id(*args): return _TOSSIM.Mote_id(*args)
-    def euid(*args): return _TOSSIM.Mote_euid(*args)
-    def setEuid(*args): return _TOSSIM.Mote_setEuid(*args)
-    def bootTime(*args): return _TOSSIM.Mote_bootTime(*args)
-    def bootAtTime(*args): return _TOSSIM.Mote_bootAtTime(*args)
-    def isOn(*args): return _TOSSIM.Mote_isOn(*args)
-    def turnOff(*args): return _TOSSIM.Mote_turnOff(*args)
-    def turnOn(*args): return _TOSSIM.Mote_turnOn(*args)
-    def getVariable(*args): return _TOSSIM.Mote_getVariable(*args)
-    def addNoiseTraceReading(*args): return _TOSSIM.Mote_addNoiseTraceReading(*args)
-    def createNoiseModel(*args): return _TOSSIM.Mote_createNoiseModel(*args)
-    def generateNoise(*args): return _TOSSIM.Mote_generateNoise(*args)
+    def addNoiseTrace(self, trace):
+        """Add every reading of trace to the noise trace of this mote.
+
+        trace can be any sequence of integers, an array('b') or another
+        buffer-protocol object.  Returns the number of readings added.
+        """
+        return _add_noise_trace([self.this], _noise_trace(trace))
+_bind(Mote, "Mote_", (
+    "id", "euid", "setEuid", "bootTime", "bootAtTime", "isOn", "turnOff",
+    "turnOn", "getVariable", "addNoiseTraceReading", "createNoiseModel",
+    "generateNoise",
+))
 Mote_swigregister = _TOSSIM.Mote_swigregister
 Mote_swigregister(Mote)
 
-class Tossim(_object):
-    __swig_setmethods__ = {}
-    __setattr__ = lambda self, name, value: _swig_setattr(self, Tossim, name, value)
-    __swig_getmethods__ = {}
-    __getattr__ = lambda self, name: _swig_getattr(self, Tossim, name)
-    __repr__ = _swig_repr
-    def __init__(self, *args): 
-        this = _TOSSIM.new_Tossim(*args)
-        try: self.this.append(this)
-        except: self.this = this
+class Tossim(_Proxy):
+    # __dict__ holds the bound methods on Python 3.
+    __slots__ = ('this', '__dict__')
+    def __init__(self, *args):
+        self.this = _TOSSIM.new_Tossim(*args)
     __swig_destroy__ = _TOSSIM.delete_Tossim
-    __del__ = lambda self : None;
-    def init(*args): return _TOSSIM.Tossim_init(*args)
-    def time(*args): return _TOSSIM.Tossim_time(*args)
-    def ticksPerSecond(*args): return _TOSSIM.Tossim_ticksPerSecond(*args)
-    def setTime(*args): return _TOSSIM.Tossim_setTime(*args)
-    def timeStr(*args): return _TOSSIM.Tossim_timeStr(*args)
-    def currentNode(*args): return _TOSSIM.Tossim_currentNode(*args)
-    def getNode(*args): return _TOSSIM.Tossim_getNode(*args)
-    def setCurrentNode(*args): return _TOSSIM.Tossim_setCurrentNode(*args)
-    def addChannel(*args): return _TOSSIM.Tossim_addChannel(*args)
-    def removeChannel(*args): return _TOSSIM.Tossim_removeChannel(*args)
-    def randomSeed(*args): return _TOSSIM.Tossim_randomSeed(*args)
-    def runNextEvent(*args): return _TOSSIM.Tossim_runNextEvent(*args)
-    def mac(*args): return _TOSSIM.Tossim_mac(*args)
-    def radio(*args): return _TOSSIM.Tossim_radio(*args)
-    def newPacket(*args): return _TOSSIM.Tossim_newPacket(*args)
-Tossim_swigregister = _TOSSIM.Tossim_swigregister
-Tossim_swigregister(Tossim)
+    def runEvents(self, n):
+        """Run up to n events; stops early when the event queue is empty.
 
+        Returns (events executed, time()).
+        """
+        this = self.this
+        step = _TOSSIM.Tossim_runNextEvent
+        count = 0
+        while count < n and step(this):
+            count += 1
+        return count, _TOSSIM.Tossim_time(this)
+    def runUntil(self, sim_time):
+        """Run events until time() reaches sim_time (in ticks).
 
+        Returns (events executed, time()).
+        """
+        this = self.this
+        step = _TOSSIM.Tossim_runNextEvent
+        now = _TOSSIM.Tossim_time
+        count = 0
+        while now(this) < sim_time and step(this):
+            count += 1
+        return count, now(this)
+    def runFor(self, duration):
+        """Run events for duration ticks of simulated time from now."""
+        return self.runUntil(_TOSSIM.Tossim_time(self.this) + duration)
+    def bootNodes(self, ids, times):
+        """Schedule the boot of every mote in ids at the matching tick in times."""
+        getNode = _TOSSIM.Tossim_getNode
+        boot = _TOSSIM.Mote_bootAtTime
+        count = 0
+        for i, at in _zip(ids, times):
+            boot(getNode(self, i).this, at)
+            count += 1
+        return count
+    def addChannels(self, names, out):
+        """Send the output of every debug channel in names to out."""
+        for name in names:
+            _TOSSIM.Tossim_addChannel(self, name, out)
+    def addNoiseTraceToNodes(self, ids, trace):
+        """Load the same noise trace into every mote listed in ids.
 
+        Each mote is looked up once and the trace is decoded once, so the
+        cost per reading is a single call into _TOSSIM.  Returns the number
+        of readings added to each mote.
+        """
+        motes = [_TOSSIM.Tossim_getNode(self, i).this for i in ids]
+        return _add_noise_trace(motes, _noise_trace(trace))
+_bind(Tossim, "Tossim_", (
+    "init", "time", "ticksPerSecond", "setTime", "timeStr", "currentNode",
+    "getNode", "setCurrentNode", "addChannel", "removeChannel", "randomSeed",
+    "runNextEvent", "mac", "radio", "newPacket",
+))
+Tossim_swigregister = _TOSSIM.Tossim_swigregister
+Tossim_swigregister(Tossim)
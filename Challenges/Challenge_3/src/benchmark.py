@@ -0,0 +1,401 @@
+"""
+Benchmarks for the TOSSIM simulation harness: noise trace loading,
+topology loading, node creation, debug channel output, event stepping
+and the per-call overhead of the TOSSIM.py proxy classes.
+
+    python benchmark.py [--save BASELINE.json] [--compare BASELINE.json]
+
+The real _TOSSIM module is used when it can be loaded, otherwise the
+pure-Python stand-in from tossim_standin.py; TOSSIM_BACKEND=real or
+TOSSIM_BACKEND=standin in the environment forces one of them.  Numbers
+from the two backends are not comparable with each other, and baselines
+record which one produced them.
+
+The RadioRoute scenario (radioroute.json) is built with its debug output
+discarded, so stepping runs the same events as RunSimulationScript.py;
+each stepping loop gets a freshly built, identically seeded copy of it
+and the best of a few repeats counts.  The other benchmarks use motes
+outside the scenario that have not been touched before, so the numbers
+are not skewed by noise traces left behind by a previous run; those motes
+are booted far in the future, after every event the benchmarks run.
+
+--save writes every measurement (in seconds, lower is better) to a JSON
+baseline file.  --compare reports the measurements that got slower than
+the baseline by more than --tolerance and exits with status 1 if there
+are any.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import tossim_standin
+
+# Must run before anything imports TOSSIM.
+BACKEND = tossim_standin.install(os.environ.get("TOSSIM_BACKEND", "auto"))
+
+import _TOSSIM
+from dbglog import ChannelRecorder, DebugLogWriter
+from noisetrace import read_trace
+from scenario import Scenario
+from topology import read_topology, write_binary_topology, write_text_topology
+
+BASELINE_VERSION = 1
+NOISE_FILE = "meyer-heavy.txt"
+NOISE_SAMPLES = 10000
+NODE_COUNTS = (7, 25, 100, 250)
+SCENARIO_FILE = "radioroute.json"
+STEP_EVENTS = 100000
+# Every loop runs on a freshly built scenario; the best repeat counts.
+STEP_REPEATS = 3
+# Seeds the scenario when it has no seed of its own, so every build runs
+# the same events.
+STEP_SEED = 1
+CHANNEL_EVENTS = 1200
+# The channel outputs take turns, so each sees every part of the run.
+CHANNEL_ROUNDS = 5
+PROXY_CALLS = 200000
+TOPOLOGY_NEIGHBOURS = 16
+FAR_FUTURE_S = 3600
+TOLERANCE = 0.25
+# Differences below this are timer noise, whatever the ratio.
+MIN_DIFFERENCE_S = 0.002
+
+
+def noise_per_sample(t, ids, samples):
+    # The loop RunSimulationScript.py used before the bulk API existed.
+    for val in samples:
+        for i in ids:
+            t.getNode(i).addNoiseTraceReading(val)
+
+
+def noise_bulk(t, ids, samples):
+    t.addNoiseTraceToNodes(ids, samples)
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+class _IdAllocator(object):
+    """Hands out ranges of mote ids that no benchmark has used yet."""
+
+    def __init__(self, first=1):
+        self.next_id = first
+
+    def take(self, count):
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+
+def bench_noise_loading(t, ids, samples, out=sys.stdout):
+    """Returns the results and the id groups that now hold a noise trace."""
+    out.write("Noise trace loading (%d samples per node)\n" % len(samples))
+    out.write("%8s %14s %14s %9s\n" % ("nodes", "per-sample [s]", "bulk [s]", "speedup"))
+    results = {}
+    loaded = []
+    for n in NODE_COUNTS:
+        old_ids, new_ids = ids.take(n), ids.take(n)
+        old = timed(noise_per_sample, t, old_ids, samples)
+        new = timed(noise_bulk, t, new_ids, samples)
+        out.write("%8d %14.3f %14.3f %8.1fx\n" % (n, old, new, old / max(new, 1e-9)))
+        results["noise/per_sample/%d" % n] = old
+        results["noise/bulk/%d" % n] = new
+        loaded.extend((old_ids, new_ids))
+    return results, loaded
+
+
+def create_nodes(t, ids, at):
+    t.bootNodes(ids, [at] * len(ids))
+    for i in ids:
+        t.getNode(i).createNoiseModel()
+
+
+def bench_node_creation(t, groups, out=sys.stdout):
+    """Boot the motes of every group and build their noise models."""
+    out.write("Node creation (bootNodes + createNoiseModel)\n")
+    out.write("%8s %14s %14s\n" % ("nodes", "total [s]", "per node [ms]"))
+    at = FAR_FUTURE_S * t.ticksPerSecond()
+    results = {}
+    for ids in groups[1::2]:
+        seconds = timed(create_nodes, t, ids, at)
+        out.write("%8d %14.3f %14.3f\n" % (len(ids), seconds, seconds / len(ids) * 1e3))
+        results["nodes/create/%d" % len(ids)] = seconds
+    for ids in groups[0::2]:
+        # Boot the rest as well, so none of them is left without a model.
+        create_nodes(t, ids, at)
+    return results
+
+
+def ring_links(ids, neighbours, seed=1):
+    rng = random.Random(seed)
+    src, dst, gain = [], [], []
+    n = len(ids)
+    for k, i in enumerate(ids):
+        for step in range(1, neighbours + 1):
+            src.append(i)
+            dst.append(ids[(k + step) % n])
+            gain.append(round(rng.uniform(-90.0, -50.0), 1))
+    return src, dst, gain
+
+
+def bench_topology_loading(t, ids, out=sys.stdout):
+    src, dst, gain = ring_links(ids, TOPOLOGY_NEIGHBOURS)
+    out.write("Topology loading (%d links)\n" % len(src))
+    out.write("%24s %14s\n" % ("step", "time [s]"))
+    tmp = tempfile.mkdtemp(prefix="bench_topo_")
+    try:
+        text_path = os.path.join(tmp, "links.txt")
+        binary_path = os.path.join(tmp, "links.ntop")
+        write_text_topology(text_path, src, dst, gain)
+        write_binary_topology(binary_path, src, dst, gain)
+        results = {
+            "topology/read_text": timed(read_topology, text_path),
+            "topology/read_binary": timed(read_topology, binary_path),
+        }
+        columns = read_topology(binary_path)
+        results["topology/add_links"] = timed(t.radio().addLinks, *columns)
+    finally:
+        shutil.rmtree(tmp)
+    for name in ("topology/read_text", "topology/read_binary", "topology/add_links"):
+        out.write("%24s %14.3f\n" % (name.split("/")[1], results[name]))
+    return results
+
+
+def run_channels_to_file(t, channels, n):
+    fd, path = tempfile.mkstemp(prefix="bench_log_", suffix=".txt")
+    os.close(fd)
+    f = open(path, "w")
+    try:
+        t.addChannels(channels, f)
+        start = time.time()
+        count, _ = t.runEvents(n)
+        for name in channels:
+            t.removeChannel(name, f)
+        f.close()
+        seconds = time.time() - start
+    finally:
+        f.close()
+        os.remove(path)
+    return count, seconds
+
+
+def run_channels_to_dbglog(t, channels, n):
+    fd, path = tempfile.mkstemp(prefix="bench_log_", suffix=".tdbg")
+    os.close(fd)
+    try:
+        recorder = ChannelRecorder(t, DebugLogWriter(path, channels))
+        start = time.time()
+        count, _ = recorder.runEvents(n)
+        recorder.close()
+        seconds = time.time() - start
+    finally:
+        os.remove(path)
+    return count, seconds
+
+
+def run_without_channels(t, channels, n):
+    start = time.time()
+    count, _ = t.runEvents(n)
+    return count, time.time() - start
+
+
+def bench_channel_output(t, channels, current, n=CHANNEL_EVENTS, rounds=CHANNEL_ROUNDS,
+                         out=sys.stdout):
+    """Step n events per round with the channels detached, to a text file
+    and to a binary debug log; current is the file the channels write to
+    now.  Times include closing the output."""
+    out.write("Debug channel output (%d x %d events, %d channels)\n" % (rounds, n, len(channels)))
+    out.write("%16s %10s %14s\n" % ("output", "events", "events/s"))
+    for name in channels:
+        t.removeChannel(name, current)
+    outputs = (("none", run_without_channels), ("text", run_channels_to_file),
+               ("dbglog", run_channels_to_dbglog))
+    totals = dict((name, [0, 0.0]) for name, _ in outputs)
+    try:
+        for _ in range(rounds):
+            for name, func in outputs:
+                count, seconds = func(t, channels, n)
+                totals[name][0] += count
+                totals[name][1] += seconds
+    finally:
+        t.addChannels(channels, current)
+    results = {}
+    for name, _ in outputs:
+        count, seconds = totals[name]
+        out.write("%16s %10d %14.0f\n" % (name, count, count / max(seconds, 1e-9)))
+        results["channels/%s" % name] = seconds
+    return results
+
+
+def step_per_event(t, n):
+    # The loop RunSimulationScript.py used before runEvents() existed.
+    start = t.time()
+    for i in range(0, n):
+        t.runNextEvent()
+    return n, t.time() - start
+
+
+def step_batched(t, n):
+    start = t.time()
+    count, end = t.runEvents(n)
+    return count, end - start
+
+
+def bench_stepping(scenario, current, n=STEP_EVENTS, repeats=STEP_REPEATS,
+                   out=sys.stdout):
+    """Step the first n events of the scenario with each loop, building it
+    afresh for every repeat, so both loops run the very same events; the
+    debug channels write to current."""
+    out.write("Event stepping (%d events per loop, best of %d)\n" % (n, repeats))
+    out.write("%16s %10s %14s %16s\n" % ("loop", "events", "events/s", "sim s / wall s"))
+    results = {}
+    for name, func in (("runNextEvent", step_per_event), ("runEvents", step_batched)):
+        seconds = None
+        for _ in range(repeats):
+            t = scenario.build(out=current)
+            start = time.time()
+            count, simulated = func(t, n)
+            elapsed = time.time() - start
+            if seconds is None or elapsed < seconds:
+                seconds = elapsed
+        ticks = float(t.ticksPerSecond())
+        wall = max(seconds, 1e-9)
+        out.write("%16s %10d %14.0f %16.2f\n" % (name + "()", count, count / wall,
+                                                 simulated / ticks / wall))
+        results["stepping/%s" % name] = seconds
+    return results
+
+
+class _TrampolineTossim(object):
+    # The call path of the SWIG generated proxies that TOSSIM.py replaced.
+    __swig_getmethods__ = {}
+    __getattr__ = lambda self, name: self.__swig_getmethods__[name](self)
+
+    def __init__(self, this):
+        self.__dict__["this"] = this
+
+    def time(*args): return _TOSSIM.Tossim_time(*args)
+
+
+class _TrampolineMote(_TrampolineTossim):
+    def isOn(*args): return _TOSSIM.Mote_isOn(*args)
+
+
+def call_time(proxy, n):
+    for _ in range(n):
+        proxy.time()
+
+
+def call_is_on(proxy, n):
+    for _ in range(n):
+        proxy.isOn()
+
+
+def bench_proxy_calls(t, node_id, n=PROXY_CALLS, out=sys.stdout):
+    out.write("Proxy call overhead (%d calls)\n" % n)
+    out.write("%16s %14s %14s %9s\n" % ("call", "SWIG [us]", "lean [us]", "speedup"))
+    mote = t.getNode(node_id)
+    results = {}
+    for name, func, old, new in (
+            ("Tossim.time", call_time, _TrampolineTossim(t.this), t),
+            ("Mote.isOn", call_is_on, _TrampolineMote(mote.this), mote)):
+        old_s = timed(func, old, n)
+        new_s = timed(func, new, n)
+        out.write("%16s %14.3f %14.3f %8.1fx\n"
+                  % (name + "()", old_s / n * 1e6, new_s / n * 1e6, old_s / max(new_s, 1e-9)))
+        results["proxy/%s/swig" % name] = old_s
+        results["proxy/%s/lean" % name] = new_s
+    return results
+
+
+def save_baseline(path, results):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "backend": BACKEND,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    f = open(path, "w")
+    try:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+
+def compare_baseline(path, results, tolerance=TOLERANCE, out=sys.stdout):
+    """Report the results slower than the baseline; returns their names."""
+    f = open(path, "r")
+    try:
+        baseline = json.load(f)
+    finally:
+        f.close()
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError("%s: unsupported baseline version" % path)
+    if baseline.get("backend") != BACKEND:
+        out.write("warning: baseline was measured with %s, this run uses %s\n"
+                  % (baseline.get("backend"), BACKEND))
+    out.write("Comparison with %s (tolerance %.0f%%)\n" % (path, tolerance * 100))
+    out.write("%32s %12s %12s %9s\n" % ("measurement", "baseline [s]", "now [s]", "change"))
+    regressions = []
+    for name in sorted(results):
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        now = results[name]
+        change = (now - before) / before if before > 0 else 0.0
+        slower = change > tolerance and now - before > MIN_DIFFERENCE_S
+        if slower:
+            regressions.append(name)
+        out.write("%32s %12.4f %12.4f %+8.0f%%%s\n"
+                  % (name, before, now, change * 100, "  SLOWER" if slower else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TOSSIM simulation harness.")
+    parser.add_argument("--save", metavar="BASELINE", help="write the results to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with this baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown as a fraction (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    sys.stdout.write("Backend: %s\n" % BACKEND)
+    devnull = open(os.devnull, "w")
+    scenario = Scenario.from_file(SCENARIO_FILE)
+    scenario.config.setdefault("seed", STEP_SEED)
+    t = scenario.build(out=devnull)
+    channels = scenario.config.get("channels", [])
+    samples = read_trace(NOISE_FILE, NOISE_SAMPLES)
+
+    results = {}
+    noise, groups = bench_noise_loading(t, _IdAllocator(max(scenario.node_ids) + 1), samples)
+    results.update(noise)
+    results.update(bench_node_creation(t, groups))
+    results.update(bench_topology_loading(t, [i for ids in groups for i in ids]))
+    results.update(bench_channel_output(t, channels, devnull))
+    results.update(bench_stepping(scenario, devnull))
+    results.update(bench_proxy_calls(t, scenario.node_ids[0]))
+    devnull.close()
+
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        if compare_baseline(args.compare, results, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""
+Structured binary log for TOSSIM debug channels.
+
+Instead of appending free text such as
+
+    DEBUG (3): [RADIO_SEND] Sending message of type 1 from 3 to 65535 passing by 65535.
+
+to tossim_log.txt, the lines are stored in batches of the lines one
+channel printed in one event:
+
+    offset  size  field
+    0       8     simulation time in ticks
+    8       2     channel id (index into the channel table)
+    10      4     length n of the lines
+    14      n     the lines as TOSSIM printed them, UTF-8, each ending in "\n"
+
+The recorder never parses the lines; the reader splits every line into
+node id, level (0 for dbg, 1 for dbgerror) and message text.  Lines that
+are not in the "DEBUG (n): " format are kept as they are and read back
+with node NO_NODE.  Version 1 logs, with one fixed-layout record
+per line, are still readable.
+
+Batches are grouped into zlib-compressed chunks.  Each chunk header holds
+the time range it covers, and a time index of all chunks is written at the
+end of the file, so readers can skip to the part of a run they need.  A
+log that was never closed (a crashed run) is still readable by scanning
+its chunks.
+
+Recording a simulation:
+
+    log = DebugLogWriter("run.tdbg", ["boot", "radio_send", "radio_rec"])
+    recorder = ChannelRecorder(t, log)
+    recorder.runEvents(2400)
+    recorder.close()
+
+_TOSSIM writes debug output with C stdio into the file object handed to
+addChannel, so the recorder hands the channels small scratch files,
+notes after every event where its output ends, and every drain_every
+events moves the output into the log, one batch per event and channel,
+and truncates the scratch files again; no text log ever grows on disk.
+"""
+
+import json
+import os
+import re
+import struct
+import tempfile
+import zlib
+from collections import deque
+
+MAGIC = b"TDBG"
+VERSION = 2
+FILE_HEADER = struct.Struct("<4sBI")
+CHUNK_HEADER = struct.Struct("<4sIIIQQ")
+CHUNK_MAGIC = b"CHNK"
+BATCH = struct.Struct("<QHI")
+# Version 1: one record per line, the text without the "DEBUG (n): " prefix.
+RECORD = struct.Struct("<QHHBH")
+INDEX_ENTRY = struct.Struct("<QIQQ")
+TRAILER = struct.Struct("<4sQI")
+TRAILER_MAGIC = b"TIDX"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_DRAIN_EVERY = 4096
+
+LEVEL_DEBUG = 0
+LEVEL_ERROR = 1
+
+# Node of the lines without a "DEBUG (n): " prefix.
+NO_NODE = -1
+
+_LINE = re.compile(r"(DEBUG|ERROR) \((\d+)\): ?(.*)")
+
+
+class DebugLogError(ValueError):
+    pass
+
+
+def parse_line(line):
+    """Split a TOSSIM debug line into (node, level, text), or None."""
+    m = _LINE.match(line.rstrip("\r\n"))
+    if m is None:
+        return None
+    level = LEVEL_ERROR if m.group(1) == "ERROR" else LEVEL_DEBUG
+    return int(m.group(2)), level, m.group(3)
+
+
+class DebugLogWriter(object):
+    """Appends debug records to a chunked, compressed binary log."""
+
+    def __init__(self, path, channels, chunk_size=DEFAULT_CHUNK_SIZE, level=1):
+        self.path = path
+        self.channels = list(channels)
+        self.channel_ids = dict((name, i) for i, name in enumerate(self.channels))
+        self.chunk_size = chunk_size
+        self.level = level
+        self.index = []
+        self.records = 0
+        self._buffer = bytearray()
+        self._count = 0
+        self._first = self._last = None
+        self._file = open(path, "wb")
+        table = json.dumps(self.channels).encode("utf-8")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(table)))
+        self._file.write(table)
+
+    def append(self, sim_time, node, channel, text, level=LEVEL_DEBUG):
+        """Add one line; channel is a name from the channel table or its id.
+
+        node is NO_NODE for a line that carries no node id.
+        """
+        data = text if isinstance(text, bytes) else text.encode("utf-8")
+        if node != NO_NODE:
+            prefix = "%s (%d): " % ("ERROR" if level == LEVEL_ERROR else "DEBUG", node)
+            data = prefix.encode("ascii") + data
+        self.append_lines(sim_time, channel, data + b"\n")
+
+    def append_lines(self, sim_time, channel, data):
+        """Add the lines TOSSIM printed, as bytes each ending in "\\n"."""
+        if not data:
+            return
+        if not isinstance(channel, int):
+            channel = self.channel_ids[channel]
+        self._buffer += BATCH.pack(sim_time, channel, len(data))
+        self._buffer += data
+        if self._first is None:
+            self._first = sim_time
+        self._last = sim_time
+        self._count += data.count(b"\n")
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Compress and write the lines buffered so far as one chunk."""
+        if not self._count:
+            return
+        payload = zlib.compress(bytes(self._buffer), self.level)
+        offset = self._file.tell()
+        self._file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(payload), len(self._buffer),
+                                           self._count, self._first, self._last))
+        self._file.write(payload)
+        self.index.append((offset, self._count, self._first, self._last))
+        self.records += self._count
+        self._buffer = bytearray()
+        self._count = 0
+        self._first = self._last = None
+
+    def close(self):
+        """Flush the last chunk and write the time index."""
+        if self._file is None:
+            return
+        self.flush()
+        index_offset = self._file.tell()
+        for entry in self.index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(TRAILER.pack(TRAILER_MAGIC, index_offset, len(self.index)))
+        self._file.close()
+        self._file = None
+
+
+class DebugLogReader(object):
+    """Reads records back from a binary debug log."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        header = self._file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise DebugLogError("%s: truncated header" % path)
+        magic, version, table_len = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise DebugLogError("%s: not a version 1 or %d debug log" % (path, VERSION))
+        self.version = version
+        self.channels = json.loads(self._file.read(table_len).decode("utf-8"))
+        self._data_start = FILE_HEADER.size + table_len
+        self.index = self._read_index()
+
+    def _read_index(self):
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size >= self._data_start + TRAILER.size:
+            f.seek(size - TRAILER.size)
+            magic, offset, count = TRAILER.unpack(f.read(TRAILER.size))
+            if magic == TRAILER_MAGIC and offset + count * INDEX_ENTRY.size + TRAILER.size == size:
+                f.seek(offset)
+                raw = f.read(count * INDEX_ENTRY.size)
+                return [INDEX_ENTRY.unpack_from(raw, i * INDEX_ENTRY.size) for i in range(count)]
+        return self._scan_chunks(size)
+
+    def _scan_chunks(self, size):
+        # No trailer: the writer never closed the log, rebuild the index.
+        index = []
+        offset = self._data_start
+        f = self._file
+        while offset + CHUNK_HEADER.size <= size:
+            f.seek(offset)
+            magic, clen, _, count, first, last = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + clen > size:
+                break
+            index.append((offset, count, first, last))
+            offset += CHUNK_HEADER.size + clen
+        return index
+
+    def __len__(self):
+        return sum(count for _, count, _, _ in self.index)
+
+    def _chunk(self, offset):
+        f = self._file
+        f.seek(offset)
+        _, clen, rlen, count, _, _ = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        raw = zlib.decompress(f.read(clen))
+        pos = 0
+        if self.version == 1:
+            for _ in range(count):
+                sim_time, node, channel, level, n = RECORD.unpack_from(raw, pos)
+                pos += RECORD.size
+                yield sim_time, node, channel, level, raw[pos:pos + n].decode("utf-8")
+                pos += n
+            return
+        while pos < len(raw):
+            sim_time, channel, n = BATCH.unpack_from(raw, pos)
+            pos += BATCH.size
+            lines = raw[pos:pos + n].decode("utf-8", "replace").split("\n")
+            pos += n
+            for line in lines[:-1]:
+                parsed = parse_line(line)
+                if parsed is None:
+                    yield sim_time, NO_NODE, channel, LEVEL_DEBUG, line.rstrip("\r")
+                else:
+                    node, level, text = parsed
+                    yield sim_time, node, channel, level, text
+
+    def records(self, start=None, end=None, nodes=None, channels=None):
+        """Yield (time, node, channel, level, text) in log order.
+
+        start/end bound the simulation time in ticks (end exclusive); nodes
+        and channels restrict the node ids and channel names.  Chunks that
+        lie outside the time range are never decompressed.
+        """
+        if nodes is not None:
+            nodes = set(nodes)
+        if channels is not None:
+            channels = set(self.channels.index(name) for name in channels)
+        for offset, _, first, last in self.index:
+            if start is not None and last < start:
+                continue
+            if end is not None and first >= end:
+                break
+            for sim_time, node, channel, level, text in self._chunk(offset):
+                if start is not None and sim_time < start:
+                    continue
+                if end is not None and sim_time >= end:
+                    return
+                if nodes is not None and node not in nodes:
+                    continue
+                if channels is not None and channel not in channels:
+                    continue
+                yield sim_time, node, self.channels[channel], level, text
+
+    def close(self):
+        self._file.close()
+
+
+class ChannelRecorder(object):
+    """Routes the debug channels of a Tossim instance into a DebugLogWriter.
+
+    Every channel prints into one shared scratch stream, which keeps the
+    lines in the order TOSSIM printed them, and into a copy of its own,
+    which tells drain() the channel of each line.  runEvents() steps one
+    event at a time and notes where the output of each event ends in the
+    stream, so every line is stored with the simulation time of the event
+    that printed it; the scratch files are drained into the log every
+    drain_every events.  Output printed outside runEvents() gets the time
+    of the next event or drain.
+
+    Lines are matched to their channel by text: a line printed on several
+    channels at once, or the very same line printed on two channels within
+    one drain, may be stored under any of them.  unparsed counts the lines
+    without a "DEBUG (n): " or "ERROR (n): " prefix, read back with node
+    NO_NODE.
+    """
+
+    def __init__(self, t, writer, drain_every=DEFAULT_DRAIN_EVERY):
+        self.t = t
+        self.writer = writer
+        self.drain_every = max(1, drain_every)
+        self.unparsed = 0
+        self._stream = _scratch_file("tdbg_")
+        self._copies = []
+        # (end of the output of an event in the stream, time of the event)
+        self._bounds = []
+        self._pos = 0
+        for name in writer.channels:
+            t.addChannel(name, self._stream[0])
+            f, fd = _scratch_file("tdbg_%s_" % name)
+            t.addChannel(name, f)
+            self._copies.append((writer.channel_ids[name], f, fd))
+
+    def _run(self, n):
+        t = self.t
+        step, now, tell = t.runNextEvent, t.time, self._stream[0].tell
+        bounds = self._bounds
+        pos = tell()
+        if pos != self._pos:
+            bounds.append((pos, now()))
+        count = 0
+        while count < n and step():
+            count += 1
+            end = tell()
+            if end != pos:
+                bounds.append((end, now()))
+                pos = end
+        self._pos = pos
+        return count
+
+    def drain(self):
+        """Move everything the channels printed so far into the log."""
+        data = _take(*self._stream)
+        owners = {}
+        for channel, f, fd in self._copies:
+            for line in _take(f, fd).split(b"\n"):
+                owners.setdefault(line, deque()).append(channel)
+        bounds, self._bounds, self._pos = self._bounds, [], 0
+        if not data:
+            return
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        if not bounds or bounds[-1][0] < len(data):
+            bounds.append((len(data), self.t.time()))
+        # The bytes go into the log as they are, parsed only when read.
+        starts = b"\n" + data
+        self.unparsed += data.count(b"\n") - starts.count(b"\nDEBUG (") \
+            - starts.count(b"\nERROR (")
+        append = self.writer.append_lines
+        lines = data.split(b"\n")
+        owner = self._copies[0][0]
+        start = first = 0
+        for end, sim_time in bounds:
+            last = first + data.count(b"\n", start, end)
+            run = first
+            for i in range(first, last):
+                queue = owners.get(lines[i])
+                channel = queue.popleft() if queue else owner
+                if channel != owner and i > run:
+                    append(sim_time, owner, b"\n".join(lines[run:i]) + b"\n")
+                    run = i
+                owner = channel
+            if last > run:
+                append(sim_time, owner, b"\n".join(lines[run:last]) + b"\n")
+            start, first = end, last
+
+    def runEvents(self, n):
+        """Run up to n events while recording; returns (events, time())."""
+        total = 0
+        while total < n:
+            step = min(self.drain_every, n - total)
+            count = self._run(step)
+            self.drain()
+            total += count
+            if count < step:
+                break
+        return total, self.t.time()
+
+    def close(self):
+        """Detach the channels, drain them and close the log."""
+        self.drain()
+        stream = self._stream[0]
+        for channel, f, fd in self._copies:
+            name = self.writer.channels[channel]
+            self.t.removeChannel(name, stream)
+            self.t.removeChannel(name, f)
+            f.close()
+            os.close(fd)
+        stream.close()
+        os.close(self._stream[1])
+        self._copies = []
+        self.writer.close()
+
+
+def _scratch_file(prefix):
+    fd, path = tempfile.mkstemp(prefix=prefix)
+    os.close(fd)
+    # Write-only, "w+" text files write about half as fast; _take() reads
+    # the bytes back through a descriptor of its own.
+    f = open(path, "w")
+    fd = os.open(path, os.O_RDONLY)
+    os.remove(path)
+    return f, fd
+
+
+def _take(f, fd):
+    """Return what was written to a scratch file and empty it."""
+    size = f.tell()
+    if size == 0:
+        return b""
+    f.flush()
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    # Emptied right away, the scratch file never reaches the disk.
+    f.seek(0)
+    f.truncate()
+    return b"".join(chunks)
@@ -0,0 +1,301 @@
+"""
+Trace-driven packet injection through Tossim.newPacket().
+
+A PacketSchedule holds rows of (time, receiving node, AM destination,
+AM type, payload), sorted by time, with the payloads already encoded to bytes and checked
+against the maximum packet length.  A PacketInjector hands them to the
+simulator as it advances:
+
+    schedule = PacketSchedule.from_csv("traffic.csv")
+    injector = PacketInjector(t, schedule)
+    injector.runUntil(60 * t.ticksPerSecond())
+
+Each packet is delivered to the mote given as its node; its AM
+destination address is dest, the node itself unless given (e.g.
+BROADCAST for a packet the mote should take as a broadcast).  Rather
+than filling the event queue with the whole trace up front, the injector
+only delivers the packets due within the next window_ms of simulated
+time, plus the first one after it so that the simulator cannot step over
+a packet that is not queued yet, and refills when the simulation reaches
+that packet; the queue stays small however long the trace is.
+
+Schedule files are CSV with a header and the columns time (seconds),
+node, dest, am_type, payload (hex) and optionally source; files without
+a node column deliver every packet to its dest.  A schedule can also
+be built from the publish frames of an MQTT capture such as
+Challenges/Challenge_2/resources/challenge2023_2.csv: every publish
+message becomes one packet at the time of its frame, its JSON payload
+encoded by encode_publish() as
+
+    topic index (uint16), unit (char), range low (int16), range high (int16)
+
+big endian, with the topic names in schedule.topics.
+
+    python injector.py challenge2023_2.csv traffic.csv --node 1 --am-type 10
+"""
+
+import argparse
+import binascii
+import csv
+import json
+import re
+import struct
+import sys
+
+import numpy
+
+TOSH_DATA_LENGTH = 28
+BROADCAST = 0xffff
+
+PUBLISH = struct.Struct(">Hchh")
+_PUBLISH_TOPIC = re.compile(r"Publish Message(?: \(id=\d+\))? \[([^\]]*)\]")
+
+
+class PacketSchedule(object):
+    """Packets to inject, as time-sorted columns and encoded payloads."""
+
+    def __init__(self, times, node, am_type, payloads, dest=None, source=None,
+                 max_length=TOSH_DATA_LENGTH):
+        """times are in seconds; node, am_type, dest and source are integers.
+
+        node is the mote each packet is delivered to and dest its AM
+        destination address, node by default.
+
+        payloads is a sequence of bytes-like objects or a structured
+        array of messages, e.g. from messages.codec(...).records().
+        """
+        count = len(payloads)
+        times = numpy.asarray(times, dtype=numpy.float64)
+        columns = [numpy.broadcast_to(numpy.asarray(c, dtype=numpy.int64), (count,))
+                   for c in (node, node if dest is None else dest, am_type,
+                             0 if source is None else source)]
+        if len(times) != count:
+            raise ValueError("times and payloads must have the same length")
+        if isinstance(payloads, numpy.ndarray) and payloads.dtype.names:
+            # A batch of messages.py records: cut its wire form per packet.
+            data, size = payloads.tobytes(), payloads.dtype.itemsize
+            payloads = [data[i:i + size] for i in range(0, len(data), size)]
+        encoded = []
+        for i, payload in enumerate(payloads):
+            if not isinstance(payload, bytes):
+                payload = bytes(bytearray(payload))
+            if len(payload) > max_length:
+                raise ValueError("payload %d is %d bytes, more than %d"
+                                 % (i, len(payload), max_length))
+            encoded.append(payload)
+        order = numpy.argsort(times, kind="mergesort")
+        self.times = times[order]
+        self.node, self.dest, self.am_type, self.source = [c[order] for c in columns]
+        self.payloads = [encoded[i] for i in order]
+        self.topics = []
+
+    def __len__(self):
+        return len(self.payloads)
+
+    @classmethod
+    def from_csv(cls, path):
+        times, node, dest, am_type, payloads, source = [], [], [], [], [], []
+        f = open(path, "r")
+        try:
+            for row in csv.DictReader(f):
+                times.append(float(row["time"]))
+                dest.append(int(row["dest"]))
+                node.append(int(row.get("node") or row["dest"]))
+                am_type.append(int(row["am_type"]))
+                payloads.append(binascii.unhexlify(row["payload"].strip()))
+                source.append(int(row.get("source") or 0))
+        finally:
+            f.close()
+        return cls(times, node, am_type, payloads, dest, source)
+
+    def write_csv(self, path):
+        f = open(path, "w")
+        try:
+            f.write("time,node,dest,am_type,payload,source\n")
+            for k in range(len(self)):
+                f.write("%.9f,%d,%d,%d,%s,%d\n" % (
+                    self.times[k], self.node[k], self.dest[k],
+                    self.am_type[k],
+                    binascii.hexlify(self.payloads[k]).decode("ascii"), self.source[k]))
+        finally:
+            f.close()
+        return len(self)
+
+    @classmethod
+    def from_mqtt_capture(cls, path, node, am_type=0, start=0.0, encode=None, dest=None):
+        """One packet per publish message of a Wireshark CSV export.
+
+        Every packet goes to mote node, with AM destination dest (node by
+        default).  The first frame is placed at start seconds.  encode(topic_index,
+        payload) turns the decoded JSON payload (None if there is none)
+        into bytes; encode_publish() by default.
+        """
+        encode = encode or encode_publish
+        topics = {}
+        times, payloads = [], []
+        first = None
+        for when, topic, payload in publish_messages(path):
+            if first is None:
+                first = when
+            index = topics.setdefault(topic, len(topics))
+            times.append(when - first + start)
+            payloads.append(encode(index, payload))
+        schedule = cls(times, node, am_type, payloads, dest)
+        schedule.topics = sorted(topics, key=topics.get)
+        return schedule
+
+
+def publish_messages(path):
+    """Yield (time, topic, payload) for every publish message of a capture.
+
+    The Info column lists the publish messages of a frame and the Message
+    column their payloads, comma separated in the same order.
+    """
+    f = open(path, "r")
+    try:
+        for row in csv.DictReader(f):
+            topics = _PUBLISH_TOPIC.findall(row["Info"])
+            if not topics:
+                continue
+            message = row.get("Message") or ""
+            try:
+                payloads = json.loads("[" + message + "]")
+            except ValueError:
+                payloads = []
+            when = float(row["Time"])
+            for i, topic in enumerate(topics):
+                yield when, topic, payloads[i] if i < len(payloads) else None
+    finally:
+        f.close()
+
+
+def encode_publish(topic_index, payload):
+    """Pack a sensor publish payload into PUBLISH."""
+    unit, low, high = b"?", 0, 0
+    if isinstance(payload, dict):
+        unit = (payload.get("unit") or "?")[:1].encode("ascii")
+        value_range = payload.get("range") or (0, 0)
+        low, high = int(value_range[0]), int(value_range[1])
+    return PUBLISH.pack(topic_index, unit, low, high)
+
+
+class PacketInjector(object):
+    """Delivers a PacketSchedule to a simulator as it advances."""
+
+    def __init__(self, t, schedule, window_ms=1000):
+        self.t = t
+        self.schedule = schedule
+        ticks_per_second = t.ticksPerSecond()
+        # The schedule is in seconds; the tick rate is the simulator's own.
+        self.ticks = (schedule.times * ticks_per_second).astype(numpy.int64)
+        self.window = int(window_ms * ticks_per_second / 1000.0)
+        self.next = 0
+
+    def remaining(self):
+        return len(self.schedule) - self.next
+
+    def inject(self, until):
+        """Deliver every scheduled packet due before tick until.
+
+        Packets whose time has already passed are delivered now.  Returns
+        the number of packets delivered.
+        """
+        s = self.schedule
+        first = self.next
+        last = int(numpy.searchsorted(self.ticks, until, "left"))
+        if last <= first:
+            return 0
+        t = self.t
+        new = t.newPacket
+        now = t.time()
+        ticks = numpy.maximum(self.ticks[first:last], now).tolist()
+        node = s.node[first:last].tolist()
+        dest = s.dest[first:last].tolist()
+        am_type = s.am_type[first:last].tolist()
+        source = s.source[first:last].tolist()
+        payloads = s.payloads
+        for k in range(last - first):
+            packet = new()
+            packet.setSource(source[k])
+            packet.setDestination(dest[k])
+            packet.setType(am_type[k])
+            packet.setData(payloads[first + k])
+            packet.deliver(node[k], ticks[k])
+        self.next = last
+        return last - first
+
+    def _horizon(self, now):
+        # The end of the next window, skipping idle time before the next packet.
+        if self.next < len(self.schedule):
+            now = max(now, int(self.ticks[self.next]))
+        return now + self.window
+
+    def _refill(self, now):
+        """Deliver the next window and the first packet after it.
+
+        Returns the tick of that last packet (or the window end when none
+        is left): the simulation cannot pass it before the next refill.
+        """
+        horizon = self._horizon(now)
+        self.inject(horizon)
+        if self.remaining():
+            horizon = int(self.ticks[self.next])
+            self.inject(horizon + 1)
+        return horizon
+
+    def runEvents(self, n):
+        """Like Tossim.runEvents(), injecting the packets on the way."""
+        t = self.t
+        step = t.runNextEvent
+        count = 0
+        horizon = None
+        while count < n:
+            now = t.time()
+            if horizon is None or now >= horizon:
+                horizon = self._refill(now)
+            if step():
+                count += 1
+            elif self.remaining():
+                horizon = None
+            else:
+                break
+        return count, t.time()
+
+    def runUntil(self, sim_time):
+        """Like Tossim.runUntil(), injecting the packets on the way."""
+        t = self.t
+        count = 0
+        now = t.time()
+        while now < sim_time:
+            at = min(self._refill(now), sim_time)
+            executed, now = t.runUntil(at)
+            count += executed
+            if now < at and (at == sim_time or not self.remaining()):
+                # The event queue ran dry.
+                break
+        return count, now
+
+    def runFor(self, duration):
+        return self.runUntil(self.t.time() + duration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Turn the publish messages of an MQTT capture into a packet schedule.")
+    parser.add_argument("capture", help="Wireshark CSV export")
+    parser.add_argument("out", help="schedule CSV to write")
+    parser.add_argument("--node", type=int, required=True, help="mote receiving the packets")
+    parser.add_argument("--dest", type=int,
+                        help="AM destination address, the node by default (%d: broadcast)" % BROADCAST)
+    parser.add_argument("--am-type", type=int, default=0)
+    parser.add_argument("--start", type=float, default=0.0, help="time of the first frame [s]")
+    args = parser.parse_args(argv)
+    schedule = PacketSchedule.from_mqtt_capture(args.capture, args.node, args.am_type, args.start,
+                                                dest=args.dest)
+    count = schedule.write_csv(args.out)
+    print("Wrote %d packets on %d topics to %s" % (count, len(schedule.topics), args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Opt-in instrumentation of the TOSSIM.py proxy classes.
+
+    prof = Profiler()
+    prof.enable()
+    with prof.phase("build"):
+        t = scenario.build()
+    with prof.phase("run"):
+        t.runEvents(2400)
+    prof.disable()
+    prof.write_json("profile.json")
+    prof.write_folded("profile.folded")
+
+While a profiler is enabled every public method of Tossim, Mote and Radio
+is replaced on the class by a wrapper that counts the calls and their wall
+time.  The stepping methods (runNextEvent, runEvents, runUntil, runFor)
+also record the events executed and the simulated time they covered.
+disable() puts the original methods back, so a disabled profiler costs
+nothing at all.
+
+Calls are attributed to the stack of open phases and wrapped calls, and
+write_folded() produces the "a;b;c <microseconds>" folded stack format
+read by flamegraph.pl, speedscope and similar tools.  Calls that _TOSSIM
+makes internally (such as the events run inside runEvents) are not seen.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+import _TOSSIM
+from TOSSIM import Mote, Radio, Tossim
+
+CLASSES = (Tossim, Mote, Radio)
+STEPPING = ("runNextEvent", "runEvents", "runUntil", "runFor")
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class _CallStats(object):
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+
+class Profiler(object):
+    """Collects per-method call counts, wall time and stepping throughput."""
+
+    _active = None
+
+    def __init__(self):
+        self.methods = {}
+        self.stacks = {}
+        self.events = 0
+        self.sim_ticks = 0
+        self.step_seconds = 0.0
+        self.ticks_per_second = None
+        self._stack = []
+        self._saved = []
+        self._stepping = 0
+
+    @property
+    def enabled(self):
+        return bool(self._saved)
+
+    def enable(self):
+        """Wrap the proxy methods; only one profiler can be enabled at once."""
+        if Profiler._active is not None:
+            raise RuntimeError("another Profiler is already enabled")
+        for cls in CLASSES:
+            for name, method in sorted(vars(cls).items()):
+                if name.startswith("_") or not callable(method):
+                    continue
+                self._saved.append((cls, name, method))
+                setattr(cls, name, self._wrap(cls.__name__ + "." + name, method,
+                                              name in STEPPING))
+        Profiler._active = self
+
+    def disable(self):
+        """Restore the original methods."""
+        for cls, name, method in self._saved:
+            setattr(cls, name, method)
+        self._saved = []
+        if Profiler._active is self:
+            Profiler._active = None
+
+    def _enter(self, name):
+        # Each frame is [folded key, time spent in nested frames].
+        stack = self._stack
+        key = stack[-1][0] + ";" + name if stack else name
+        stack.append([key, 0.0])
+
+    def _leave(self, elapsed):
+        key, inner = self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        self.stacks[key] = self.stacks.get(key, 0.0) + max(0.0, elapsed - inner)
+
+    def _count(self, name, elapsed):
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = _CallStats()
+        stats.calls += 1
+        stats.seconds += elapsed
+
+    def _wrap(self, name, method, stepping):
+        enter, leave, count = self._enter, self._leave, self._count
+        if not stepping:
+            def wrapper(self, *args):
+                enter(name)
+                start = _clock()
+                try:
+                    return method(self, *args)
+                finally:
+                    elapsed = _clock() - start
+                    leave(elapsed)
+                    count(name, elapsed)
+            return wrapper
+
+        profiler = self
+        now = _TOSSIM.Tossim_time
+
+        def stepper(self, *args):
+            if profiler.ticks_per_second is None:
+                profiler.ticks_per_second = _TOSSIM.Tossim_ticksPerSecond(self.this)
+            enter(name)
+            sim_start = now(self.this)
+            profiler._stepping += 1
+            start = _clock()
+            try:
+                result = method(self, *args)
+            finally:
+                elapsed = _clock() - start
+                profiler._stepping -= 1
+                leave(elapsed)
+                count(name, elapsed)
+            if profiler._stepping:
+                # runFor() runs through runUntil(); count the events once.
+                return result
+            if isinstance(result, tuple):
+                profiler.events += result[0]
+            elif result:
+                profiler.events += 1
+            profiler.sim_ticks += now(self.this) - sim_start
+            profiler.step_seconds += elapsed
+            return result
+        return stepper
+
+    @contextmanager
+    def phase(self, name):
+        """Attribute everything called inside the block to phase name."""
+        self._enter(name)
+        start = _clock()
+        try:
+            yield
+        finally:
+            self._leave(_clock() - start)
+
+    def stepping(self):
+        """Return events, events/s and the sim-time/wall-time ratio."""
+        wall = self.step_seconds
+        simulated = 0.0
+        if self.ticks_per_second:
+            simulated = float(self.sim_ticks) / self.ticks_per_second
+        return {
+            "events": self.events,
+            "wall_s": wall,
+            "sim_s": simulated,
+            "events_per_s": self.events / wall if wall else 0.0,
+            "sim_wall_ratio": simulated / wall if wall else 0.0,
+        }
+
+    def to_dict(self):
+        methods = dict((name, {"calls": s.calls, "seconds": s.seconds})
+                       for name, s in self.methods.items())
+        return {"methods": methods, "stepping": self.stepping()}
+
+    def write_json(self, path):
+        f = open(path, "w")
+        try:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    def write_folded(self, path):
+        """Write folded stacks with self time in microseconds."""
+        f = open(path, "w")
+        try:
+            for key in sorted(self.stacks):
+                micros = int(round(self.stacks[key] * 1e6))
+                if micros > 0:
+                    f.write("%s %d\n" % (key, micros))
+        finally:
+            f.close()
+
+    def report(self, out=sys.stdout):
+        out.write("%-32s %10s %12s %12s\n" % ("method", "calls", "total [s]", "per call [us]"))
+        ranked = sorted(self.methods.items(), key=lambda item: -item[1].seconds)
+        for name, s in ranked:
+            out.write("%-32s %10d %12.3f %12.2f\n"
+                      % (name, s.calls, s.seconds, s.seconds / s.calls * 1e6))
+        step = self.stepping()
+        out.write("%d events, %.0f events/s, %.2f sim s / wall s\n"
+                  % (step["events"], step["events_per_s"], step["sim_wall_ratio"]))
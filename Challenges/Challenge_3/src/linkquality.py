@@ -0,0 +1,197 @@
+"""
+Expected link quality from link gains and a noise trace.
+
+TOSSIM decides every reception from the signal to noise ratio through the
+PRR curve of its CpmModelC, with the noise drawn from the model built out
+of the mote's noise trace.  Averaging that curve over the distribution of
+the noise readings gives the expected packet reception ratio of a link
+before anything is simulated:
+
+    readings = read_trace("meyer-heavy.txt", 10000)
+    src, dst, gain = read_topology("topology.txt")
+    snr, prr = link_quality(gain, noise_distribution(readings))
+    src, dst, gain = prune_links(src, dst, gain, prr, min_prr=0.9)
+
+link_quality() accepts gains of any shape: the (src, dst, gain) columns
+of a topology, or a dense N x N matrix from gain_matrix() with NaN for
+missing links.  The expected PRR only depends on the gain, so it is
+tabulated once over the range of gains present and every link is then
+interpolated in a single vectorised pass, in blocks of BLOCK_VALUES to
+keep the temporaries small.  For a 10k node random geometric network
+that takes a few hundredths of a second on its link columns, and about
+a second on its dense 10001 x 10001 gain matrix.
+Gains below the radio sensitivity get a PRR of 0, as TOSSIM never locks
+onto such signals.
+
+    python linkquality.py topology.txt meyer-heavy.txt [--min-prr 0.9] [--out pruned.txt]
+"""
+
+import argparse
+import math
+import sys
+
+import numpy
+
+try:
+    from scipy.special import erfc as _erfc
+except ImportError:
+    _erfc = None
+
+# CpmModelC: PSE = erfc(BETA1 * (SNR - BETA2) / sqrt(2)) / 2 per symbol.
+BETA1 = 0.9794
+BETA2 = 2.3851
+FRAME_BYTES = 23
+BITS_PER_SYMBOL = 4
+DEFAULT_SENSITIVITY = -100.0
+
+# Resolution of the tabulated PRR curve and size of the link blocks.
+GAIN_STEP = 0.01
+BLOCK_VALUES = 4 * 1024 * 1024
+
+
+def erfc(x):
+    """Vectorised complementary error function."""
+    if _erfc is not None:
+        return _erfc(x)
+    # Abramowitz and Stegun 7.1.26, absolute error below 1.5e-7.
+    x = numpy.asarray(x, dtype=numpy.float64)
+    z = numpy.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+                + t * (-1.453152027 + t * 1.061405429))))
+    value = poly * numpy.exp(-z * z)
+    return numpy.where(x >= 0, value, 2.0 - value)
+
+
+def symbols_per_frame(frame_bytes=FRAME_BYTES, bits_per_symbol=BITS_PER_SYMBOL):
+    return 8.0 * frame_bytes / bits_per_symbol
+
+
+def prr_from_snr(snr, frame_bytes=FRAME_BYTES, bits_per_symbol=BITS_PER_SYMBOL):
+    """PRR of the CpmModelC curve for SNRs in dB (array or scalar)."""
+    pse = 0.5 * erfc(BETA1 * (numpy.asarray(snr, dtype=numpy.float64) - BETA2) / math.sqrt(2.0))
+    return (1.0 - pse) ** symbols_per_frame(frame_bytes, bits_per_symbol)
+
+
+def noise_distribution(readings):
+    """Return (values, probabilities) of the noise readings in dBm."""
+    values, counts = numpy.unique(numpy.asarray(readings, dtype=numpy.float64),
+                                  return_counts=True)
+    return values, counts / float(counts.sum())
+
+
+def noise_floor(noise):
+    """Mean noise reading in dBm of a noise_distribution()."""
+    values, probabilities = noise
+    return float(numpy.dot(values, probabilities))
+
+
+def expected_prr_curve(gains, noise, frame_bytes=FRAME_BYTES, bits_per_symbol=BITS_PER_SYMBOL):
+    """Expected PRR at each gain (1-D array), averaged over the noise."""
+    values, probabilities = noise
+    gains = numpy.asarray(gains, dtype=numpy.float64)
+    curve = numpy.zeros(len(gains))
+    # A few hundred noise levels at most; each is one pass over the grid.
+    for value, p in zip(values, probabilities):
+        curve += p * prr_from_snr(gains - value, frame_bytes, bits_per_symbol)
+    return curve
+
+
+def link_quality(gains, noise, sensitivity=DEFAULT_SENSITIVITY, frame_bytes=FRAME_BYTES,
+                 bits_per_symbol=BITS_PER_SYMBOL, mac=None):
+    """Return (snr, prr) float32 arrays shaped like gains.
+
+    snr is the gain over the mean noise reading; prr the expected packet
+    reception ratio.  NaN gains (no link) give NaN SNR and PRR 0.  A MAC
+    object, if given, supplies bits_per_symbol.
+    """
+    if mac is not None:
+        bits_per_symbol = mac.bitsPerSymbol()
+    gains = numpy.asarray(gains, dtype=numpy.float32)
+    snr = numpy.empty(gains.shape, dtype=numpy.float32)
+    prr = numpy.zeros(gains.shape, dtype=numpy.float32)
+    floor = noise_floor(noise)
+    finite = gains[numpy.isfinite(gains)]
+    if not finite.size:
+        snr.fill(numpy.nan)
+        return snr, prr
+    low = max(float(finite.min()), sensitivity)
+    high = max(float(finite.max()), low)
+    grid = numpy.arange(low, high + 2 * GAIN_STEP, GAIN_STEP)
+    curve = expected_prr_curve(grid, noise, frame_bytes, bits_per_symbol)
+
+    flat_gains, flat_snr, flat_prr = gains.reshape(-1), snr.reshape(-1), prr.reshape(-1)
+    for start in range(0, flat_gains.size, BLOCK_VALUES):
+        block = flat_gains[start:start + BLOCK_VALUES]
+        flat_snr[start:start + BLOCK_VALUES] = block - floor
+        audible = block >= sensitivity
+        flat_prr[start:start + BLOCK_VALUES] = numpy.where(
+            audible, numpy.interp(block, grid, curve), 0.0)
+    return snr, prr
+
+
+def gain_matrix(src, dst, gain, size=None):
+    """Dense float32 matrix indexed by node id, NaN where there is no link."""
+    src = numpy.asarray(src, dtype=numpy.int64)
+    dst = numpy.asarray(dst, dtype=numpy.int64)
+    if size is None:
+        size = int(max(src.max(), dst.max())) + 1 if len(src) else 0
+    matrix = numpy.full((size, size), numpy.nan, dtype=numpy.float32)
+    matrix[src, dst] = numpy.asarray(gain, dtype=numpy.float32)
+    return matrix
+
+
+def prune_links(src, dst, gain, prr, min_prr=0.9):
+    """Keep only the links whose expected PRR is at least min_prr."""
+    keep = numpy.asarray(prr) >= min_prr
+    return (numpy.asarray(src)[keep], numpy.asarray(dst)[keep], numpy.asarray(gain)[keep])
+
+
+def link_summary(src, dst, prr, min_prr=0.9):
+    """Counts that help rank topologies before simulating them."""
+    src = numpy.asarray(src)
+    dst = numpy.asarray(dst)
+    prr = numpy.asarray(prr, dtype=numpy.float64)
+    usable = prr >= min_prr
+    nodes = numpy.union1d(src, dst)
+    reachable = numpy.union1d(src[usable], dst[usable])
+    return {
+        "links": int(len(prr)),
+        "usable_links": int(usable.sum()),
+        "mean_prr": float(prr.mean()) if len(prr) else 0.0,
+        "nodes": int(len(nodes)),
+        "isolated_nodes": int(len(nodes) - len(reachable)),
+    }
+
+
+def main(argv=None):
+    from noisetrace import read_trace
+    from topology import read_topology, write_topology
+
+    parser = argparse.ArgumentParser(description="Expected PRR of every link of a topology.")
+    parser.add_argument("topology")
+    parser.add_argument("noise")
+    parser.add_argument("--samples", type=int, default=10000, help="noise readings to use")
+    parser.add_argument("--sensitivity", type=float, default=DEFAULT_SENSITIVITY)
+    parser.add_argument("--min-prr", type=float, default=0.9)
+    parser.add_argument("--out", help="write the links with PRR >= --min-prr here")
+    args = parser.parse_args(argv)
+
+    src, dst, gain = read_topology(args.topology)
+    noise = noise_distribution(read_trace(args.noise, args.samples))
+    snr, prr = link_quality(gain, noise, args.sensitivity)
+    if len(src) <= 1000:
+        print("%6s %6s %9s %9s %7s" % ("src", "dst", "gain", "snr", "prr"))
+        for row in zip(src, dst, gain, snr, prr):
+            print("%6d %6d %9.1f %9.1f %7.3f" % row)
+    summary = link_summary(src, dst, prr, args.min_prr)
+    print("%(usable_links)d of %(links)d links usable, mean PRR %(mean_prr).3f, "
+          "%(isolated_nodes)d of %(nodes)d nodes isolated" % summary)
+    if args.out:
+        count = write_topology(args.out, *prune_links(src, dst, gain, prr, args.min_prr))
+        print("Wrote %d links to %s" % (count, args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
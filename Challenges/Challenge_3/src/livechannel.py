@@ -0,0 +1,317 @@
+"""
+Live consumption of TOSSIM debug channels through in-memory pipes.
+
+RunSimulationScript.py sends every debug channel to tossim_log.txt and
+all metrics come from parsing that file after the run.  LiveChannels
+gives each channel an OS pipe instead and a consumer thread parses the
+lines as they arrive, so counters are available while the simulation
+runs and nothing is written to disk:
+
+    counters = LiveCounters()
+    live = LiveChannels(t, ["radio_send", "radio_rec", "leds"], [counters])
+    live.runEvents(100000)
+    counters.snapshot()["sends"]        # {node: RADIO_SEND count}
+    live.close()
+
+Handlers are called from the consumer thread as
+handler(channel, node, text, weight) for every parsed line.
+
+_TOSSIM writes with C stdio while holding the interpreter lock, so a
+write into a full pipe would block the simulation and the consumer
+alike.  The pipes are never allowed to fill: runEvents() steps the
+simulation step events at a time, flushes the channels and, when the
+unread backlog exceeds high_water of the pipe capacity, waits for the
+consumer before running the next step.  With policy "block" that is the
+only back-pressure and every line is parsed.  With policy "sample" the
+consumer falls back to parsing one line in sample_every once the backlog
+passes sample_above, and hands that line to the handlers with
+weight=sample_every, so the counters stay estimates of the full stream;
+skipped counts the lines never parsed.  The simulation then only waits
+when even sampling cannot keep up.
+
+    python livechannel.py radioroute.json --events 2400 --every 200
+"""
+
+import argparse
+import errno
+import fcntl
+import os
+import re
+import select
+import struct
+import sys
+import termios
+import threading
+import time
+
+from dbglog import parse_line
+
+POLICIES = ("block", "sample")
+DEFAULT_CAPACITY = 1024 * 1024
+
+# Linux fcntl commands to resize a pipe.
+F_SETPIPE_SZ = 1031
+F_GETPIPE_SZ = 1032
+
+_LED = re.compile(r"LED (\d+) toggled")
+
+
+def _resize_pipe(fd, capacity):
+    """Ask for capacity bytes of pipe buffer; returns what the pipe has."""
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, capacity)
+    except (IOError, OSError):
+        pass
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except (IOError, OSError):
+        return 65536
+
+
+def _pending(fd):
+    """Bytes written to a pipe and not read yet."""
+    buf = fcntl.ioctl(fd, termios.FIONREAD, b"\0\0\0\0")
+    return struct.unpack("i", buf)[0]
+
+
+class LiveCounters(object):
+    """Per-node line counts, RADIO_SEND sends and LED toggles."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lines = {}
+        self.sends = {}
+        self.leds = {}
+
+    def __call__(self, channel, node, text, weight):
+        with self._lock:
+            key = (channel, node)
+            self.lines[key] = self.lines.get(key, 0) + weight
+            if text.startswith("[RADIO_SEND] Sending"):
+                self.sends[node] = self.sends.get(node, 0) + weight
+            elif text.startswith("Leds"):
+                m = _LED.search(text)
+                if m is not None:
+                    key = (node, int(m.group(1)))
+                    self.leds[key] = self.leds.get(key, 0) + weight
+
+    def snapshot(self):
+        """Copies of the counters, consistent with each other."""
+        with self._lock:
+            return {"lines": dict(self.lines), "sends": dict(self.sends),
+                    "leds": dict(self.leds)}
+
+
+class LiveChannels(object):
+    """Routes debug channels of a Tossim instance to a consumer thread."""
+
+    def __init__(self, t, channels, handlers=(), policy="block", step=16,
+                 capacity=DEFAULT_CAPACITY, high_water=0.5, sample_above=0.25,
+                 sample_every=10):
+        if policy not in POLICIES:
+            raise ValueError("unknown policy %r, expected one of %s" % (policy, ", ".join(POLICIES)))
+        self.t = t
+        self.handlers = list(handlers)
+        self.policy = policy
+        self.step = max(1, step)
+        self.sample_every = max(1, sample_every)
+        self.lines = 0
+        self.parsed = 0
+        self.skipped = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self._pipes = []
+        self._names = {}
+        self._partial = {}
+        self._busy = False
+        capacity_seen = None
+        for name in channels:
+            r, w = os.pipe()
+            size = _resize_pipe(w, capacity)
+            capacity_seen = size if capacity_seen is None else min(capacity_seen, size)
+            out = os.fdopen(w, "w")
+            t.addChannel(name, out)
+            self._pipes.append((name, r, out))
+            self._names[r] = name
+            self._partial[r] = b""
+        self.capacity = capacity_seen or capacity
+        self.high_water = int(high_water * self.capacity)
+        self.sample_above = int(sample_above * self.capacity)
+        self._caught_up = threading.Condition()
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = threading.Thread(target=self._consume, name="live-channels")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def backlog(self):
+        """Unread bytes in all the pipes."""
+        return sum(_pending(r) for _, r, _ in self._pipes)
+
+    def _consume(self):
+        fds = [r for _, r, _ in self._pipes] + [self._stop_r]
+        skip = 0
+        while fds:
+            ready = select.select(fds, [], [], 0.1)[0]
+            self._busy = bool(ready)
+            for fd in ready:
+                if fd == self._stop_r:
+                    # Drain what is left, then stop.
+                    fds.remove(fd)
+                    continue
+                try:
+                    data = os.read(fd, 65536)
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                if not data:
+                    fds.remove(fd)
+                    continue
+                data = self._partial[fd] + data
+                end = data.rfind(b"\n") + 1
+                self._partial[fd] = data[end:]
+                # Behind by what was just read plus what is still queued.
+                sampling = self.policy == "sample" and \
+                    len(data) + self.backlog() > self.sample_above
+                channel = self._names[fd]
+                for raw in data[:end].splitlines():
+                    self.lines += 1
+                    weight = 1
+                    if sampling:
+                        skip = (skip + 1) % self.sample_every
+                        if skip:
+                            self.skipped += 1
+                            continue
+                        weight = self.sample_every
+                    parsed = parse_line(raw.decode("utf-8", "replace"))
+                    if parsed is None:
+                        continue
+                    self.parsed += 1
+                    node, _, text = parsed
+                    for handler in self.handlers:
+                        handler(channel, node, text, weight)
+            if self._stop_r not in fds and not ready:
+                break
+            with self._caught_up:
+                self._busy = False
+                self._caught_up.notify_all()
+        with self._caught_up:
+            self._busy = False
+            self._caught_up.notify_all()
+
+    def flush(self):
+        for _, _, out in self._pipes:
+            out.flush()
+
+    def _wait_for_room(self):
+        if self.backlog() <= self.high_water:
+            return
+        start = time.time()
+        self.waits += 1
+        with self._caught_up:
+            while self.backlog() > self.high_water and self._thread.is_alive():
+                self._caught_up.wait(0.05)
+        self.wait_time += time.time() - start
+
+    def sync(self):
+        """Wait until every line printed so far went through the handlers."""
+        self.flush()
+        with self._caught_up:
+            while (self._busy or self.backlog()) and self._thread.is_alive():
+                self._caught_up.wait(0.05)
+
+    def runEvents(self, n):
+        """Run up to n events while consuming; returns (events, time())."""
+        total = 0
+        while total < n:
+            step = min(self.step, n - total)
+            count, _ = self.t.runEvents(step)
+            self.flush()
+            self._wait_for_room()
+            total += count
+            if count < step:
+                break
+        return total, self.t.time()
+
+    def runUntil(self, sim_time):
+        """Run until time() reaches sim_time (ticks); returns (events, time())."""
+        t = self.t
+        now, step = t.time, t.runNextEvent
+        total = 0
+        while now() < sim_time:
+            # Blocks of step events, like runEvents(), that stop at sim_time
+            # the way Tossim.runUntil() does.
+            count = 0
+            while count < self.step and now() < sim_time and step():
+                count += 1
+            total += count
+            self.flush()
+            self._wait_for_room()
+            if count < self.step:
+                break
+        return total, now()
+
+    def close(self):
+        """Detach the channels and wait for the consumer to parse the rest."""
+        self.flush()
+        for name, _, out in self._pipes:
+            self.t.removeChannel(name, out)
+            out.close()
+        os.write(self._stop_w, b"x")
+        self._thread.join()
+        for _, r, _ in self._pipes:
+            os.close(r)
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+        self._pipes = []
+
+
+def main(argv=None):
+    from scenario import Scenario, load_config
+
+    parser = argparse.ArgumentParser(description="Run a scenario with live channel counters "
+                                     "instead of a text log.")
+    parser.add_argument("scenario", help="scenario file, e.g. radioroute.json")
+    parser.add_argument("--events", type=int, default=2400)
+    parser.add_argument("--every", type=int, default=0, help="print the counters every N events")
+    parser.add_argument("--policy", choices=POLICIES, default="block")
+    parser.add_argument("--step", type=int, default=16, help="events between back-pressure checks")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.scenario)
+    channels = config.get("channels", [])
+    # The channels go to the pipes only, no log file.
+    config = dict(config, channels=[], log=None)
+    scenario = Scenario(config, os.path.dirname(os.path.abspath(args.scenario)))
+    t = scenario.build()
+
+    counters = LiveCounters()
+    live = LiveChannels(t, channels, [counters], args.policy, args.step)
+    start = time.time()
+    done = 0
+    every = args.every or args.events
+    while done < args.events:
+        want = min(every, args.events - done)
+        count, _ = live.runEvents(want)
+        done += count
+        if args.every:
+            live.sync()
+            snap = counters.snapshot()
+            sys.stdout.write("%s  %d events, sends %s\n"
+                             % (t.timeStr(), done, sorted(snap["sends"].items())))
+        if count < want:
+            break
+    live.close()
+    elapsed = time.time() - start
+
+    snap = counters.snapshot()
+    sys.stdout.write("%d events in %.2f s; %d lines, %d parsed, %d skipped; "
+                     "%d waits (%.3f s)\n" % (done, elapsed, live.lines, live.parsed,
+                                             live.skipped, live.waits, live.wait_time))
+    sys.stdout.write("sends per node: %s\n" % sorted(snap["sends"].items()))
+    sys.stdout.write("LED toggles (node, led): %s\n" % sorted(snap["leds"].items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
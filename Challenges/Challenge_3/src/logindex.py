@@ -0,0 +1,320 @@
+"""
+Indexed queries over TOSSIM and Cooja text logs.
+
+Two formats are understood:
+
+    tossim  DEBUG (6): [RADIO_REC] Received a message of type 1.
+    cooja   00:06.475<TAB>ID:6<TAB>[RADIO_REC] NODE 6: Received a message of type 0, ID 0.
+
+The first pass over a log writes a sidecar index next to it (LOG.lidx)
+holding, for every line, its byte offset, time, node and tag, plus posting
+lists by node, by tag and by (node, tag).  Later queries such as
+
+    idx = LogIndex.open("Cooja_log_file.txt")
+    for line in idx.query(node=6, tag="RADIO_REC", start=10.0, end=20.0):
+        ...
+
+binary-search those lists and seek straight to the matching lines.  When
+the log has grown since the index was written only the new lines are
+parsed; a log that was truncated or rewritten is indexed again.
+
+Times are in seconds.  TOSSIM debug lines carry no timestamp of their own,
+so each one gets the last "at time h:m:s" seen before it (0 before the
+first one).  Lines without a [TAG] are tagged with their first word in
+upper case, e.g. "Leds : LED 1 toggled" becomes LEDS.
+
+Command line:
+
+    python logindex.py LOG [--node N] [--tag TAG] [--start S] [--end E]
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import re
+import sys
+from array import array
+
+VERSION = 1
+INDEX_SUFFIX = ".lidx"
+HEAD_BYTES = 4096
+
+_COOJA = re.compile(r"(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)\tID:(\d+)\t(.*)")
+_TOSSIM = re.compile(r"(?:DEBUG|ERROR) \((\d+)\): ?(.*)")
+_TOSSIM_TIME = re.compile(r"at time (\d+):(\d+):(\d+(?:\.\d+)?)")
+_TAG = re.compile(r"\[([A-Za-z0-9_]+)\]")
+_WORD = re.compile(r"([A-Za-z0-9_]+)")
+
+
+def _tag_of(body):
+    m = _TAG.match(body)
+    if m is None:
+        m = _WORD.match(body)
+        if m is None:
+            return ""
+    return m.group(1).upper()
+
+
+def detect_format(path):
+    """Return "cooja" or "tossim" from the first recognisable line."""
+    f = open(path, "r")
+    try:
+        for line in f:
+            if _COOJA.match(line):
+                return "cooja"
+            if _TOSSIM.match(line):
+                return "tossim"
+    finally:
+        f.close()
+    raise ValueError("%s: not a TOSSIM or Cooja log" % path)
+
+
+def _head_digest(path, length):
+    f = open(path, "rb")
+    try:
+        return hashlib.sha1(f.read(length)).hexdigest()
+    finally:
+        f.close()
+
+
+class LogIndex(object):
+    """Per-line offsets, times, nodes and tags of a log, with posting lists."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.format = fmt
+        self.size = 0
+        self.head = None
+        self.head_len = 0
+        self.last_time = 0.0
+        self.tags = []
+        self._tag_ids = {}
+        # 'd' holds byte offsets exactly up to 2**53 on every platform.
+        self.offsets = array('d')
+        self.times = array('d')
+        self.nodes = array('H')
+        self.tag_ids = array('H')
+        self.by_node = {}
+        self.by_tag = {}
+        self.by_node_tag = {}
+
+    @classmethod
+    def open(cls, path, index_path=None):
+        """Load the sidecar index of path, updating or rebuilding it as needed."""
+        if index_path is None:
+            index_path = path + INDEX_SUFFIX
+        idx = None
+        if os.path.exists(index_path):
+            try:
+                idx = cls.load(path, index_path)
+            except (ValueError, EOFError, KeyError):
+                idx = None
+        size = os.path.getsize(path)
+        if idx is not None and (size < idx.size or _head_digest(path, idx.head_len) != idx.head):
+            idx = None
+        if idx is None:
+            idx = cls(path, detect_format(path))
+        if size > idx.size:
+            idx.update()
+            idx.save(index_path)
+        return idx
+
+    def _tag_id(self, tag):
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self._tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+        return tag_id
+
+    def _add(self, offset, sim_time, node, tag):
+        row = len(self.offsets)
+        tag_id = self._tag_id(tag)
+        self.offsets.append(offset)
+        self.times.append(sim_time)
+        self.nodes.append(node)
+        self.tag_ids.append(tag_id)
+        for postings, key in ((self.by_node, node), (self.by_tag, tag_id),
+                              (self.by_node_tag, (node, tag_id))):
+            rows = postings.get(key)
+            if rows is None:
+                rows = postings[key] = array('I')
+            rows.append(row)
+
+    def update(self):
+        """Index the complete lines appended to the log since the last update."""
+        f = open(self.path, "rb")
+        try:
+            f.seek(self.size)
+            offset = self.size
+            cooja = self.format == "cooja"
+            last_time = self.last_time
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Still being written; pick it up on the next update.
+                    break
+                line = raw.decode("utf-8", "replace")
+                if cooja:
+                    m = _COOJA.match(line)
+                    if m is not None:
+                        hours, minutes, seconds = m.group(1), m.group(2), m.group(3)
+                        last_time = int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+                        self._add(offset, last_time, int(m.group(4)), _tag_of(m.group(5)))
+                else:
+                    m = _TOSSIM.match(line)
+                    if m is not None:
+                        stamp = _TOSSIM_TIME.search(line)
+                        if stamp is not None:
+                            last_time = (int(stamp.group(1)) * 3600 + int(stamp.group(2)) * 60
+                                         + float(stamp.group(3)))
+                        self._add(offset, last_time, int(m.group(1)), _tag_of(m.group(2)))
+                offset += len(raw)
+            self.last_time = last_time
+            self.size = offset
+        finally:
+            f.close()
+        if self.head_len < HEAD_BYTES:
+            self.head_len = min(self.size, HEAD_BYTES)
+            self.head = _head_digest(self.path, self.head_len)
+
+    def save(self, index_path):
+        keys = {
+            "node": sorted(self.by_node),
+            "tag": sorted(self.by_tag),
+            "node_tag": sorted(self.by_node_tag),
+        }
+        header = {
+            "version": VERSION, "format": self.format, "size": self.size,
+            "head": self.head, "head_len": self.head_len,
+            "last_time": self.last_time, "rows": len(self.offsets), "tags": self.tags,
+            "node": [[k, len(self.by_node[k])] for k in keys["node"]],
+            "tag": [[k, len(self.by_tag[k])] for k in keys["tag"]],
+            "node_tag": [[k[0], k[1], len(self.by_node_tag[k])] for k in keys["node_tag"]],
+        }
+        tmp = index_path + ".tmp"
+        f = open(tmp, "wb")
+        try:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for column in (self.offsets, self.times, self.nodes, self.tag_ids):
+                column.tofile(f)
+            for k in keys["node"]:
+                self.by_node[k].tofile(f)
+            for k in keys["tag"]:
+                self.by_tag[k].tofile(f)
+            for k in keys["node_tag"]:
+                self.by_node_tag[k].tofile(f)
+        finally:
+            f.close()
+        os.rename(tmp, index_path)
+
+    @classmethod
+    def load(cls, path, index_path):
+        f = open(index_path, "rb")
+        try:
+            header = json.loads(f.readline().decode("utf-8"))
+            if header.get("version") != VERSION:
+                raise ValueError("unsupported index version")
+            idx = cls(path, header["format"])
+            idx.size = header["size"]
+            idx.head = header["head"]
+            idx.head_len = header["head_len"]
+            idx.last_time = header["last_time"]
+            idx.tags = header["tags"]
+            idx._tag_ids = dict((tag, i) for i, tag in enumerate(idx.tags))
+            rows = header["rows"]
+            for column in (idx.offsets, idx.times, idx.nodes, idx.tag_ids):
+                column.fromfile(f, rows)
+            for node, count in header["node"]:
+                idx.by_node[node] = postings = array('I')
+                postings.fromfile(f, count)
+            for tag_id, count in header["tag"]:
+                idx.by_tag[tag_id] = postings = array('I')
+                postings.fromfile(f, count)
+            for node, tag_id, count in header["node_tag"]:
+                idx.by_node_tag[(node, tag_id)] = postings = array('I')
+                postings.fromfile(f, count)
+        finally:
+            f.close()
+        return idx
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def rows(self, node=None, tag=None, start=None, end=None):
+        """Return the matching row numbers in log order.
+
+        start/end bound the time in seconds (end exclusive).
+        """
+        if tag is not None:
+            tag_id = self._tag_ids.get(tag.upper())
+            if tag_id is None:
+                return []
+        if node is not None and tag is not None:
+            postings = self.by_node_tag.get((node, tag_id), ())
+        elif node is not None:
+            postings = self.by_node.get(node, ())
+        elif tag is not None:
+            postings = self.by_tag.get(tag_id, ())
+        else:
+            postings = None
+        times = self.times
+        if postings is None:
+            lo = 0 if start is None else bisect.bisect_left(times, start)
+            hi = len(times) if end is None else bisect.bisect_left(times, end)
+            return list(range(lo, hi))
+        # Rows are in log order and times never decrease, so each posting
+        # list is sorted by time as well.
+        lo, hi = 0, len(postings)
+        if start is not None:
+            lo = self._first_at_or_after(postings, start, lo, hi)
+        if end is not None:
+            hi = self._first_at_or_after(postings, end, lo, hi)
+        return list(postings[lo:hi])
+
+    def _first_at_or_after(self, postings, when, lo, hi):
+        times = self.times
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[postings[mid]] < when:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lines(self, rows):
+        """Yield the text of the given rows, seeking to each one."""
+        f = open(self.path, "rb")
+        try:
+            expected = None
+            for row in rows:
+                offset = int(self.offsets[row])
+                if offset != expected:
+                    f.seek(offset)
+                raw = f.readline()
+                expected = offset + len(raw)
+                yield raw.decode("utf-8", "replace").rstrip("\r\n")
+        finally:
+            f.close()
+
+    def query(self, node=None, tag=None, start=None, end=None):
+        """Yield the lines matching node, tag and the [start, end) time range."""
+        return self.lines(self.rows(node, tag, start, end))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a TOSSIM or Cooja log through its index.")
+    parser.add_argument("log")
+    parser.add_argument("--node", type=int)
+    parser.add_argument("--tag")
+    parser.add_argument("--start", type=float)
+    parser.add_argument("--end", type=float)
+    args = parser.parse_args(argv)
+    idx = LogIndex.open(args.log)
+    for line in idx.query(args.node, args.tag, args.start, args.end):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
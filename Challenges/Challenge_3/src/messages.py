@@ -0,0 +1,163 @@
+"""
+NumPy codecs for the nx_struct messages of the nesC applications.
+
+nx_ types are stored big endian (nx_le_ ones little endian) with no
+padding, so every nx_struct maps onto an unaligned NumPy structured dtype.
+The dtypes are generated from the headers themselves:
+
+    codec = messages.codec("radio_route_msg")
+    batch = codec.decode_many(payloads)         # one array, one copy
+    batch[batch["type"] == 1]["cost"]
+    payloads = codec.split(codec.encode(batch))  # bytes for setData()
+    msg = codec.decode(packet.payload())[0]      # a view, nothing copied
+
+The known messages are radio_route_msg (RadioRoute.h) and sense_msg
+(Project/src/SenseNet.h); codec() accepts the struct tag or the typedef
+name, and any other header through its header argument.  decode() wraps
+a buffer without copying it, so the result is read-only when the buffer
+is (bytes, a Packet.payload() view) and shares memory with it otherwise.
+"""
+
+import os
+import re
+
+import numpy
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+HEADERS = {
+    "radio_route_msg": os.path.join(_HERE, "RadioRoute.h"),
+    "sense_msg": os.path.join(_HERE, os.pardir, os.pardir, os.pardir,
+                              "Project", "src", "SenseNet.h"),
+}
+
+_NX_TYPES = {}
+for _bits in (8, 16, 32, 64):
+    for _sign, _kind in (("u", "uint"), ("i", "int")):
+        _NX_TYPES["nx_%s%d_t" % (_kind, _bits)] = ">%s%d" % (_sign, _bits // 8)
+        _NX_TYPES["nx_le_%s%d_t" % (_kind, _bits)] = "<%s%d" % (_sign, _bits // 8)
+_NX_TYPES["nx_bool"] = "u1"
+
+_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_STRUCT = re.compile(r"typedef\s+nx_struct\s+(\w+)\s*\{(.*?)\}\s*(\w+)\s*;", re.S)
+_FIELD = re.compile(r"^\s*(\w+)\s+(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*;\s*$")
+
+
+class MessageFormatError(ValueError):
+    pass
+
+
+def parse_header(path):
+    """Return {name: dtype} for every typedef'd nx_struct of a header.
+
+    Each struct is listed under both its tag and its typedef name.
+    """
+    f = open(path, "r")
+    try:
+        text = _COMMENT.sub("", f.read())
+    finally:
+        f.close()
+    structs = {}
+    for tag, body, typedef in _STRUCT.findall(text):
+        fields = []
+        for declaration in body.split(";"):
+            if not declaration.strip():
+                continue
+            m = _FIELD.match(declaration + ";")
+            if m is None or m.group(1) not in _NX_TYPES:
+                raise MessageFormatError("%s: cannot map %r of nx_struct %s"
+                                         % (path, declaration.strip(), tag))
+            nx_type, name, count = m.groups()
+            if count:
+                fields.append((name, _NX_TYPES[nx_type], (int(count),)))
+            else:
+                fields.append((name, _NX_TYPES[nx_type]))
+        structs[tag] = structs[typedef] = numpy.dtype(fields)
+    return structs
+
+
+class MessageCodec(object):
+    """Encodes and decodes batches of one message type."""
+
+    def __init__(self, name, dtype):
+        self.name = name
+        self.dtype = numpy.dtype(dtype)
+        self.size = self.dtype.itemsize
+        self.fields = self.dtype.names
+
+    def zeros(self, count):
+        return numpy.zeros(count, dtype=self.dtype)
+
+    def records(self, **columns):
+        """Build a batch from one sequence (or scalar) per field."""
+        count = max([numpy.size(values) for values in columns.values()] or [0])
+        batch = self.zeros(count)
+        for name, values in columns.items():
+            if name not in self.fields:
+                raise MessageFormatError("%s has no field %r" % (self.name, name))
+            batch[name] = values
+        return batch
+
+    def decode(self, buffer):
+        """View a buffer of whole messages as a structured array, without copying.
+
+        Bytes past the last whole message (such as the unused part of a
+        packet payload) are ignored.
+        """
+        if isinstance(buffer, memoryview):
+            # NumPy on Python 2 only reads memoryviews through asarray().
+            raw = numpy.asarray(buffer).reshape(-1).view(numpy.uint8)
+        else:
+            raw = numpy.frombuffer(buffer, dtype=numpy.uint8)
+        count = len(raw) // self.size
+        if count == 0:
+            raise MessageFormatError("%d bytes hold no %s (%d bytes)"
+                                     % (len(raw), self.name, self.size))
+        return raw[:count * self.size].view(self.dtype)
+
+    def decode_many(self, payloads):
+        """Decode one message from each payload into a single array."""
+        size = self.size
+        chunks = []
+        for payload in payloads:
+            if len(payload) != size:
+                if len(payload) < size:
+                    raise MessageFormatError("%d byte payload is too short for %s"
+                                             % (len(payload), self.name))
+                payload = memoryview(payload)[:size].tobytes()
+            chunks.append(payload)
+        if not chunks:
+            return self.zeros(0)
+        return numpy.frombuffer(b"".join(chunks), dtype=self.dtype)
+
+    def encode(self, batch):
+        """Return the wire form of a batch (or a dict of columns) as bytes."""
+        if isinstance(batch, dict):
+            batch = self.records(**batch)
+        return numpy.ascontiguousarray(batch, dtype=self.dtype).tobytes()
+
+    def split(self, data):
+        """Cut encoded messages into one bytes object per message."""
+        size = self.size
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+_codecs = {}
+
+
+def codec(name, header=None):
+    """Return the MessageCodec of nx_struct name, parsing its header once."""
+    key = (name, header)
+    found = _codecs.get(key)
+    if found is None:
+        path = header
+        if path is None:
+            path = HEADERS.get(name[:-2] if name.endswith("_t") else name)
+            if path is None:
+                raise MessageFormatError("unknown message %r, expected one of %s or a header"
+                                         % (name, ", ".join(sorted(HEADERS))))
+        structs = parse_header(path)
+        if name not in structs:
+            raise MessageFormatError("%s defines no nx_struct %s" % (path, name))
+        found = _codecs[key] = MessageCodec(name, structs[name])
+    return found
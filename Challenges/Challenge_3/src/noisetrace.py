@@ -0,0 +1,211 @@
+"""
+Readers and a converter for noise traces such as meyer-heavy.txt.
+
+Besides the text format (one dBm reading per line) traces can be stored in
+a compact binary format: a 16 byte header followed by fixed-width little
+endian readings.
+
+    offset  size  field
+    0       4     magic, b"NTRC"
+    4       1     format version (1)
+    5       1     bytes per reading (1 for int8, 2 for int16)
+    6       2     reserved, zero
+    8       8     number of readings
+
+Convert a text trace once with
+
+    python noisetrace.py meyer-heavy.txt meyer-heavy.ntr
+
+and every later run memory-maps it instead of parsing 196k lines of text.
+read_trace() accepts either format, so both keep working.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"NTRC"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")
+
+_TYPECODES = {1: 'b', 2: 'h'}
+_LIMITS = {1: (-128, 127), 2: (-32768, 32767)}
+
+
+class TraceFormatError(ValueError):
+    pass
+
+
+def stream_text_trace(path, count=None, offset=0):
+    """Yield readings of a text trace lazily, one int per non-blank line.
+
+    Reading stops as soon as count readings have been produced, so only
+    the beginning of a long trace is ever read from disk.
+    """
+    if count is not None and count <= 0:
+        return
+    f = open(path, "r")
+    try:
+        produced = 0
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            if offset > 0:
+                offset -= 1
+                continue
+            yield int(line)
+            produced += 1
+            if produced == count:
+                break
+    finally:
+        f.close()
+
+
+def is_binary_trace(path):
+    f = open(path, "rb")
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+
+
+def write_trace(path, readings, width=None):
+    """Write readings to path in the binary trace format.
+
+    width is the number of bytes per reading; by default the smallest one
+    that holds every reading is used.
+    """
+    # Wide enough for any reading, so out of range ones fail the check below.
+    try:
+        readings = array('l', readings)
+    except OverflowError:
+        raise TraceFormatError("readings do not fit in %d byte(s)" % max(_TYPECODES))
+    if width is None:
+        width = 1
+        if len(readings) and (min(readings) < -128 or max(readings) > 127):
+            width = 2
+    if width not in _TYPECODES:
+        raise TraceFormatError("unsupported reading width: %r" % (width,))
+    low, high = _LIMITS[width]
+    if len(readings) and (min(readings) < low or max(readings) > high):
+        raise TraceFormatError("readings do not fit in %d byte(s)" % width)
+    data = array(_TYPECODES[width], readings)
+    if sys.byteorder != "little":
+        data.byteswap()
+    f = open(path, "wb")
+    try:
+        f.write(HEADER.pack(MAGIC, VERSION, width, 0, len(data)))
+        data.tofile(f)
+    finally:
+        f.close()
+    return len(data)
+
+
+def convert(text_path, binary_path, width=None, count=None):
+    """Convert a text trace into the binary format; returns the reading count."""
+    return write_trace(binary_path, stream_text_trace(text_path, count), width)
+
+
+class BinaryTrace(object):
+    """A memory-mapped binary noise trace.
+
+    slice() returns memoryviews straight into the mapping, so no reading is
+    copied until a consumer asks for it.  Python 2 mmaps do not implement
+    the new buffer interface; there slices fall back to array copies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        f = open(path, "rb")
+        try:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise TraceFormatError("%s: truncated header" % path)
+            magic, version, width, _, count = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise TraceFormatError("%s: not a binary noise trace" % path)
+            if version != VERSION or width not in _TYPECODES:
+                raise TraceFormatError("%s: unsupported version %d, width %d" % (path, version, width))
+            if count == 0:
+                self._map = None
+            else:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(self._map) < HEADER.size + count * width:
+                    self._map.close()
+                    raise TraceFormatError("%s: truncated data" % path)
+        finally:
+            f.close()
+        self.width = width
+        self.typecode = _TYPECODES[width]
+        self.count = count
+        try:
+            self._view = memoryview(self._map) if self._map is not None else None
+        except TypeError:
+            self._view = None
+
+    def __len__(self):
+        return self.count
+
+    def slice(self, offset=0, length=None):
+        """Return length readings starting at offset (clipped to the trace)."""
+        offset = max(0, min(offset, self.count))
+        if length is None:
+            length = self.count - offset
+        length = max(0, min(length, self.count - offset))
+        start = HEADER.size + offset * self.width
+        end = start + length * self.width
+        if self._view is not None and sys.byteorder == "little":
+            return self._view[start:end].cast(self.typecode)
+        readings = array(self.typecode)
+        if length:
+            readings = array(self.typecode, self._map[start:end])
+            if sys.byteorder != "little":
+                readings.byteswap()
+        return readings
+
+    def chunks(self, size, offset=0, length=None):
+        """Yield consecutive slices of at most size readings."""
+        end = self.count if length is None else min(self.count, offset + length)
+        while offset < end:
+            yield self.slice(offset, min(size, end - offset))
+            offset += size
+
+    def close(self):
+        """Unmap the trace; slices still in use keep the mapping alive."""
+        self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+
+
+def read_trace(path, count=None, offset=0):
+    """Return count readings of the trace at path, starting at offset.
+
+    Binary traces are sliced out of a memory map; text traces are parsed
+    lazily and only up to the last reading requested.
+    """
+    if is_binary_trace(path):
+        return BinaryTrace(path).slice(offset, count)
+    try:
+        return array('h', stream_text_trace(path, count, offset))
+    except OverflowError:
+        raise TraceFormatError("%s: readings do not fit in 2 byte(s)" % path)
+
+
+def main(argv):
+    if len(argv) not in (3, 4):
+        sys.stderr.write("usage: %s TEXT_TRACE BINARY_TRACE [COUNT]\n" % argv[0])
+        return 2
+    count = int(argv[3]) if len(argv) == 4 else None
+    written = convert(argv[1], argv[2], count=count)
+    print("Wrote %d readings to %s" % (written, argv[2]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
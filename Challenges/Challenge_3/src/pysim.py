@@ -0,0 +1,1011 @@
+"""
+Packet-level discrete-event simulator with the interface of TOSSIM.py.
+
+    from pysim import Tossim
+    t = Tossim([], app="RadioRouteC")
+    t.addChannel("radio_send", sys.stdout)
+    t.bootNodes([1, 2, 3], [0, 0, 0])
+    t.radio().addLinks(src, dst, gain)
+    t.runEvents(2400)
+
+Tossim, Mote, Radio, MAC, Packet and Variable have the methods of their
+TOSSIM.py counterparts (plus the bulk helpers addLinks, bootNodes,
+runEvents, ...), so scripts and scenario files written for TOSSIM run
+unchanged; scenario.py selects this engine with "engine": "pysim".
+Instead of a compiled nesC application every mote runs a Python model of
+one, written against a small nesC-like API (timers, AMSend, dbg):
+
+    RadioRouteC  Challenge 3: ROUTE_REQ flood from node 1 for node 7,
+                 ROUTE_REPLY with hop costs, data forwarding along the
+                 6x3 routing table, LED toggling from the person code.
+    SenseNetC    Project: periodic sensor data to the gateways 6 and 7,
+                 forwarding to the server 8, ACKs, retransmission after
+                 1000 ms and duplicate suppression at the server.
+
+Both print the same debug lines as the nesC code, so logs can be analysed
+with the same tools.  The models only cover what is visible at packet
+level; they are meant to screen many topologies quickly and pick the ones
+worth running in real TOSSIM.
+
+Links live in a NumPy gain matrix.  Transmissions follow TOSSIM's packet
+model in simplified form: CSMA backoff in symbol periods using the MAC
+parameters, air time from the packet length, half-duplex radios, and
+reception decided at the end of a packet from its SINR (noise drawn from
+the receiver's noise trace, plus every overlapping transmission) through
+the PRR curve of TOSSIM's CpmModelC.  Link-layer ACKs, the CPM noise
+history and radio start-up times are not modelled.
+"""
+
+import copy
+import heapq
+import math
+import random
+import struct
+import time as _time
+
+import numpy
+
+from linkquality import BETA1, BETA2, symbols_per_frame
+
+TICKS_PER_SECOND = 10000000000
+# TMilli timers count binary milliseconds, as in TOSSIM.
+MILLI = TICKS_PER_SECOND / 1024.0
+BROADCAST = 0xffff
+UINT16_MAX = 0xffff
+AM_RADIO_COUNT_MSG = 10
+TOSH_DATA_LENGTH = 28
+HEADER_BYTES = 7
+FOOTER_BYTES = 2
+DEFAULT_NOISE = -98.0
+DEFAULT_SENSITIVITY = -100.0
+RADIO_START_DELAY = 0.001
+
+MAC_DEFAULTS = (
+    ("initHigh", 640), ("initLow", 20), ("high", 160), ("low", 20),
+    ("symbolsPerSec", 65536), ("bitsPerSymbol", 4), ("preambleLength", 12),
+    ("exponentBase", 1), ("maxIterations", 0), ("minFreeSamples", 2),
+    ("rxtxDelay", 11), ("ackTime", 34),
+)
+
+_FRAME_SYMBOLS = symbols_per_frame()
+
+
+def prr_from_snr(snr):
+    """Packet reception ratio for a signal to noise ratio in dB.
+
+    Scalar version of linkquality.prr_from_snr, called once per packet.
+    """
+    pse = 0.5 * math.erfc(BETA1 * (snr - BETA2) / math.sqrt(2.0))
+    return (1.0 - pse) ** _FRAME_SYMBOLS
+
+
+def _dbm_to_mw(dbm):
+    return 10.0 ** (dbm / 10.0)
+
+
+class MAC(object):
+    """CSMA parameters; durations are in symbol periods."""
+
+    def __init__(self):
+        for name, value in MAC_DEFAULTS:
+            setattr(self, "_" + name, value)
+
+    def symbols(self, count):
+        return int(count * TICKS_PER_SECOND / self._symbolsPerSec)
+
+
+def _mac_accessors():
+    for name, _ in MAC_DEFAULTS:
+        field = "_" + name
+        setattr(MAC, name, lambda self, field=field: getattr(self, field))
+        setattr(MAC, "set" + name[0].upper() + name[1:],
+                lambda self, value, field=field: setattr(self, field, value))
+    # The TOSSIM binding spells it this way.
+    MAC.setBitsBerSymbol = MAC.setBitsPerSymbol
+
+_mac_accessors()
+
+
+class Radio(object):
+    """Link gains between motes, kept in a growable NumPy matrix."""
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._gain = numpy.full((0, 0), numpy.nan, dtype=numpy.float32)
+        self._neighbours = {}
+        self._noise = {}
+        self.sensitivity = DEFAULT_SENSITIVITY
+
+    def _reserve(self, node):
+        size = len(self._gain)
+        if node < size:
+            return
+        grown = numpy.full((max(node + 1, 2 * size), ) * 2, numpy.nan, dtype=numpy.float32)
+        grown[:size, :size] = self._gain
+        self._gain = grown
+
+    def add(self, src, dest, gain):
+        self._reserve(max(src, dest))
+        self._gain[src, dest] = gain
+        self._neighbours.pop(src, None)
+
+    def addLinks(self, src, dst, gain):
+        """Add one link per position of the src, dst and gain sequences."""
+        src = numpy.asarray(src, dtype=numpy.int64)
+        dst = numpy.asarray(dst, dtype=numpy.int64)
+        if len(src):
+            self._reserve(int(max(src.max(), dst.max())))
+            self._gain[src, dst] = numpy.asarray(gain, dtype=numpy.float32)
+        self._neighbours.clear()
+        return len(src)
+
+    def gain(self, src, dest):
+        if max(src, dest) >= len(self._gain) or numpy.isnan(self._gain[src, dest]):
+            return 0.0
+        return float(self._gain[src, dest])
+
+    def connected(self, src, dest):
+        return max(src, dest) < len(self._gain) and not numpy.isnan(self._gain[src, dest])
+
+    def remove(self, src, dest):
+        if max(src, dest) < len(self._gain):
+            self._gain[src, dest] = numpy.nan
+            self._neighbours.pop(src, None)
+
+    def setNoise(self, node, mean, range):
+        """Gaussian noise for motes without a noise model."""
+        self._noise[node] = (mean, range)
+
+    def setSensitivity(self, sensitivity):
+        self.sensitivity = sensitivity
+
+    def neighbours(self, src):
+        """Return the (ids, gains) lists of the links leaving src."""
+        links = self._neighbours.get(src)
+        if links is None:
+            if src < len(self._gain):
+                row = self._gain[src]
+                ids = numpy.flatnonzero(~numpy.isnan(row))
+                links = (ids.tolist(), row[ids].tolist())
+            else:
+                links = ([], [])
+            self._neighbours[src] = links
+        return links
+
+
+class Packet(object):
+    """An active message that can be injected into a mote."""
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._source = 0
+        self._destination = BROADCAST
+        self._type = 0
+        self._strength = 0
+        self._data = b""
+
+    def setSource(self, source):
+        self._source = source
+
+    def source(self):
+        return self._source
+
+    def setDestination(self, destination):
+        self._destination = destination
+
+    def destination(self):
+        return self._destination
+
+    def setLength(self, length):
+        length = min(length, TOSH_DATA_LENGTH)
+        self._data = self._data[:length].ljust(length, b"\0")
+
+    def length(self):
+        return len(self._data)
+
+    def setType(self, am_type):
+        self._type = am_type
+
+    def type(self):
+        return self._type
+
+    def data(self):
+        return self._data
+
+    def setData(self, data):
+        if not isinstance(data, bytes):
+            data = bytes(bytearray(data))
+        self._data = data[:TOSH_DATA_LENGTH]
+
+    def payload(self):
+        return memoryview(self._data)
+
+    def setPayload(self, buffer):
+        if not hasattr(buffer, "tobytes"):
+            buffer = memoryview(buffer)
+        self._data = buffer.tobytes()[:TOSH_DATA_LENGTH]
+
+    def maxLength(self):
+        return TOSH_DATA_LENGTH
+
+    def setStrength(self, strength):
+        self._strength = strength
+
+    def deliver(self, node, when):
+        self._sim._schedule(when, node, self._sim._deliver,
+                            (node, self._source, self._destination, self._type, self._data))
+
+    def deliverNow(self, node):
+        self.deliver(node, self._sim.time())
+
+
+class Variable(object):
+    """A module variable of a mote's application, e.g. "RadioRouteC.routing_table"."""
+
+    def __init__(self, mote, name):
+        self._mote = mote
+        self._field = name.rsplit(".", 1)[-1]
+
+    def getData(self):
+        mote = self._mote
+        app = mote.app
+        if app is None:
+            # Before the first boot the variables hold their initial values.
+            app = mote._sim.app(mote._sim, mote)
+        return copy.deepcopy(getattr(app, self._field))
+
+
+class _Reception(object):
+    __slots__ = ("src", "dest", "am_type", "payload", "signal", "noise_mw",
+                 "interference_mw", "lost")
+
+    def __init__(self, src, dest, am_type, payload, signal, noise):
+        self.src = src
+        self.dest = dest
+        self.am_type = am_type
+        self.payload = payload
+        self.signal = signal
+        self.noise_mw = _dbm_to_mw(noise)
+        self.interference_mw = 0.0
+        self.lost = False
+
+    def sinr(self):
+        return self.signal - 10.0 * math.log10(self.noise_mw + self.interference_mw)
+
+
+class Mote(object):
+
+    def __init__(self, sim, node_id):
+        self._sim = sim
+        self._id = node_id
+        self._euid = node_id
+        self._boot_time = 0
+        self._noise_trace = []
+        self._noise_model = None
+        self.app = None
+        self.on = False
+        self.epoch = 0
+        self.sending = False
+        self.tx_end = 0
+        self.receptions = []
+
+    def id(self):
+        return self._id
+
+    def euid(self):
+        return self._euid
+
+    def setEuid(self, euid):
+        self._euid = euid
+
+    def bootTime(self):
+        return self._boot_time
+
+    def bootAtTime(self, when):
+        self._boot_time = when
+        self._sim._schedule(when, self._id, self._sim._boot, (self,))
+
+    def isOn(self):
+        return self.on
+
+    def turnOff(self):
+        self.on = False
+        self.epoch += 1
+
+    def turnOn(self):
+        self._sim._schedule(self._sim.time(), self._id, self._sim._boot, (self,))
+
+    def getVariable(self, name):
+        return Variable(self, name)
+
+    def addNoiseTraceReading(self, val):
+        self._noise_trace.append(val)
+
+    def createNoiseModel(self):
+        self._noise_model = numpy.asarray(self._noise_trace, dtype=numpy.float64)
+
+    def generateNoise(self, when):
+        """Draw a noise reading in dBm; when is accepted for compatibility."""
+        model = self._noise_model
+        rng = self._sim.rng
+        if model is not None and len(model):
+            return float(model[int(rng.random() * len(model))])
+        mean, spread = self._sim._radio._noise.get(self._id, (DEFAULT_NOISE, 0.0))
+        return rng.gauss(mean, spread) if spread else mean
+
+
+class Application(object):
+    """Base class of the application models, with a nesC-like API."""
+
+    AM_TYPE = AM_RADIO_COUNT_MSG
+
+    def __init__(self, sim, mote):
+        self.sim = sim
+        self.mote = mote
+        self.TOS_NODE_ID = mote.id()
+        self._timers = {}
+
+    def dbg(self, channel, fmt, *args):
+        self.sim.dbg(channel, self.TOS_NODE_ID, fmt % args if args else fmt)
+
+    def dbgerror(self, channel, fmt, *args):
+        self.sim.dbg(channel, self.TOS_NODE_ID, fmt % args if args else fmt, error=True)
+
+    def sim_time_string(self):
+        return self.sim.timeStr()
+
+    def rand16(self):
+        return self.sim.rng.randrange(0x10000)
+
+    # Timers, in binary milliseconds.
+    def startOneShot(self, timer, ms):
+        self._start_timer(timer, ms, None)
+
+    def startPeriodic(self, timer, ms):
+        self._start_timer(timer, ms, ms)
+
+    def isRunning(self, timer):
+        return self._timers.get(timer, (0, False))[1]
+
+    def stop(self, timer):
+        generation = self._timers.get(timer, (0, False))[0]
+        self._timers[timer] = (generation + 1, False)
+
+    def _start_timer(self, timer, ms, period):
+        generation = self._timers.get(timer, (0, False))[0] + 1
+        self._timers[timer] = (generation, True)
+        self.sim._schedule(self.sim.time() + int(ms * MILLI), self.TOS_NODE_ID,
+                           self._timer_fired, (timer, generation, period, self.mote.epoch))
+
+    def _timer_fired(self, timer, generation, period, epoch):
+        if epoch != self.mote.epoch or self._timers.get(timer, (0, False))[0] != generation:
+            return
+        if period is None:
+            self._timers[timer] = (generation, False)
+        else:
+            self.sim._schedule(self.sim.time() + int(period * MILLI), self.TOS_NODE_ID,
+                               self._timer_fired, (timer, generation, period, epoch))
+        self.fired(timer)
+
+    def send(self, address, payload):
+        """AMSend.send; returns False (EBUSY) while a send is pending."""
+        return self.sim._send(self.mote, address, self.AM_TYPE, payload)
+
+    def booted(self):
+        pass
+
+    def startDone(self, ok):
+        pass
+
+    def fired(self, timer):
+        pass
+
+    def receive(self, payload):
+        pass
+
+    def sendDone(self, ok):
+        pass
+
+
+class RadioRouteMsg(object):
+    """radio_route_msg_t from RadioRoute.h."""
+
+    __slots__ = ("type", "sender", "destination", "node_requested", "value", "cost")
+    FORMAT = struct.Struct(">BHHHHH")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values or (0,) * 6):
+            setattr(self, name, value)
+
+    def pack(self):
+        return self.FORMAT.pack(*[getattr(self, name) & 0xffff for name in self.__slots__])
+
+    @classmethod
+    def unpack(cls, data):
+        return cls(*cls.FORMAT.unpack(data))
+
+
+class RadioRouteC(Application):
+    """Model of RadioRouteC.nc."""
+
+    TIME_DELAYS = (61, 173, 267, 371, 479, 583, 689)
+    PCODE = 10372022
+
+    def __init__(self, sim, mote):
+        Application.__init__(self, sim, mote)
+        self.globalpacket = RadioRouteMsg()
+        self.queued_packet = None
+        self.queue_addr = 0
+        self.route_req_sent = False
+        self.route_rep_sent = False
+        self.locked = False
+        self.routing_table = [[0, 0, 0] for _ in range(6)]
+        self.sent = False
+        self.i_start = 7
+
+    def initialize_routing_table(self):
+        for i in range(6):
+            node = i + 1 if i < self.TOS_NODE_ID - 1 else i + 2
+            self.routing_table[i] = [node, UINT16_MAX, UINT16_MAX]
+
+    def generate_send(self, address, packet, msg_type):
+        if self.isRunning("Timer0"):
+            return False
+        delay = self.TIME_DELAYS[(self.TOS_NODE_ID - 1) % len(self.TIME_DELAYS)]
+        if msg_type == 1 and not self.route_req_sent:
+            self.route_req_sent = True
+        elif msg_type == 2 and not self.route_rep_sent:
+            self.route_rep_sent = True
+        elif msg_type != 0:
+            return True
+        self.startOneShot("Timer0", delay)
+        self.queued_packet = packet.pack()
+        self.queue_addr = address
+        return True
+
+    def actual_send(self, address, packet):
+        if self.locked:
+            return False
+        if self.send(address, packet):
+            rrm = RadioRouteMsg.unpack(packet)
+            self.dbg("radio_send", "[RADIO_SEND] Sending message of type %u from %u to %u passing by %u.",
+                     rrm.type, rrm.sender, rrm.destination, address)
+            self.locked = True
+        return True
+
+    def get_row_index_by_node_id(self, node_id):
+        for i in range(6):
+            if self.routing_table[i][0] == node_id:
+                return i
+        return None
+
+    def booted(self):
+        self.dbg("boot", "[BOOT] Application booted for node %u.", self.TOS_NODE_ID)
+        self.initialize_routing_table()
+        self.dbg("init", "[INIT] Routing table initialized for node %u.", self.TOS_NODE_ID)
+
+    def startDone(self, ok):
+        self.dbg("radio", "[RADIO] Radio successfully started for node %u.", self.TOS_NODE_ID)
+        if self.TOS_NODE_ID == 1:
+            self.startOneShot("Timer1", 5000)
+
+    def sendDone(self, ok):
+        if ok:
+            self.dbg("radio_send", "[RADIO_SEND] Packet sent from %u at time %s.",
+                     self.TOS_NODE_ID, self.sim_time_string())
+            self.locked = False
+        else:
+            self.dbgerror("radio_send", "[RADIO_SEND] Send done error for node %u!", self.TOS_NODE_ID)
+
+    def fired(self, timer):
+        if timer == "Timer0":
+            self.actual_send(self.queue_addr, self.queued_packet)
+            return
+        self.dbg("timer1", "[TIMER1] Timer fired out.")
+        rrm = self.globalpacket
+        rrm.type = 1
+        rrm.node_requested = 7
+        rrm.sender = self.TOS_NODE_ID
+        rrm.destination = BROADCAST
+        rrm.value = UINT16_MAX
+        rrm.cost = UINT16_MAX
+        self.generate_send(BROADCAST, rrm, 1)
+
+    def _toggle_led(self):
+        c = self.PCODE // 10 ** self.i_start % 10
+        if c >= 3:
+            c %= 3
+        self.dbg("leds", "Leds : LED %u toggled at node %u ", c, self.TOS_NODE_ID)
+        self.i_start = 7 if self.i_start == 0 else self.i_start - 1
+
+    def receive(self, payload):
+        self._toggle_led()
+        if len(payload) != RadioRouteMsg.FORMAT.size:
+            return
+        mess = RadioRouteMsg.unpack(payload)
+        new_mess = self.globalpacket
+        me = self.TOS_NODE_ID
+        table = self.routing_table
+        self.dbg("radio_rec", "[RADIO_REC] Received a message of type %u.", mess.type)
+
+        if mess.type == 0:
+            if me == 7:
+                self.dbg("radio_rec", "[RADIO_REC] HERE IT IS NODE %u AND I RECEIVED THE PACKET "
+                         "OF TYPE %u WITH VALUE %u. WE'RE DONE!", me, mess.type, mess.value)
+            else:
+                row = self.get_row_index_by_node_id(mess.destination)
+                new_mess.type = 0
+                new_mess.sender = me
+                new_mess.destination = mess.destination
+                new_mess.value = mess.value
+                new_mess.node_requested = UINT16_MAX
+                new_mess.cost = UINT16_MAX
+                next_hop = table[row][1] if row is not None else UINT16_MAX
+                self.generate_send(next_hop, new_mess, 0)
+
+        elif mess.type == 1:
+            row = self.get_row_index_by_node_id(mess.node_requested)
+            if mess.node_requested != me and (row is None or table[row][1] == UINT16_MAX):
+                new_mess.type = 1
+                new_mess.node_requested = mess.node_requested
+                new_mess.sender = me
+                new_mess.destination = UINT16_MAX
+                new_mess.cost = UINT16_MAX
+                new_mess.value = UINT16_MAX
+                self.generate_send(BROADCAST, new_mess, 1)
+            elif mess.node_requested == me:
+                new_mess.type = 2
+                new_mess.sender = me
+                new_mess.node_requested = me
+                new_mess.cost = 1
+                new_mess.destination = UINT16_MAX
+                new_mess.value = UINT16_MAX
+                self.generate_send(BROADCAST, new_mess, 2)
+            else:
+                new_mess.type = 2
+                new_mess.sender = me
+                new_mess.node_requested = mess.node_requested
+                new_mess.cost = table[row][2] + 1
+                new_mess.destination = UINT16_MAX
+                new_mess.value = UINT16_MAX
+                self.generate_send(BROADCAST, new_mess, 2)
+
+        elif mess.type == 2:
+            row = self.get_row_index_by_node_id(mess.node_requested)
+            if mess.node_requested == me or row is None:
+                return
+            if table[row][1] == UINT16_MAX or mess.cost < table[row][2]:
+                table[row][1] = mess.sender
+                table[row][2] = mess.cost
+                if me == 1:
+                    if not self.sent:
+                        self.sent = True
+                        new_mess.type = 0
+                        new_mess.sender = me
+                        new_mess.destination = 7
+                        new_mess.value = 5
+                        new_mess.node_requested = UINT16_MAX
+                        new_mess.cost = UINT16_MAX
+                        self.generate_send(table[row][1], new_mess, 0)
+                else:
+                    new_mess.type = 2
+                    new_mess.sender = me
+                    new_mess.node_requested = mess.node_requested
+                    new_mess.cost = table[row][2] + 1
+                    new_mess.destination = UINT16_MAX
+                    new_mess.value = UINT16_MAX
+                    self.generate_send(BROADCAST, new_mess, 2)
+
+
+class SenseMsg(object):
+    """sense_msg_t from Project/src/SenseNet.h."""
+
+    __slots__ = ("type", "msg_id", "data", "sender", "destination")
+    FORMAT = struct.Struct(">BHHHH")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values or (0,) * 5):
+            setattr(self, name, value)
+
+    def pack(self):
+        return self.FORMAT.pack(*[getattr(self, name) & 0xffff for name in self.__slots__])
+
+    @classmethod
+    def unpack(cls, data):
+        return cls(*cls.FORMAT.unpack(data))
+
+
+class SenseNetC(Application):
+    """Model of SenseNetC.nc; nodes 1-5 are sensors, 6 and 7 gateways, 8 the server."""
+
+    SENSOR_NODES = 5
+    SERVER_NODE = 8
+    TIME_DELAYS = (40, 60, 45, 50, 55, 30, 30, 75)
+    PERIODS = {1: 2000, 2: 3000, 3: 4000, 4: 5000, 5: 6000}
+    ACK_WINDOW = 1000
+    FIELDS = {1: "fieldone", 3: "fieldtwo", 5: "fieldthree"}
+
+    def __init__(self, sim, mote):
+        Application.__init__(self, sim, mote)
+        self.globalpacket = SenseMsg()
+        self.queued_packet = None
+        self.queue_addr = 0
+        self.locked = False
+        self.transmitted_to_second_gateway = False
+        self.counter = 0
+        self.msg_tx = SenseMsg()
+        self.ack_received = False
+        self.msg_from_sensor = [[UINT16_MAX, UINT16_MAX, False] for _ in range(self.SENSOR_NODES)]
+
+    def gateway(self):
+        if self.TOS_NODE_ID in (1, 2, 4):
+            return 6
+        if self.TOS_NODE_ID in (3, 5):
+            return 7
+        return 0
+
+    def generate_send(self, address, packet):
+        if self.isRunning("Timer0"):
+            return False
+        self.startOneShot("Timer0", self.TIME_DELAYS[(self.TOS_NODE_ID - 1) % len(self.TIME_DELAYS)])
+        self.queued_packet = packet.pack()
+        self.queue_addr = address
+        return True
+
+    def actual_send(self, address, packet):
+        if self.locked:
+            return False
+        if self.send(address, packet):
+            p = SenseMsg.unpack(packet)
+            me = self.TOS_NODE_ID
+            if p.type == 0:
+                self.dbg("radio_send", "[RADIO_SEND] NODE %u: Sending a data message with ID %u, data %u, "
+                         "generated from node %u to the server.", me, p.msg_id, p.data, p.sender)
+            else:
+                self.dbg("radio_send", "[RADIO_SEND] NODE %u: Sending an ack message with ID %u as "
+                         "response from the server to node %u.", me, p.msg_id, p.destination)
+            self.locked = True
+        return True
+
+    def booted(self):
+        self.dbg("boot", "[BOOT] NODE %u: Application booted.", self.TOS_NODE_ID)
+
+    def startDone(self, ok):
+        self.dbg("radio", "[RADIO] NODE %u: Radio successfully started.", self.TOS_NODE_ID)
+        period = self.PERIODS.get(self.TOS_NODE_ID)
+        if period is not None:
+            self.startPeriodic("Timer1", period)
+
+    def sendDone(self, ok):
+        me = self.TOS_NODE_ID
+        if ok:
+            self.dbg("radio_send", "[RADIO_SEND] NODE %u: Packet successfully sent from %u.", me, me)
+            if me in (2, 4) and not self.transmitted_to_second_gateway:
+                self.transmitted_to_second_gateway = True
+                self.globalpacket.destination = 7
+                self.generate_send(7, self.globalpacket)
+        else:
+            self.dbg("radio_send", "[RADIO_SEND] NODE %u: Send done error for node!", me)
+        self.locked = False
+
+    def fired(self, timer):
+        me = self.TOS_NODE_ID
+        if timer == "Timer0":
+            self.actual_send(self.queue_addr, self.queued_packet)
+        elif timer == "Timer1":
+            self.dbg("timer1", "[TIMER1] NODE %u: Timer fired out. Time to send a new message.", me)
+            addr = self.gateway()
+            if me in (2, 4):
+                self.transmitted_to_second_gateway = False
+            msg = self.globalpacket
+            msg.type = 0
+            msg.msg_id = self.counter
+            msg.sender = me
+            msg.destination = addr
+            msg.data = self.rand16() % 100
+            self.generate_send(addr, msg)
+            self.counter = (self.counter + 1) & 0xffff
+            self.msg_tx = SenseMsg(msg.type, msg.msg_id, msg.data, msg.sender, msg.destination)
+            self.ack_received = False
+            self.startOneShot("Timer2", self.ACK_WINDOW)
+        else:
+            self.dbg("timer2", "[TIMER2] NODE %u: Timer fired out.", me)
+            if self.ack_received:
+                self.dbg("timer2", "[TIMER2] NODE %u: ack has been received, so there is no need "
+                         "to retransmit.", me)
+                return
+            self.dbg("timer2", "[TIMER2] NODE %u: 1000ms passed and no ACK has been received. "
+                     "Going to retransmit...", me)
+            addr = self.gateway()
+            if me in (2, 4):
+                self.transmitted_to_second_gateway = False
+            msg = self.globalpacket
+            msg.type = self.msg_tx.type
+            msg.msg_id = self.msg_tx.msg_id
+            msg.sender = self.msg_tx.sender
+            msg.destination = addr
+            msg.data = self.msg_tx.data
+            self.generate_send(addr, msg)
+
+    def receive(self, payload):
+        if len(payload) != SenseMsg.FORMAT.size:
+            return
+        mess = SenseMsg.unpack(payload)
+        new_mess = self.globalpacket
+        me = self.TOS_NODE_ID
+        self.dbg("radio_rec", "[RADIO_REC] NODE %u: Received a message of type %u, ID %u.",
+                 me, mess.type, mess.msg_id)
+        if 1 <= me <= self.SENSOR_NODES:
+            if mess.type == 1 and mess.msg_id == self.msg_tx.msg_id:
+                self.ack_received = True
+                self.dbg("radio_rec", "[RADIO_REC] NODE %u: Received ack for message with ID %u.",
+                         me, mess.msg_id)
+        elif me in (6, 7):
+            addr = self.SERVER_NODE if mess.type == 0 else mess.destination if mess.type == 1 else 0
+            self.dbg("radio_rec", "[RADIO_REC] NODE %u: Gateway forwarding the received message to %u.",
+                     me, addr)
+            for name in SenseMsg.__slots__:
+                setattr(new_mess, name, getattr(mess, name))
+            self.generate_send(addr, new_mess)
+        elif me == self.SERVER_NODE:
+            self.server_receive(mess, new_mess)
+
+    def server_receive(self, mess, new_mess):
+        field = self.FIELDS.get(mess.sender)
+        if field is not None:
+            self.dbg("server", "[SERVER] Sending to NODE-RED the value %u sent by node %u.",
+                     mess.data, mess.sender)
+            self.dbg("server", "%s:%u", field, mess.data)
+        if not 1 <= mess.sender <= self.SENSOR_NODES:
+            return
+        last = self.msg_from_sensor[mess.sender - 1]
+        if last[0] != mess.msg_id:
+            self.dbg("server", "[SERVER] Generating the ack of the message sent by %u with ID %u.",
+                     mess.sender, mess.msg_id)
+            last[:] = [mess.msg_id, mess.destination, False]
+        elif last[1] == mess.destination and not last[2]:
+            self.dbg("server", "[SERVER] Retransmitting the ack of the message sent by %u with ID %u.",
+                     mess.sender, mess.msg_id)
+            last[2] = True
+        else:
+            self.dbg("server", "[SERVER] The received message with ID %u sent by %u is a duplicate, "
+                     "discarding it...", mess.msg_id, mess.sender)
+            return
+        new_mess.type = 1
+        new_mess.msg_id = mess.msg_id
+        new_mess.data = 0
+        new_mess.sender = mess.destination
+        new_mess.destination = mess.sender
+        self.generate_send(new_mess.sender, new_mess)
+
+
+APPLICATIONS = {"RadioRouteC": RadioRouteC, "SenseNetC": SenseNetC}
+
+
+class Tossim(object):
+    """The simulation: event queue, motes, radio, MAC and debug channels."""
+
+    def __init__(self, variables=None, app="RadioRouteC"):
+        if isinstance(app, str):
+            if app not in APPLICATIONS:
+                raise ValueError("unknown application %r, expected one of %s"
+                                 % (app, ", ".join(sorted(APPLICATIONS))))
+            app = APPLICATIONS[app]
+        self.app = app
+        self.rng = random.Random()
+        self._mac = MAC()
+        self._radio = Radio(self)
+        self._channels = {}
+        self._motes = {}
+        self._reset()
+
+    def _reset(self):
+        self._now = 0
+        self._current = 0
+        self._queue = []
+        self._seq = 0
+
+    # Event queue.
+    def _schedule(self, when, node, func, args):
+        self._seq += 1
+        heapq.heappush(self._queue, (when, self._seq, node, func, args))
+
+    def runNextEvent(self):
+        if not self._queue:
+            return False
+        when, _, node, func, args = heapq.heappop(self._queue)
+        self._now = when
+        self._current = node
+        func(*args)
+        return True
+
+    def runEvents(self, n):
+        """Run up to n events; returns (events executed, time())."""
+        queue, pop = self._queue, heapq.heappop
+        count = 0
+        while count < n and queue:
+            when, _, node, func, args = pop(queue)
+            self._now = when
+            self._current = node
+            func(*args)
+            count += 1
+        return count, self._now
+
+    def runUntil(self, sim_time):
+        """Run events until time() reaches sim_time (in ticks)."""
+        count = 0
+        while self._now < sim_time and self.runNextEvent():
+            count += 1
+        return count, self._now
+
+    def runFor(self, duration):
+        return self.runUntil(self._now + duration)
+
+    # TOSSIM interface.
+    def init(self):
+        self._reset()
+        self.rng.seed(_time.time())
+
+    def randomSeed(self, seed):
+        self.rng.seed(seed)
+
+    def time(self):
+        return self._now
+
+    def ticksPerSecond(self):
+        return TICKS_PER_SECOND
+
+    def setTime(self, when):
+        self._now = when
+
+    def timeStr(self):
+        seconds = float(self._now) / TICKS_PER_SECOND
+        return "%d:%d:%.9f" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+    def currentNode(self):
+        return self._current
+
+    def setCurrentNode(self, node):
+        self._current = node
+
+    def getNode(self, node):
+        mote = self._motes.get(node)
+        if mote is None:
+            mote = self._motes[node] = Mote(self, node)
+        return mote
+
+    def addChannel(self, name, out):
+        self._channels.setdefault(name, []).append(out)
+        return True
+
+    def removeChannel(self, name, out):
+        outputs = self._channels.get(name, [])
+        if out in outputs:
+            outputs.remove(out)
+            return True
+        return False
+
+    def mac(self):
+        return self._mac
+
+    def radio(self):
+        return self._radio
+
+    def newPacket(self):
+        return Packet(self)
+
+    def bootNodes(self, ids, times):
+        count = 0
+        for i, at in zip(ids, times):
+            self.getNode(i).bootAtTime(at)
+            count += 1
+        return count
+
+    def addChannels(self, names, out):
+        for name in names:
+            self.addChannel(name, out)
+
+    def addNoiseTraceToNodes(self, ids, trace):
+        readings = list(trace)
+        for i in ids:
+            self.getNode(i)._noise_trace.extend(readings)
+        return len(readings)
+
+    def dbg(self, channel, node, text, error=False):
+        outputs = self._channels.get(channel)
+        if outputs:
+            line = "%s (%d): %s\n" % ("ERROR" if error else "DEBUG", node, text)
+            for out in outputs:
+                out.write(line)
+
+    # Mote life cycle.
+    def _boot(self, mote):
+        mote.on = True
+        mote.epoch += 1
+        mote.sending = False
+        mote.receptions = []
+        mote.app = self.app(self, mote)
+        mote.app.booted()
+        self._schedule(self._now + int(RADIO_START_DELAY * TICKS_PER_SECOND), mote.id(),
+                       self._start_done, (mote, mote.epoch))
+
+    def _start_done(self, mote, epoch):
+        if mote.on and mote.epoch == epoch:
+            mote.app.startDone(True)
+
+    # Radio.
+    def _airtime(self, length):
+        mac = self._mac
+        bits = 8 * (HEADER_BYTES + length + FOOTER_BYTES)
+        return mac.symbols(bits // mac._bitsPerSymbol + mac._preambleLength)
+
+    def _send(self, mote, dest, am_type, payload):
+        if mote.sending:
+            return False
+        mote.sending = True
+        mac = self._mac
+        backoff = self.rng.randint(mac._initLow, mac._initHigh)
+        self._schedule(self._now + mac.symbols(backoff), mote.id(), self._csma,
+                       (mote, mote.epoch, dest, am_type, payload, 1))
+        return True
+
+    def _csma(self, mote, epoch, dest, am_type, payload, attempt):
+        if not mote.on or mote.epoch != epoch:
+            return
+        mac = self._mac
+        if mote.receptions or mote.tx_end > self._now:
+            if mac._maxIterations and attempt >= mac._maxIterations:
+                self._schedule(self._now, mote.id(), self._send_done, (mote, epoch, False))
+                return
+            backoff = self.rng.randint(mac._low, mac._high)
+            self._schedule(self._now + mac.symbols(backoff), mote.id(), self._csma,
+                           (mote, epoch, dest, am_type, payload, attempt + 1))
+            return
+        self._transmit(mote, epoch, dest, am_type, payload)
+
+    def _transmit(self, mote, epoch, dest, am_type, payload):
+        now = self._now
+        end = now + self._airtime(len(payload))
+        src = mote.id()
+        mote.tx_end = end
+        # Half duplex: whatever the sender was receiving is lost.
+        for rx in mote.receptions:
+            rx.lost = True
+        ids, gains = self._radio.neighbours(src)
+        sensitivity = self._radio.sensitivity
+        motes = self._motes
+        for dest_id, gain in zip(ids, gains):
+            receiver = motes.get(dest_id)
+            if receiver is None or not receiver.on or gain < sensitivity:
+                continue
+            signal_mw = _dbm_to_mw(gain)
+            rx = _Reception(src, dest, am_type, payload, gain, receiver.generateNoise(now))
+            if receiver.tx_end > now:
+                rx.lost = True
+            for other in receiver.receptions:
+                other.interference_mw += signal_mw
+                rx.interference_mw += _dbm_to_mw(other.signal)
+            receiver.receptions.append(rx)
+            self._schedule(end, dest_id, self._reception_end, (receiver, receiver.epoch, rx))
+        self._schedule(end, src, self._send_done, (mote, epoch, True))
+
+    def _reception_end(self, mote, epoch, rx):
+        if mote.epoch != epoch:
+            return
+        mote.receptions.remove(rx)
+        if rx.lost or not mote.on or self.rng.random() >= prr_from_snr(rx.sinr()):
+            return
+        self._deliver(mote.id(), rx.src, rx.dest, rx.am_type, rx.payload)
+
+    def _deliver(self, node, src, dest, am_type, payload):
+        mote = self._motes.get(node)
+        if mote is None or not mote.on or am_type != mote.app.AM_TYPE:
+            return
+        if dest == node or dest == BROADCAST:
+            mote.app.receive(payload)
+
+    def _send_done(self, mote, epoch, ok):
+        if mote.epoch != epoch:
+            return
+        mote.sending = False
+        mote.app.sendDone(ok)
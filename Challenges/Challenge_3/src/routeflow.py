@@ -0,0 +1,368 @@
+"""
+Packet-flow reconstruction of a RadioRoute run from its debug log.
+
+Reads the radio_send and radio_rec lines of a RadioRouteC run, either a
+text log such as tossim_log.txt or a structured log written by dbglog.py,
+and rebuilds in a single pass:
+
+    - every transmission ("Sending message of type T from S to D passing
+      by A" up to "Packet sent from S at time ...") and the receptions it
+      caused,
+    - the propagation tree of the ROUTE_REQ flood (type 1) and of the
+      ROUTE_REPLY flood (type 2): the parent of a node is the sender of
+      the first copy it received,
+    - the routing table entry of every node towards the requested node,
+      replaying the cost rules of RadioRouteC.nc, since costs are never
+      logged,
+    - the hop path of the data packet (type 0),
+    - convergence time (first ROUTE_REQ to last routing update) and the
+      message overhead of each flood.
+
+"[RADIO_REC] Received a message of type T" names neither sender nor
+time, so a reception at node n is matched to the transmission of type T
+in flight from another node addressed to n or broadcast; a node has at
+most one transmission in flight (RadioRouteC locks the radio until
+sendDone), and when several senders qualify the earliest one that n has
+not heard yet wins.  In text logs a transmission gets the time of its
+"Packet sent ... at time" line; in structured logs every line carries the
+simulation time of the event that printed it.  Structured logs whose
+lines were stamped in batches, many events sharing one time, lose that
+time and the order of the lines across channels, and are rejected.
+
+State is kept per node (tree parents, routing entry) and per transmission
+in flight, so memory grows with the number of nodes, never with the
+length of the log:
+
+    python routeflow.py tossim_log.txt
+    python routeflow.py run.tdbg --requested 7 --source 1 --summary
+"""
+
+import argparse
+import re
+import sys
+from collections import OrderedDict, deque
+
+from dbglog import MAGIC, DebugLogError, DebugLogReader, parse_line
+
+TICKS_PER_SECOND = 10000000000
+BROADCAST = 65535
+DATA, ROUTE_REQ, ROUTE_REPLY = 0, 1, 2
+TYPE_NAMES = {DATA: "DATA", ROUTE_REQ: "ROUTE_REQ", ROUTE_REPLY: "ROUTE_REPLY"}
+# Finished transmissions that late receptions may still be matched to.
+RECENT = 32
+# A node prints a few radio lines per event; more at one time in a
+# structured log means the lines were stamped in batches.
+BATCHED_LINES = 8
+
+_SENDING = re.compile(r"\[RADIO_SEND\] Sending message of type (\d+) from (\d+) to (\d+) "
+                      r"passing by (\d+)")
+_SENT = re.compile(r"\[RADIO_SEND\] Packet sent from (\d+) at time (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SEND_ERROR = re.compile(r"\[RADIO_SEND\] Send done error for node (\d+)")
+_RECEIVED = re.compile(r"\[RADIO_REC\] Received a message of type (\d+)")
+
+
+class Transmission(object):
+    """One send of one node and the nodes that received it."""
+
+    __slots__ = ("type", "sender", "destination", "via", "start", "done", "received")
+
+    def __init__(self, type, sender, destination, via, start):
+        self.type = type
+        self.sender = sender
+        self.destination = destination
+        self.via = via
+        self.start = start
+        self.done = None
+        self.received = set()
+
+    @property
+    def time(self):
+        return self.start if self.start is not None else self.done
+
+    def addressed_to(self, node):
+        return node != self.sender and node not in self.received and \
+            (self.via == BROADCAST or self.via == node)
+
+
+class Flood(object):
+    """Propagation tree and overhead of the messages of one type."""
+
+    def __init__(self, type):
+        self.type = type
+        self.parent = {}
+        self.reached_at = {}
+        self.transmissions = 0
+        self.receptions = 0
+        self.duplicates = 0
+        self.roots = []
+        self.first = None
+        self.last = None
+
+    def sent(self, tx):
+        self.transmissions += 1
+        if tx.sender not in self.parent and tx.sender not in self.roots:
+            self.roots.append(tx.sender)
+
+    def received(self, node, tx):
+        self.receptions += 1
+        if node in self.parent or node in self.roots:
+            self.duplicates += 1
+            return False
+        self.parent[node] = tx.sender
+        return True
+
+    def settled(self, tx):
+        # Times are only known once a text-log transmission is done.
+        when = tx.time
+        if when is None:
+            return
+        if self.first is None or when < self.first:
+            self.first = when
+        if self.last is None or when > self.last:
+            self.last = when
+        for node in tx.received:
+            if self.parent.get(node) == tx.sender and node not in self.reached_at:
+                self.reached_at[node] = when
+
+    def depth(self, node):
+        depth = 0
+        while node in self.parent:
+            node = self.parent[node]
+            depth += 1
+        return depth
+
+    def children(self):
+        tree = {}
+        for node in sorted(self.parent):
+            tree.setdefault(self.parent[node], []).append(node)
+        return tree
+
+
+class RouteFlow(object):
+    """Single-pass reconstruction; feed() lines or records in log order."""
+
+    def __init__(self, requested=7, source=1):
+        self.requested = requested
+        self.source = source
+        self.floods = dict((kind, Flood(kind)) for kind in TYPE_NAMES)
+        # type -> sender -> transmission in flight
+        self.inflight = {}
+        self.recent = deque(maxlen=RECENT)
+        # node -> [next hop, cost] towards the requested node, and the
+        # cost of the ROUTE_REPLY each node has queued (one per node).
+        self.routes = {}
+        self.reply_cost = {}
+        self.data_path = []
+        self.delivered = None
+        self.last_update = None
+        self.unmatched = 0
+        self.lines = 0
+        self._senders = {}
+
+    def feed_text(self, line):
+        """Account for one line of a text log."""
+        parsed = parse_line(line)
+        if parsed is not None:
+            self.feed(parsed[0], parsed[2])
+
+    def feed(self, node, text, when=None):
+        """Account for one debug message of node, printed at when seconds."""
+        self.lines += 1
+        if text.startswith("[RADIO_SEND]"):
+            m = _SENDING.match(text)
+            if m is not None:
+                kind, sender, destination, via = [int(g) for g in m.groups()]
+                self._sending(Transmission(kind, sender, destination, via, when))
+                return
+            m = _SENT.match(text)
+            if m is not None:
+                h, mi, s = m.group(2), m.group(3), m.group(4)
+                self._done(int(m.group(1)), when if when is not None
+                           else int(h) * 3600 + int(mi) * 60 + float(s))
+                return
+            m = _SEND_ERROR.match(text)
+            if m is not None:
+                self._done(int(m.group(1)), when, failed=True)
+        elif text.startswith("[RADIO_REC]"):
+            m = _RECEIVED.match(text)
+            if m is not None:
+                self._received(node, int(m.group(1)))
+            elif "WE'RE DONE" in text:
+                self.delivered = (node, when)
+
+    def _sending(self, tx):
+        # A previous send of this node that never reported sendDone.
+        self._done(tx.sender, None, failed=True)
+        self.inflight.setdefault(tx.type, OrderedDict())[tx.sender] = tx
+        self._senders[tx.sender] = tx.type
+        flood = self.floods.get(tx.type)
+        if flood is not None:
+            flood.sent(tx)
+        if tx.type == DATA:
+            self.data_path.append((tx.sender, tx.via))
+        elif tx.type == ROUTE_REPLY:
+            if tx.sender == self.requested:
+                self.reply_cost.setdefault(tx.sender, 1)
+            elif tx.sender not in self.reply_cost:
+                route = self.routes.get(tx.sender)
+                self.reply_cost[tx.sender] = route[1] + 1 if route else None
+
+    def _done(self, sender, when, failed=False):
+        kind = self._senders.pop(sender, None)
+        if kind is None:
+            return
+        tx = self.inflight[kind].pop(sender)
+        if when is not None:
+            tx.done = when
+        self._settle(tx)
+        if not failed:
+            # Receptions may still trail the sendDone of their sender.
+            self.recent.append(tx)
+
+    def _settle(self, tx):
+        flood = self.floods.get(tx.type)
+        if flood is not None:
+            flood.settled(tx)
+        if self.last_update is not None and self.last_update[0] is tx:
+            self.last_update = (tx, tx.time)
+
+    def _match(self, node, kind):
+        # Transmissions in flight are in log order, the earliest first.
+        for tx in self.inflight.get(kind, {}).values():
+            if tx.addressed_to(node):
+                return tx
+        for tx in reversed(self.recent):
+            if tx.type == kind and tx.addressed_to(node):
+                return tx
+        return None
+
+    def _received(self, node, kind):
+        tx = self._match(node, kind)
+        if tx is None:
+            self.unmatched += 1
+            return
+        tx.received.add(node)
+        flood = self.floods.get(kind)
+        if flood is not None:
+            flood.received(node, tx)
+        if kind == ROUTE_REQ:
+            # A node with a route (or the requested node) answers a request.
+            route = self.routes.get(node)
+            if node == self.requested:
+                self.reply_cost.setdefault(node, 1)
+            elif route is not None:
+                self.reply_cost.setdefault(node, route[1] + 1)
+        elif kind == ROUTE_REPLY and node != self.requested:
+            cost = self.reply_cost.get(tx.sender)
+            route = self.routes.get(node)
+            if cost is not None and (route is None or cost < route[1]):
+                self.routes[node] = [tx.sender, cost]
+                self.last_update = (tx, tx.time)
+                if node != self.source:
+                    self.reply_cost.setdefault(node, cost + 1)
+
+    def finish(self):
+        """Settle the transmissions still in flight at the end of the log."""
+        for sender in list(self._senders):
+            self._done(sender, None, failed=True)
+        self.recent.clear()
+        return self
+
+    def convergence(self):
+        """Seconds from the first ROUTE_REQ to the last routing update."""
+        start = self.floods[ROUTE_REQ].first
+        if start is None or self.last_update is None or self.last_update[1] is None:
+            return None
+        return self.last_update[1] - start
+
+
+def read_text(path, flow):
+    f = open(path, "r")
+    try:
+        for line in f:
+            flow.feed_text(line)
+    finally:
+        f.close()
+    return flow.finish()
+
+
+def read_structured(path, flow):
+    reader = DebugLogReader(path)
+    try:
+        current, lines = None, {}
+        for sim_time, node, channel, level, text in reader.records(
+                channels=[c for c in ("radio_send", "radio_rec") if c in reader.channels]):
+            if sim_time != current:
+                current, lines = sim_time, {}
+            lines[node] = count = lines.get(node, 0) + 1
+            if count > BATCHED_LINES:
+                raise DebugLogError("%s: node %d has more than %d radio lines at time %d; "
+                                    "the log was stamped in batches, not per event"
+                                    % (path, node, BATCHED_LINES, sim_time))
+            flow.feed(node, text, float(sim_time) / TICKS_PER_SECOND)
+    finally:
+        reader.close()
+    return flow.finish()
+
+
+def _seconds(value):
+    return "-" if value is None else "%.6f" % value
+
+
+def report(flow, out=sys.stdout, trees=True):
+    for kind in (ROUTE_REQ, ROUTE_REPLY):
+        flood = flow.floods[kind]
+        reached = len(flood.parent) + len(flood.roots)
+        out.write("%s flood from %s: %d transmissions, %d receptions (%d duplicates), "
+                  "%d nodes reached, depth %d, %s s to %s s\n"
+                  % (TYPE_NAMES[kind], ", ".join(str(r) for r in flood.roots) or "-",
+                     flood.transmissions, flood.receptions, flood.duplicates, reached,
+                     max([flood.depth(n) for n in flood.parent] or [0]),
+                     _seconds(flood.first), _seconds(flood.last)))
+        for parent, children in sorted(flood.children().items()) if trees else ():
+            out.write("    %d -> %s\n" % (parent, ", ".join(
+                "%d (%s s)" % (child, _seconds(flood.reached_at.get(child)))
+                for child in children)))
+    costs = [route[1] for route in flow.routes.values()]
+    out.write("Routes to node %d: %d nodes, cost %s to %s%s\n"
+              % (flow.requested, len(costs), min(costs or ["-"]), max(costs or ["-"]),
+                 " (node: next hop, cost)" if trees and costs else ""))
+    for node in sorted(flow.routes) if trees else ():
+        out.write("    %d: %d, %d\n" % (node, flow.routes[node][0], flow.routes[node][1]))
+    if flow.data_path:
+        hops = [flow.data_path[0][0]] + [via for _, via in flow.data_path]
+        out.write("Data path: %s%s\n" % (" -> ".join(str(h) for h in hops),
+                                         ", delivered" if flow.delivered else ", not delivered"))
+    control = flow.floods[ROUTE_REQ].transmissions + flow.floods[ROUTE_REPLY].transmissions
+    out.write("Convergence: %s s after the first ROUTE_REQ; %d control transmissions, "
+              "%d data transmissions, %d unmatched receptions\n"
+              % (_seconds(flow.convergence()), control, flow.floods[DATA].transmissions,
+                 flow.unmatched))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruct the packet flow of a "
+                                     "RadioRoute run from its debug log.")
+    parser.add_argument("log", help="text log (tossim_log.txt) or dbglog.py structured log")
+    parser.add_argument("--requested", type=int, default=7, help="node the routes lead to")
+    parser.add_argument("--source", type=int, default=1, help="node sending the data packet")
+    parser.add_argument("--summary", action="store_true",
+                        help="leave out the per-node trees and routes")
+    args = parser.parse_args(argv)
+
+    flow = RouteFlow(args.requested, args.source)
+    f = open(args.log, "rb")
+    try:
+        structured = f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+    if structured:
+        read_structured(args.log, flow)
+    else:
+        read_text(args.log, flow)
+    report(flow, trees=not args.summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Periodic snapshots of application variables across all motes.
+
+    sampler = VariableSampler(t, ["RadioRouteC.routing_table", "RadioRouteC.locked"],
+                              ids=range(1, 8), period_ms=100, samples=300)
+    sampler.run()
+    tables = sampler.data["RadioRouteC.routing_table"]   # (300, 7, 6, 3)
+
+Every variable of every mote is resolved with getVariable() once, when
+the sampler is created, and the results go into NumPy arrays shaped
+(samples, nodes, ...) allocated up front, so a snapshot costs one
+getData() call per node and variable and no lookups or allocations.
+run() steps the simulation with runUntil() from one sample time to the
+next and takes a snapshot as soon as the simulation reaches it, i.e.
+right after the first event at or past the sample time.  Sample times in
+a gap between two events therefore share the state after the gap; times
+holds the simulated seconds at which each snapshot was actually taken.
+
+The shape and type of each array come from the first value read: lists
+(such as the rows of routing_table in pysim) become extra dimensions.
+_TOSSIM returns variables of struct type as raw bytes in the byte order
+of the host; pass a NumPy dtype for them in dtypes, e.g.
+
+    ROUTE = numpy.dtype([("node_id", "<u2"), ("next_hop", "<u2"), ("cost", "<u2")])
+    VariableSampler(t, ["RadioRouteC.routing_table"], ids, 100, 300,
+                    dtypes={"RadioRouteC.routing_table": ROUTE})
+
+With _TOSSIM the variables are only readable when the simulator was
+created with the variable list of the application's app.xml (the
+"app_xml" entry of a scenario).
+
+    python sampler.py radioroute.json RadioRouteC.routing_table RadioRouteC.locked \\
+        --period 100 --samples 300 --out samples.npz
+"""
+
+import argparse
+import sys
+
+import numpy
+
+MILLI = 1000.0
+
+
+def _decoder(value, dtype):
+    """Return (convert, shape, dtype) for the values of one variable."""
+    if isinstance(value, bytes):
+        dtype = numpy.dtype(dtype or numpy.uint8)
+
+        def convert(value):
+            return numpy.frombuffer(value, dtype)
+        return convert, convert(value).shape, dtype
+    array = numpy.asarray(value, dtype=dtype)
+    return None, array.shape, array.dtype
+
+
+class VariableSampler(object):
+    """Snapshots the named variables of the motes in ids every period_ms."""
+
+    def __init__(self, t, names, ids, period_ms, samples, dtypes=None):
+        self.t = t
+        self.names = list(names)
+        self.ids = list(ids)
+        self.ticks_per_second = t.ticksPerSecond()
+        self.period = int(round(period_ms * self.ticks_per_second / MILLI))
+        if self.period <= 0:
+            raise ValueError("the sampling period must be positive")
+        self.samples = samples
+        self.count = 0
+        self.times = numpy.zeros(samples, dtype=numpy.float64)
+        self.data = {}
+        self._readers = []
+        dtypes = dtypes or {}
+        for name in self.names:
+            getters = [t.getNode(i).getVariable(name).getData for i in self.ids]
+            convert, shape, dtype = _decoder(getters[0](), dtypes.get(name))
+            out = self.data[name] = numpy.zeros((samples, len(self.ids)) + shape, dtype=dtype)
+            self._readers.append((out, getters, convert))
+
+    def sample(self):
+        """Take a snapshot now; returns False once the arrays are full."""
+        k = self.count
+        if k >= self.samples:
+            return False
+        for out, getters, convert in self._readers:
+            row = out[k]
+            if convert is None:
+                for j, get in enumerate(getters):
+                    row[j] = get()
+            else:
+                for j, get in enumerate(getters):
+                    row[j] = convert(get())
+        self.times[k] = float(self.t.time()) / self.ticks_per_second
+        self.count = k + 1
+        return True
+
+    def run(self, start=None):
+        """Run the simulation, sampling every period from start (default now).
+
+        Stops when the arrays are full or the event queue runs dry and
+        returns the number of snapshots taken.
+        """
+        t = self.t
+        at = t.time() if start is None else int(start)
+        while self.count < self.samples:
+            t.runUntil(at)
+            if t.time() < at:
+                # No events left before the next sample time.
+                break
+            self.sample()
+            at += self.period
+        return self.count
+
+    def arrays(self):
+        """Return the filled part of every array, plus "time"."""
+        arrays = dict((name, out[:self.count]) for name, out in self.data.items())
+        arrays["time"] = self.times[:self.count]
+        return arrays
+
+
+def main(argv=None):
+    from scenario import Scenario
+
+    parser = argparse.ArgumentParser(description="Sample mote variables during a scenario run.")
+    parser.add_argument("scenario")
+    parser.add_argument("variables", nargs="+", help='e.g. "RadioRouteC.routing_table"')
+    parser.add_argument("--period", type=float, default=100.0, help="sim-ms between samples")
+    parser.add_argument("--samples", type=int, default=300)
+    parser.add_argument("--out", default="samples.npz")
+    args = parser.parse_args(argv)
+
+    scenario = Scenario.from_file(args.scenario)
+    t = scenario.build()
+    sampler = VariableSampler(t, args.variables, scenario.node_ids, args.period, args.samples)
+    count = sampler.run()
+    scenario.close()
+    arrays = sampler.arrays()
+    arrays["ids"] = numpy.asarray(sampler.ids)
+    numpy.savez(args.out, **arrays)
+    print("Wrote %d samples of %d nodes to %s" % (count, len(sampler.ids), args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
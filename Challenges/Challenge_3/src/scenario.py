@@ -0,0 +1,318 @@
+"""
+Declarative TOSSIM scenarios.
+
+A scenario file describes the whole simulation set-up that used to be
+written out statement by statement in RunSimulationScript.py:
+
+    {
+        "seed": 1,
+        "log": "tossim_log.txt",
+        "channels": ["boot", "radio_send", "radio_rec"],
+        "nodes": [
+            {"ids": "1-7", "boot": {"dist": "fixed", "value": 0}}
+        ],
+        "topology": {"file": "topology.txt"},
+        "noise": {"file": "meyer-heavy.txt", "samples": 10002}
+    }
+
+Node ids are given as integers, "first-last" ranges or lists of both.
+Boot times are in seconds and are drawn per node from one of the
+distributions "fixed" (value), "uniform" (low, high) or "normal" (mean,
+std, clipped at zero), plus a uniform perturbation of up to "jitter"
+seconds if given.  The topology is a topology.txt style or binary .ntop
+file, an inline list of [src, dst, gain] links, or a generator from
+topology.py with its arguments, e.g.
+
+    "topology": {"generate": "grid", "rows": 30, "cols": 30, "spacing": 5}
+
+Noise readings are loaded once
+and shared by every node, or by the nodes listed in "noise": {"ids": ...}.
+
+"engine": "pysim" runs the scenario in the packet-level simulator of
+pysim.py instead of _TOSSIM, with the application model named by "app"
+(RadioRouteC by default).  With _TOSSIM, "app_xml" names the app.xml
+written by "make micaz sim"; its module variables are then registered so
+Mote.getVariable() can read them (see sampler.py).
+
+JSON files always work; .yaml/.yml files need PyYAML and .toml files need
+tomllib (Python 3.11+) or the toml package.
+
+Keep in mind that _TOSSIM is compiled with a fixed maximum number of motes
+(TOSSIM_MAX_NODES, 1000 by default).
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+from noisecache import NoiseModelCache
+import topology as topo
+
+BOOT_DISTRIBUTIONS = ("fixed", "uniform", "normal")
+ENGINES = ("tossim", "pysim")
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+def parse_ids(spec):
+    """Expand an id spec (int, "a-b" string or list of both) into a list."""
+    if isinstance(spec, (list, tuple)):
+        ids = []
+        for item in spec:
+            ids.extend(parse_ids(item))
+        return ids
+    if isinstance(spec, int):
+        return [spec]
+    text = str(spec).strip()
+    if "-" in text:
+        first, last = text.split("-", 1)
+        first, last = int(first), int(last)
+        if last < first:
+            raise ScenarioError("empty node range: %r" % (spec,))
+        return list(range(first, last + 1))
+    return [int(text)]
+
+
+def boot_times(dist, count, rng):
+    """Return count boot times in seconds drawn from the dist spec.
+
+    A "jitter" entry adds a uniform perturbation in [0, jitter) seconds.
+    """
+    kind = dist.get("dist", "fixed")
+    if kind == "fixed":
+        times = [float(dist.get("value", 0))] * count
+    elif kind == "uniform":
+        low, high = float(dist["low"]), float(dist["high"])
+        times = [rng.uniform(low, high) for _ in range(count)]
+    elif kind == "normal":
+        mean, std = float(dist["mean"]), float(dist["std"])
+        times = [max(0.0, rng.gauss(mean, std)) for _ in range(count)]
+    else:
+        raise ScenarioError("unknown boot distribution %r, expected one of %s"
+                            % (kind, ", ".join(BOOT_DISTRIBUTIONS)))
+    jitter = float(dist.get("jitter", 0))
+    if jitter:
+        times = [at + rng.uniform(0.0, jitter) for at in times]
+    return times
+
+
+def topology_links(topology, base_dir="."):
+    """Return the (src, dst, gain) columns described by a topology spec."""
+    if "file" in topology:
+        return topo.read_topology(os.path.join(base_dir, topology["file"]))
+    if "generate" in topology:
+        args = dict(topology)
+        kind = args.pop("generate")
+        if kind not in topo.GENERATORS:
+            raise ScenarioError("unknown topology generator %r, expected one of %s"
+                                % (kind, ", ".join(sorted(topo.GENERATORS))))
+        return topo.GENERATORS[kind](**args)
+    links = topology.get("links", [])
+    return ([int(l[0]) for l in links], [int(l[1]) for l in links],
+            [float(l[2]) for l in links])
+
+
+def new_simulator(config, base_dir="."):
+    """Return a fresh Tossim instance of the engine the config asks for."""
+    engine = config.get("engine", "tossim")
+    if engine == "tossim":
+        from TOSSIM import Tossim
+        variables = []
+        if config.get("app_xml"):
+            from tinyos.tossim.TossimApp import NescApp
+            app = NescApp(xmlFile=os.path.join(base_dir, config["app_xml"]))
+            variables = app.variables.variables()
+        return Tossim(variables)
+    if engine == "pysim":
+        import pysim
+        return pysim.Tossim([], app=config.get("app", "RadioRouteC"))
+    raise ScenarioError("unknown engine %r, expected one of %s" % (engine, ", ".join(ENGINES)))
+
+
+def load_config(path):
+    """Parse a scenario file according to its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ScenarioError("PyYAML is needed to read %s" % path)
+        f = open(path, "r")
+        try:
+            return yaml.safe_load(f)
+        finally:
+            f.close()
+    if ext == ".toml":
+        try:
+            import tomllib
+            f = open(path, "rb")
+            try:
+                return tomllib.load(f)
+            finally:
+                f.close()
+        except ImportError:
+            pass
+        try:
+            import toml
+        except ImportError:
+            raise ScenarioError("tomllib or the toml package is needed to read %s" % path)
+        return toml.load(path)
+    f = open(path, "r")
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+
+class Scenario(object):
+    """A simulation set-up built in bulk from a scenario description.
+
+    build() creates and configures a Tossim instance and records the wall
+    time of every phase in self.timings as (phase, seconds) pairs.
+    """
+
+    def __init__(self, config, base_dir="."):
+        self.config = config
+        self.base_dir = base_dir
+        self.timings = []
+        self.node_ids = []
+        self.boot_times = {}
+        self.link_count = 0
+        self.log = None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_config(path), os.path.dirname(os.path.abspath(path)))
+
+    def path(self, name):
+        return os.path.join(self.base_dir, name)
+
+    def _phase(self, name, start):
+        now = time.time()
+        self.timings.append((name, now - start))
+        return now
+
+    def build(self, t=None, out=None):
+        """Return a configured Tossim instance, ready to run events.
+
+        The debug channels write to out when given, otherwise to the "log"
+        file of the scenario (or stdout if there is none).
+        """
+        self.timings = []
+        start = time.time()
+        t = self._init(t)
+        self._seed(t)
+        start = self._phase("init", start)
+        self._channels(t, out)
+        start = self._phase("channels", start)
+        self._boot(t)
+        start = self._phase("nodes", start)
+        self._topology(t)
+        start = self._phase("topology", start)
+        self._noise(t, start)
+        return t
+
+    def prepare(self, t=None):
+        """Do the expensive, seed independent part of build().
+
+        Initialises the simulator and loads the topology and the noise
+        models; start() then seeds it, attaches the channels and boots the
+        nodes.  Forked sweeps prepare once and start in every child.
+        """
+        self.timings = []
+        start = time.time()
+        t = self._init(t)
+        start = self._phase("init", start)
+        self.node_ids = self._node_ids()
+        self._topology(t)
+        start = self._phase("topology", start)
+        self._noise(t, start)
+        return t
+
+    def start(self, t, out=None):
+        """Seed a prepared simulator, attach the channels and boot the nodes."""
+        start = time.time()
+        self._seed(t)
+        self._channels(t, out)
+        start = self._phase("channels", start)
+        self._boot(t)
+        self._phase("nodes", start)
+        return t
+
+    def _init(self, t):
+        if t is None:
+            t = new_simulator(self.config, self.base_dir)
+        t.init()
+        return t
+
+    def _seed(self, t):
+        # init() reseeds the generator from the clock, so seed afterwards.
+        if "seed" in self.config:
+            t.randomSeed(int(self.config["seed"]))
+
+    def _channels(self, t, out):
+        config = self.config
+        if out is None:
+            if config.get("log"):
+                self.log = open(self.path(config["log"]), "w")
+                out = self.log
+            else:
+                out = sys.stdout
+        t.addChannels(config.get("channels", []), out)
+
+    def _node_ids(self):
+        seen = set()
+        node_ids = []
+        for group in self.config.get("nodes", []):
+            for i in parse_ids(group["ids"]):
+                if i in seen:
+                    raise ScenarioError("node %d is listed more than once" % i)
+                seen.add(i)
+                node_ids.append(i)
+        return node_ids
+
+    def _boot(self, t):
+        config = self.config
+        self.node_ids = self._node_ids()
+        rng = random.Random(config.get("seed"))
+        ticks = t.ticksPerSecond()
+        self.boot_times = {}
+        for group in config.get("nodes", []):
+            ids = parse_ids(group["ids"])
+            times = boot_times(group.get("boot", {}), len(ids), rng)
+            t.bootNodes(ids, [int(at * ticks) for at in times])
+            self.boot_times.update(zip(ids, times))
+
+    def _topology(self, t):
+        src, dst, gain = topology_links(self.config.get("topology", {}), self.base_dir)
+        self.link_count = t.radio().addLinks(src, dst, gain)
+
+    def _noise(self, t, start):
+        noise = self.config.get("noise")
+        if not noise:
+            return
+        ids = parse_ids(noise["ids"]) if "ids" in noise else self.node_ids
+        cache = NoiseModelCache(self.path(noise.get("cache", ".noise_cache")))
+        readings, _ = cache.load(self.path(noise["file"]), int(noise.get("samples", 10000)))
+        t.addNoiseTraceToNodes(ids, readings)
+        start = self._phase("noise trace", start)
+        for i in ids:
+            t.getNode(i).createNoiseModel()
+        self._phase("noise model", start)
+
+    def report(self, out=sys.stdout):
+        """Write the per-phase construction times to out."""
+        total = 0.0
+        for name, seconds in self.timings:
+            out.write("    %-12s %9.3f s\n" % (name, seconds))
+            total += seconds
+        out.write("    %-12s %9.3f s\n" % ("total", total))
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
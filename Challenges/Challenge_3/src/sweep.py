@@ -0,0 +1,360 @@
+"""
+Parameter sweeps over independent TOSSIM simulations.
+
+_TOSSIM keeps the whole simulation in process-global state, so every point
+of a sweep runs in a fresh worker process.  At most one worker per core
+runs at a time, results are appended to a CSV table as soon as each run
+finishes, and a worker that crashes (or exceeds the time limit) is
+recorded as a failed row instead of stopping the sweep.
+
+A sweep file names a base scenario and the values to combine:
+
+    {
+        "scenario": "radioroute.json",
+        "events": 2400,
+        "grid": {
+            "seed": [1, 2, 3],
+            "gain": [-60.0, -75.0],
+            "boot": [{"dist": "uniform", "low": 0, "high": 1}],
+            "noise": ["meyer-heavy.txt"]
+        }
+    }
+
+"seed" sets the TOSSIM random seed, "gain" replaces the gain of every link,
+"boot" replaces the boot distribution of every node group and "noise" the
+noise trace file.  Run it with
+
+    python sweep.py sweep.json results.csv
+
+With "fork": true in the sweep file the simulator is initialised once, with
+the topology and noise models loaded, and every run is a fork() of that
+process: only the seed, the debug channels and the node boots are set up
+per run, copy-on-write.  Only "seed" and "boot" can vary in such a sweep,
+since everything else is shared; a "jitter" in the boot distribution
+gives every seed its own perturbation of the boot times.
+"""
+
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import select
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+from scenario import Scenario, load_config, topology_links
+
+SWEEP_PARAMS = ("seed", "gain", "boot", "noise")
+FORK_PARAMS = ("seed", "boot")
+RESULT_FIELDS = ("run", "status", "events", "sim_time", "convergence_s",
+                 "delivered", "sends", "receives", "wall_s", "error")
+
+_SENT_AT = re.compile(r"DEBUG \((\d+)\): \[RADIO_SEND\] Packet sent from \d+ at time (\d+):(\d+):(\d+(?:\.\d+)?)")
+_DATA_SEND = re.compile(r"DEBUG \((\d+)\): \[RADIO_SEND\] Sending message of type 0 ")
+
+
+def grid_points(grid):
+    """Return the cartesian product of grid as a list of dicts."""
+    names = sorted(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[name] for name in names])]
+
+
+def apply_point(config, point, base_dir="."):
+    """Return a copy of a scenario config with the sweep point applied."""
+    config = copy.deepcopy(config)
+    for name, value in point.items():
+        if name == "seed":
+            config["seed"] = value
+        elif name == "noise":
+            config.setdefault("noise", {})["file"] = value
+        elif name == "boot":
+            for group in config.get("nodes", []):
+                group["boot"] = value
+        elif name == "gain":
+            src, dst, _ = topology_links(config.get("topology", {}), base_dir)
+            config["topology"] = {"links": [[int(s), int(d), float(value)]
+                                            for s, d in zip(src, dst)]}
+        else:
+            raise ValueError("unknown sweep parameter %r, expected one of %s"
+                             % (name, ", ".join(SWEEP_PARAMS)))
+    return config
+
+
+def radioroute_metrics(log_path):
+    """Summarise a RadioRoute debug log.
+
+    convergence_s is the simulated time at which node 1, having learnt a
+    route, finished sending its data packet.
+    """
+    sends = receives = 0
+    delivered = False
+    convergence = None
+    data_sender = None
+    f = open(log_path, "r")
+    try:
+        for line in f:
+            if "[RADIO_SEND] Sending" in line:
+                sends += 1
+                m = _DATA_SEND.match(line)
+                if m and m.group(1) == "1" and convergence is None:
+                    data_sender = "1"
+            elif "[RADIO_REC] Received" in line:
+                receives += 1
+            elif "WE'RE DONE" in line:
+                delivered = True
+            if data_sender is not None:
+                m = _SENT_AT.match(line)
+                if m and m.group(1) == data_sender:
+                    h, mi, sec = m.group(2), m.group(3), m.group(4)
+                    convergence = int(h) * 3600 + int(mi) * 60 + float(sec)
+                    data_sender = None
+    finally:
+        f.close()
+    return {"sends": sends, "receives": receives,
+            "delivered": delivered, "convergence_s": convergence}
+
+
+def run_scenario(scenario, t, events, log_path, started):
+    """Run a built scenario and return its result row."""
+    count, _ = t.runEvents(events)
+    row = {"status": "ok", "events": count,
+           "sim_time": float(t.time()) / t.ticksPerSecond()}
+    scenario.close()
+    row.update(radioroute_metrics(log_path))
+    row["wall_s"] = time.time() - started
+    return row
+
+
+def run_point(config, base_dir, events, conn):
+    """Worker body: build the scenario, run it and send back a result row."""
+    fd, log_path = tempfile.mkstemp(prefix="sweep_", suffix=".log")
+    os.close(fd)
+    try:
+        start = time.time()
+        config["log"] = log_path
+        scenario = Scenario(config, base_dir)
+        t = scenario.build()
+        conn.send(run_scenario(scenario, t, events, log_path, start))
+    except Exception:
+        conn.send({"status": "error", "error": traceback.format_exc().strip().splitlines()[-1]})
+    finally:
+        conn.close()
+        try:
+            os.remove(log_path)
+        except OSError:
+            pass
+
+
+class SweepRunner(object):
+    """Runs every point of a grid in its own process, cores at a time.
+
+    Each finished run is passed to on_result as a dict holding the
+    RESULT_FIELDS plus the sweep parameters.
+    """
+
+    def __init__(self, config, base_dir=".", events=2400, workers=None, timeout=None):
+        self.config = config
+        self.base_dir = base_dir
+        self.events = events
+        self.workers = workers or multiprocessing.cpu_count()
+        self.timeout = timeout
+
+    def run(self, points, on_result):
+        pending = list(enumerate(points))
+        pending.reverse()
+        running = []
+        finished = 0
+        while pending or running:
+            while pending and len(running) < self.workers:
+                index, point = pending.pop()
+                config = apply_point(self.config, point, self.base_dir)
+                recv, send = multiprocessing.Pipe(False)
+                proc = multiprocessing.Process(target=run_point,
+                                               args=(config, self.base_dir, self.events, send))
+                proc.start()
+                send.close()
+                running.append((index, point, proc, recv, time.time()))
+            still_running = []
+            for index, point, proc, recv, started in running:
+                row = None
+                if recv.poll() or not proc.is_alive():
+                    # A worker that died without a result leaves only EOF.
+                    try:
+                        row = recv.recv()
+                    except EOFError:
+                        row = {}
+                elif self.timeout is not None and time.time() - started > self.timeout:
+                    proc.terminate()
+                    row = {"status": "timeout", "error": "killed after %.0f s" % self.timeout}
+                if row is None:
+                    still_running.append((index, point, proc, recv, started))
+                    continue
+                proc.join()
+                recv.close()
+                if not row:
+                    row = {"status": "crashed", "error": "exit code %s" % proc.exitcode}
+                row["run"] = index
+                row.update(point)
+                on_result(row)
+                finished += 1
+            running = still_running
+            if running:
+                time.sleep(0.02)
+        return finished
+
+
+class ForkRunner(object):
+    """Runs every point as a fork() of one prepared simulator process.
+
+    The points may only set FORK_PARAMS.  Results come back as one JSON
+    line per child over a pipe; on_result gets the same rows as with
+    SweepRunner, and "setup_s" in every row is the one-off preparation
+    time.
+    """
+
+    def __init__(self, config, base_dir=".", events=2400, workers=None, timeout=None):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("fork() is not available on this platform")
+        self.config = config
+        self.base_dir = base_dir
+        self.events = events
+        self.workers = workers or multiprocessing.cpu_count()
+        self.timeout = timeout
+
+    def run(self, points, on_result):
+        for point in points:
+            for name in point:
+                if name not in FORK_PARAMS:
+                    raise ValueError("a forked sweep can only vary %s, not %r"
+                                     % (" and ".join(FORK_PARAMS), name))
+        start = time.time()
+        scenario = Scenario(self.config, self.base_dir)
+        t = scenario.prepare()
+        setup = time.time() - start
+
+        pending = list(enumerate(points))
+        pending.reverse()
+        running = {}
+        finished = 0
+        while pending or running:
+            while pending and len(running) < self.workers:
+                index, point = pending.pop()
+                read_fd, pid = self._spawn(scenario, t, point)
+                running[read_fd] = (index, point, pid, time.time(), [])
+            ready, _, _ = select.select(list(running), [], [], 0.05)
+            for fd in list(running):
+                index, point, pid, started, chunks = running[fd]
+                row = None
+                if fd in ready:
+                    data = os.read(fd, 65536)
+                    if data:
+                        chunks.append(data)
+                        continue
+                    # EOF: the child has exited.
+                    text = b"".join(chunks).decode("utf-8")
+                    row = json.loads(text) if text.strip() else {}
+                elif self.timeout is not None and time.time() - started > self.timeout:
+                    os.kill(pid, signal.SIGKILL)
+                    row = {"status": "timeout", "error": "killed after %.0f s" % self.timeout}
+                if row is None:
+                    continue
+                os.close(fd)
+                _, status = os.waitpid(pid, 0)
+                if not row:
+                    # Negative for a signal, like Process.exitcode.
+                    if os.WIFSIGNALED(status):
+                        code = -os.WTERMSIG(status)
+                    else:
+                        code = os.WEXITSTATUS(status)
+                    row = {"status": "crashed", "error": "exit code %s" % code}
+                del running[fd]
+                row["run"] = index
+                row["setup_s"] = setup
+                row.update(point)
+                on_result(row)
+                finished += 1
+        scenario.close()
+        return finished
+
+    def _spawn(self, scenario, t, point):
+        read_fd, write_fd = os.pipe()
+        # Anything still buffered would be written by parent and child.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid:
+            os.close(write_fd)
+            return read_fd, pid
+        os.close(read_fd)
+        status = 0
+        try:
+            fd, log_path = tempfile.mkstemp(prefix="sweep_", suffix=".log")
+            os.close(fd)
+            try:
+                started = time.time()
+                scenario.config = apply_point(self.config, point, self.base_dir)
+                scenario.config["log"] = log_path
+                scenario.start(t)
+                row = run_scenario(scenario, t, self.events, log_path, started)
+            finally:
+                os.remove(log_path)
+        except Exception:
+            row = {"status": "error", "error": traceback.format_exc().strip().splitlines()[-1]}
+            status = 1
+        try:
+            data = (json.dumps(row) + "\n").encode("utf-8")
+            while data:
+                data = data[os.write(write_fd, data):]
+        finally:
+            # Skip the parent's exit handlers and buffers.
+            os._exit(status)
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def main(argv):
+    if len(argv) != 3:
+        sys.stderr.write("usage: %s SWEEP_FILE RESULTS_CSV\n" % argv[0])
+        return 2
+    sweep = load_config(argv[1])
+    sweep_dir = os.path.dirname(os.path.abspath(argv[1]))
+    scenario_path = os.path.join(sweep_dir, sweep["scenario"])
+    points = grid_points(sweep["grid"])
+    runner_class = ForkRunner if sweep.get("fork") else SweepRunner
+    runner = runner_class(load_config(scenario_path), os.path.dirname(scenario_path),
+                          sweep.get("events", 2400), sweep.get("workers"), sweep.get("timeout"))
+
+    fields = list(RESULT_FIELDS)
+    if sweep.get("fork"):
+        fields.append("setup_s")
+    fields += sorted(sweep["grid"])
+    out = open(argv[2], "w")
+    writer = csv.DictWriter(out, fields, extrasaction="ignore")
+    writer.writeheader()
+
+    def on_result(row):
+        writer.writerow(dict((k, _cell(v)) for k, v in row.items()))
+        out.flush()
+        sys.stdout.write("run %d/%d: %s\n" % (row["run"] + 1, len(points), row["status"]))
+        sys.stdout.flush()
+
+    try:
+        runner.run(points, on_result)
+    finally:
+        out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,89 @@
+"""
+A structured log run through routeflow.py must give the packet flow of
+the text log of the same run.  Both logs come from the RadioRoute
+scenario run on the pysim engine with a fixed seed; a log whose lines
+were stamped in batches, as ChannelRecorder once wrote them, is rejected.
+
+    python -m unittest test_routeflow
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dbglog import ChannelRecorder, DebugLogError, DebugLogWriter
+from routeflow import BATCHED_LINES, RouteFlow, read_structured, read_text
+from scenario import Scenario
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "radioroute.json")
+EVENTS = 2400
+SEED = 3
+
+
+def build():
+    scenario = Scenario.from_file(SCENARIO)
+    scenario.config.update(engine="pysim", seed=SEED)
+    devnull = open(os.devnull, "w")
+    t = scenario.build(out=devnull)
+    channels = scenario.config["channels"]
+    for name in channels:
+        t.removeChannel(name, devnull)
+    devnull.close()
+    return t, channels
+
+
+def flow_summary(flow):
+    # Text logs time a transmission by its "Packet sent" line, structured
+    # logs by the event that started it, so only the structure is compared.
+    floods = {}
+    for kind, flood in flow.floods.items():
+        floods[kind] = (flood.roots, flood.parent, flood.transmissions, flood.receptions,
+                        flood.duplicates)
+    delivered = flow.delivered and flow.delivered[0]
+    return floods, flow.routes, flow.data_path, delivered, flow.unmatched
+
+
+class StructuredLogTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(prefix="routeflow_")
+        cls.text = os.path.join(cls.tmp, "run.txt")
+        cls.structured = os.path.join(cls.tmp, "run.tdbg")
+        t, channels = build()
+        f = open(cls.text, "w")
+        try:
+            t.addChannels(channels, f)
+            t.runEvents(EVENTS)
+        finally:
+            f.close()
+        t, channels = build()
+        recorder = ChannelRecorder(t, DebugLogWriter(cls.structured, channels))
+        recorder.runEvents(EVENTS)
+        recorder.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_structured_log_matches_text_log(self):
+        text = RouteFlow(7, 1)
+        read_text(self.text, text)
+        structured = RouteFlow(7, 1)
+        read_structured(self.structured, structured)
+        self.assertTrue(structured.delivered)
+        self.assertEqual(len(structured.routes), 6)
+        self.assertEqual(flow_summary(structured), flow_summary(text))
+
+    def test_batched_log_is_rejected(self):
+        path = os.path.join(self.tmp, "batched.tdbg")
+        writer = DebugLogWriter(path, ["radio_send", "radio_rec"])
+        for i in range(BATCHED_LINES + 1):
+            writer.append(10 ** 10, 2, "radio_rec", "[RADIO_REC] Received a message of type 1.")
+        writer.close()
+        self.assertRaises(DebugLogError, read_structured, path, RouteFlow(7, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+"""
+Topology files and synthetic topology generators.
+
+Besides the topology.txt text format ("src dst gain" per line) links can
+be stored in a compact binary format: a 12 byte header followed by three
+little endian columns.
+
+    offset  size  field
+    0       4     magic, b"TOPO"
+    4       1     format version (1)
+    5       3     reserved, zero
+    8       4     number of links n
+    12      4n    source node ids, uint32
+    12+4n   4n    destination node ids, uint32
+    12+8n   4n    gains in dBm, float32
+
+read_topology() accepts both formats and returns the three columns, ready
+for Radio.addLinks(src, dst, gain).
+
+The generators place nodes on a line, a grid or uniformly at random in a
+square and derive the gain of every pair closer than a cut-off radius from
+a log-distance path loss model with log-normal shadowing (the model of the
+TinyOS LinkLayerModel tool):
+
+    gain = tx_power - (pl_d0 + 10 * exponent * log10(d / d0)) + N(0, sigma)
+
+They need NumPy and work on blocks of a few million pairs, so a 10k node
+random geometric graph never materialises the full distance matrix.
+
+    python topology.py rgg 10000 OUT.ntop --side 500 --radius 15
+    python topology.py grid 100 100 OUT.txt --spacing 5
+"""
+
+import argparse
+import struct
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b"TOPO"
+VERSION = 1
+HEADER = struct.Struct("<4sB3xI")
+
+PATH_LOSS = {
+    "tx_power": 0.0,
+    "pl_d0": 55.4,
+    "d0": 1.0,
+    "exponent": 4.7,
+    "sigma": 3.2,
+}
+
+# Number of pairwise distances computed at once by the generators.
+BLOCK_PAIRS = 4 * 1024 * 1024
+
+
+class TopologyFormatError(ValueError):
+    pass
+
+
+def is_binary_topology(path):
+    f = open(path, "rb")
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+
+
+def read_text_topology(path):
+    src, dst, gain = array('I'), array('I'), array('f')
+    f = open(path, "r")
+    try:
+        for line in f:
+            s = line.split()
+            if len(s) > 0:
+                src.append(int(s[0]))
+                dst.append(int(s[1]))
+                gain.append(float(s[2]))
+    finally:
+        f.close()
+    return src, dst, gain
+
+
+def read_binary_topology(path):
+    f = open(path, "rb")
+    try:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise TopologyFormatError("%s: truncated header" % path)
+        magic, version, count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise TopologyFormatError("%s: not a version %d binary topology" % (path, VERSION))
+        columns = (array('I'), array('I'), array('f'))
+        try:
+            for column in columns:
+                column.fromfile(f, count)
+        except EOFError:
+            raise TopologyFormatError("%s: truncated data" % path)
+    finally:
+        f.close()
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    return columns
+
+
+def read_topology(path):
+    """Return (src, dst, gain) columns of a text or binary topology file."""
+    if is_binary_topology(path):
+        return read_binary_topology(path)
+    return read_text_topology(path)
+
+
+def _column(values, typecode):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        dtype = numpy.uint32 if typecode == 'I' else numpy.float32
+        return array(typecode, values.astype(dtype).tobytes())
+    return array(typecode, values)
+
+
+def write_binary_topology(path, src, dst, gain):
+    columns = (_column(src, 'I'), _column(dst, 'I'), _column(gain, 'f'))
+    count = len(columns[0])
+    if len(columns[1]) != count or len(columns[2]) != count:
+        raise TopologyFormatError("src, dst and gain must have the same length")
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    f = open(path, "wb")
+    try:
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+        for column in columns:
+            column.tofile(f)
+    finally:
+        f.close()
+    return count
+
+
+def write_text_topology(path, src, dst, gain):
+    f = open(path, "w")
+    try:
+        count = 0
+        for s, d, g in zip(_column(src, 'I'), _column(dst, 'I'), _column(gain, 'f')):
+            f.write("%d %d %.1f\n" % (s, d, g))
+            count += 1
+    finally:
+        f.close()
+    return count
+
+
+def write_topology(path, src, dst, gain):
+    """Write links in binary form if path ends with .ntop, else as text."""
+    if path.endswith(".ntop"):
+        return write_binary_topology(path, src, dst, gain)
+    return write_text_topology(path, src, dst, gain)
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("the topology generators need NumPy")
+
+
+def links_from_positions(positions, radius, first_id=1, seed=None, **model):
+    """Return (src, dst, gain) NumPy columns for every ordered pair of
+    nodes closer than radius, with gains from the path loss model.
+
+    positions is an (n, 2) array; node i gets id first_id + i.
+    """
+    _require_numpy()
+    params = dict(PATH_LOSS)
+    params.update(model)
+    rng = numpy.random.RandomState(seed)
+    positions = numpy.asarray(positions, dtype=numpy.float64)
+    n = len(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    step = max(1, BLOCK_PAIRS // max(n, 1))
+    srcs, dsts, gains = [], [], []
+    for start in range(0, n, step):
+        dx = x[start:start + step, None] - x[None, :]
+        dy = y[start:start + step, None] - y[None, :]
+        dist = numpy.sqrt(dx * dx + dy * dy)
+        rows, cols = numpy.nonzero(dist < radius)
+        rows += start
+        keep = rows != cols
+        rows, cols = rows[keep], cols[keep]
+        d = numpy.maximum(dist[rows - start, cols], params["d0"])
+        loss = params["pl_d0"] + 10.0 * params["exponent"] * numpy.log10(d / params["d0"])
+        gain = params["tx_power"] - loss + rng.normal(0.0, params["sigma"], len(d))
+        srcs.append(rows + first_id)
+        dsts.append(cols + first_id)
+        gains.append(gain)
+    if not srcs:
+        empty = numpy.zeros(0)
+        return empty.astype(numpy.uint32), empty.astype(numpy.uint32), empty.astype(numpy.float32)
+    return (numpy.concatenate(srcs).astype(numpy.uint32),
+            numpy.concatenate(dsts).astype(numpy.uint32),
+            numpy.concatenate(gains).astype(numpy.float32))
+
+
+def line_positions(n, spacing=1.0):
+    _require_numpy()
+    positions = numpy.zeros((n, 2))
+    positions[:, 0] = numpy.arange(n) * spacing
+    return positions
+
+
+def grid_positions(rows, cols, spacing=1.0):
+    _require_numpy()
+    y, x = numpy.mgrid[0:rows, 0:cols]
+    return numpy.column_stack((x.ravel(), y.ravel())).astype(numpy.float64) * spacing
+
+
+def random_positions(n, side, seed=None):
+    _require_numpy()
+    return numpy.random.RandomState(seed).uniform(0.0, side, (n, 2))
+
+
+def line(n, spacing=1.0, radius=None, **kwargs):
+    """Links of n nodes on a line; by default only neighbours are linked."""
+    radius = spacing * 1.5 if radius is None else radius
+    return links_from_positions(line_positions(n, spacing), radius, **kwargs)
+
+
+def grid(rows, cols, spacing=1.0, radius=None, **kwargs):
+    """Links of a rows x cols grid; by default the 4 nearest neighbours."""
+    radius = spacing * 1.2 if radius is None else radius
+    return links_from_positions(grid_positions(rows, cols, spacing), radius, **kwargs)
+
+
+def _stream_seeds(seed, count):
+    """Seeds of count independent random streams derived from seed.
+
+    NumPy's SeedSequence is missing from the NumPy of Python 2, so the
+    streams are RandomState([seed, k]): init_by_array mixes the whole key
+    into the generator state, and every interpreter gets the same numbers.
+    """
+    if seed is None:
+        return [None] * count
+    return [[seed, k] for k in range(count)]
+
+
+def random_geometric(n, side, radius, seed=None, **kwargs):
+    """Links of n nodes placed uniformly at random in a side x side square.
+
+    Placement and shadowing draw from separate streams of seed.
+    """
+    placement, shadowing = _stream_seeds(seed, 2)
+    return links_from_positions(random_positions(n, side, placement), radius,
+                                seed=shadowing, **kwargs)
+
+
+GENERATORS = {"line": line, "grid": grid, "random_geometric": random_geometric}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic topology file.")
+    sub = parser.add_subparsers(dest="kind")
+    sub.required = True
+    p = sub.add_parser("line")
+    p.add_argument("n", type=int)
+    p.add_argument("--spacing", type=float, default=1.0)
+    p = sub.add_parser("grid")
+    p.add_argument("rows", type=int)
+    p.add_argument("cols", type=int)
+    p.add_argument("--spacing", type=float, default=1.0)
+    p = sub.add_parser("rgg")
+    p.add_argument("n", type=int)
+    p.add_argument("--side", type=float, required=True)
+    for p in sub.choices.values():
+        p.add_argument("out", help="output file, binary if it ends with .ntop")
+        p.add_argument("--radius", type=float)
+        p.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if args.kind == "line":
+        links = line(args.n, args.spacing, args.radius, seed=args.seed)
+    elif args.kind == "grid":
+        links = grid(args.rows, args.cols, args.spacing, args.radius, seed=args.seed)
+    else:
+        if args.radius is None:
+            parser.error("rgg needs --radius")
+        links = random_geometric(args.n, args.side, args.radius, args.seed)
+    count = write_topology(args.out, *links)
+    print("Wrote %d links to %s" % (count, args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+Pure-Python stand-in for the _TOSSIM extension module.
+
+_TOSSIMmodule.so is a prebuilt Python 2 extension that not every machine
+can load.  This module defines the same functions (new_Tossim,
+Tossim_runNextEvent, Mote_addNoiseTraceReading, Radio_add, ...), so
+TOSSIM.py and everything built on it can run without it:
+
+    import tossim_standin
+    tossim_standin.install()        # before the first "import TOSSIM"
+
+install() registers the stand-in as _TOSSIM only when the real module
+cannot be imported, unless forced with install("standin").
+
+The stand-in does not run a nesC application.  Every booted mote runs a
+fixed synthetic workload instead: it prints to the "boot" channel once,
+then fires a timer every TIMER_PERIOD seconds, printing to "timer1" and
+broadcasting a packet ("radio_send") that every linked mote hears
+("radio_rec") when the link gain is above the sensitivity and the noise
+drawn from the receiver's noise trace.  That is enough to exercise the
+event queue, the debug channels, the radio links and the noise traces in
+roughly the proportions of RunSimulationScript.py, which is what the
+benchmarks need; it says nothing about the behaviour of a real
+application.
+"""
+
+import heapq
+import random
+import sys
+
+TICKS_PER_SECOND = 10000000000
+TIMER_PERIOD = 0.25
+TX_DELAY = 0.002
+SENSITIVITY = -100.0
+SNR_THRESHOLD = 4.0
+MAX_PAYLOAD = 28
+
+BACKENDS = ("auto", "real", "standin")
+
+_BOOT, _TIMER, _RECEIVE = range(3)
+
+
+def install(backend="auto"):
+    """Make "import _TOSSIM" resolve to the chosen backend.
+
+    Returns "_TOSSIM" or "stand-in", whichever is now in use.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend %r, expected one of %s" % (backend, ", ".join(BACKENDS)))
+    current = sys.modules.get("_TOSSIM")
+    if current is not None:
+        return "stand-in" if current is sys.modules[__name__] else "_TOSSIM"
+    if backend != "standin":
+        try:
+            import _TOSSIM
+            return "_TOSSIM"
+        except ImportError:
+            if backend == "real":
+                raise
+    sys.modules["_TOSSIM"] = sys.modules[__name__]
+    return "stand-in"
+
+
+def _this(obj):
+    # Proxies pass themselves, the TOSSIM.py helpers pass self.this.
+    return getattr(obj, "this", obj)
+
+
+class _Object(object):
+
+    def own(self, value=None):
+        if value is not None:
+            self._own = value
+        return getattr(self, "_own", True)
+
+
+_proxies = {}
+
+
+def _proxy(kind, obj):
+    # What SWIG does for pointers returned from C++: wrap them in an
+    # instance of the registered proxy class.
+    cls = _proxies.get(kind)
+    if cls is None:
+        return obj
+    proxy = cls.__new__(cls)
+    proxy.__dict__["this"] = obj
+    return proxy
+
+
+class _Mote(_Object):
+    def __init__(self, sim, node_id):
+        self.sim = sim
+        self.node_id = node_id
+        self.euid = node_id
+        self.boot_time = 0
+        self.on = False
+        self.noise_trace = []
+        self.noise_model = None
+
+    def addNoiseTraceReading(self, val):
+        self.noise_trace.append(int(val))
+
+    def createNoiseModel(self):
+        # TOSSIM builds a CPM model from the trace; keep the sorted trace,
+        # which costs about the same and is enough to draw readings.
+        if not self.noise_trace:
+            raise RuntimeError("mote %d has no noise trace" % self.node_id)
+        self.noise_model = sorted(self.noise_trace)
+
+    def generateNoise(self, when):
+        model = self.noise_model
+        if not model:
+            return 0
+        return model[self.sim.rng.randrange(len(model))]
+
+    def bootAtTime(self, when):
+        self.boot_time = when
+        self.sim.schedule(when, _BOOT, self.node_id, None)
+
+    def turnOff(self):
+        self.on = False
+
+    def turnOn(self):
+        self.on = True
+
+
+class _Radio(_Object):
+    def __init__(self):
+        self.links = {}
+        self.sensitivity = SENSITIVITY
+
+    def add(self, src, dest, gain):
+        self.links.setdefault(src, {})[dest] = gain
+
+    def gain(self, src, dest):
+        return self.links.get(src, {}).get(dest, 0.0)
+
+    def connected(self, src, dest):
+        return dest in self.links.get(src, {})
+
+    def remove(self, src, dest):
+        self.links.get(src, {}).pop(dest, None)
+
+    def setNoise(self, node, mean, range):
+        pass
+
+    def setSensitivity(self, sensitivity):
+        self.sensitivity = sensitivity
+
+
+_MAC_DEFAULTS = (
+    ("initHigh", 10), ("initLow", 1), ("high", 160), ("low", 20),
+    ("symbolsPerSec", 65536), ("bitsPerSymbol", 4), ("preambleLength", 12),
+    ("exponentBase", 0), ("maxIterations", 0), ("minFreeSamples", 1),
+    ("rxtxDelay", 32), ("ackTime", 34),
+)
+
+
+class _MAC(_Object):
+    def __init__(self):
+        self.__dict__.update(("_" + name, value) for name, value in _MAC_DEFAULTS)
+
+
+class _Packet(_Object):
+    def __init__(self, sim=None):
+        self.sim = sim
+        self.src = self.dest = self.am_type = 0
+        self.len = 0
+        self.payload = b""
+        self.strength = 0
+
+    def setData(self, data):
+        self.payload = data[:MAX_PAYLOAD]
+        self.len = len(self.payload)
+
+    def data(self):
+        return self.payload
+
+    def deliver(self, node, when):
+        self.sim.schedule(when, _RECEIVE, node, self.src)
+
+    def deliverNow(self, node):
+        self.deliver(node, self.sim.now)
+
+
+class _Variable(_Object):
+    def __init__(self, name=None, *args):
+        self.name = name
+
+    def getData(self):
+        return 0
+
+
+class _Tossim(_Object):
+    def __init__(self, *args):
+        self.now = 0
+        self.current = 0
+        self.rng = random.Random()
+        self.queue = []
+        self.seq = 0
+        self.motes = {}
+        self.channels = {}
+        self.radio_obj = _Radio()
+        self.mac_obj = _MAC()
+
+    def schedule(self, when, kind, node, arg):
+        self.seq += 1
+        heapq.heappush(self.queue, (when, self.seq, kind, node, arg))
+
+    def mote(self, node):
+        mote = self.motes.get(node)
+        if mote is None:
+            mote = self.motes[node] = _Mote(self, node)
+        return mote
+
+    def dbg(self, channel, node, text):
+        files = self.channels.get(channel)
+        if files:
+            line = "DEBUG (%d): %s\n" % (node, text)
+            for f in files:
+                f.write(line)
+
+    def init(self):
+        self.rng.seed()
+
+    def randomSeed(self, seed):
+        self.rng.seed(seed)
+
+    def timeStr(self):
+        seconds = float(self.now) / TICKS_PER_SECOND
+        return "%d:%d:%.9f" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+    def addChannel(self, name, f):
+        self.channels.setdefault(name, []).append(f)
+        return True
+
+    def removeChannel(self, name, f):
+        files = self.channels.get(name, [])
+        if f in files:
+            files.remove(f)
+            return True
+        return False
+
+    def newPacket(self):
+        return _proxy("Packet", _Packet(self))
+
+    def runNextEvent(self):
+        if not self.queue:
+            return False
+        when, _, kind, node, arg = heapq.heappop(self.queue)
+        self.now = when
+        self.current = node
+        mote = self.mote(node)
+        if kind == _BOOT:
+            mote.on = True
+            self.dbg("boot", node, "Application booted.")
+            self.schedule(when + int(TIMER_PERIOD * TICKS_PER_SECOND), _TIMER, node, None)
+        elif kind == _TIMER:
+            if mote.on:
+                self.dbg("timer1", node, "Timer fired at time %s" % self.timeStr())
+                self.dbg("radio_send", node, "Sending packet from %d" % node)
+                arrival = when + int(TX_DELAY * TICKS_PER_SECOND)
+                radio = self.radio_obj
+                for dest, gain in radio.links.get(node, {}).items():
+                    receiver = self.motes.get(dest)
+                    if receiver is None or not receiver.on or gain < radio.sensitivity:
+                        continue
+                    if gain - receiver.generateNoise(arrival) >= SNR_THRESHOLD:
+                        self.schedule(arrival, _RECEIVE, dest, node)
+                self.schedule(when + int(TIMER_PERIOD * TICKS_PER_SECOND), _TIMER, node, None)
+        elif mote.on:
+            self.dbg("radio_rec", node, "Received packet from %d" % arg)
+        return True
+
+
+def _functions(prefix, cls, names):
+    module = sys.modules[__name__]
+    for name in names:
+        method = getattr(cls, name)
+        setattr(module, prefix + name, _unbound(method))
+
+
+def _unbound(method):
+    def call(this, *args):
+        return method(_this(this), *args)
+    return call
+
+
+def _accessors(prefix, cls, names):
+    # Plain getters and setters of the stored fields.
+    module = sys.modules[__name__]
+    for name, field, setter in names:
+        setattr(module, prefix + name, _getter(field))
+        if setter:
+            setattr(module, prefix + setter, _setter(field))
+
+
+def _getter(field):
+    def get(this):
+        return getattr(_this(this), field)
+    return get
+
+
+def _setter(field):
+    def set(this, value):
+        setattr(_this(this), field, value)
+    return set
+
+
+def _register(kind):
+    def register(cls):
+        _proxies[kind] = cls
+    return register
+
+
+def _constructor(cls):
+    def new(*args):
+        return cls(*args)
+    return new
+
+
+def _destructor(this):
+    pass
+
+
+for _kind, _cls in (("Tossim", _Tossim), ("Mote", _Mote), ("Radio", _Radio),
+                    ("MAC", _MAC), ("Packet", _Packet), ("Variable", _Variable),
+                    ("nesc_app_t", _Object), ("variable_string_t", _Object)):
+    setattr(sys.modules[__name__], "new_" + _kind, _constructor(_cls))
+    setattr(sys.modules[__name__], "delete_" + _kind, _destructor)
+    setattr(sys.modules[__name__], _kind + "_swigregister", _register(_kind))
+
+_functions("Tossim_", _Tossim, ("init", "randomSeed", "timeStr", "addChannel",
+                                "removeChannel", "newPacket", "runNextEvent"))
+_accessors("Tossim_", _Tossim, (("time", "now", "setTime"),
+                                ("currentNode", "current", "setCurrentNode")))
+_functions("Mote_", _Mote, ("addNoiseTraceReading", "createNoiseModel", "generateNoise",
+                            "bootAtTime", "turnOff", "turnOn"))
+_accessors("Mote_", _Mote, (("id", "node_id", None), ("euid", "euid", "setEuid"),
+                            ("bootTime", "boot_time", None), ("isOn", "on", None)))
+_functions("Radio_", _Radio, ("add", "gain", "connected", "remove", "setNoise",
+                              "setSensitivity"))
+_accessors("MAC_", _MAC, [(name, "_" + name, "set" + name[0].upper() + name[1:])
+                          for name, _ in _MAC_DEFAULTS])
+# The extension really does spell it this way.
+MAC_setBitsBerSymbol = MAC_setBitsPerSymbol
+_functions("Packet_", _Packet, ("setData", "data", "deliver", "deliverNow"))
+_accessors("Packet_", _Packet, (("source", "src", "setSource"),
+                                ("destination", "dest", "setDestination"),
+                                ("length", "len", "setLength"),
+                                ("type", "am_type", "setType"),
+                                ("strength", "strength", "setStrength")))
+_functions("Variable_", _Variable, ("getData",))
+
+for _kind, _fields in (("variable_string_t", ("type", "ptr", "len", "isArray")),
+                       ("nesc_app_t", ("numVariables", "variableNames",
+                                       "variableTypes", "variableArray"))):
+    _accessors(_kind + "_", _Object, [(f + "_get", f, f + "_set") for f in _fields])
+
+
+def Tossim_ticksPerSecond(this):
+    return TICKS_PER_SECOND
+
+
+def Tossim_getNode(this, node):
+    return _proxy("Mote", _this(this).mote(node))
+
+
+def Tossim_radio(this):
+    return _proxy("Radio", _this(this).radio_obj)
+
+
+def Tossim_mac(this):
+    return _proxy("MAC", _this(this).mac_obj)
+
+
+def Mote_getVariable(this, name):
+    return _proxy("Variable", _Variable(name))
+
+
+def Packet_maxLength(this):
+    return MAX_PAYLOAD
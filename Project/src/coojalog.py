@@ -0,0 +1,388 @@
+"""
+Parallel analysis of SenseNet Cooja logs.
+
+Reads logs in the format of resources/Cooja_log_file.txt ("mm:ss.mmm<TAB>
+ID:n<TAB>message", as saved from the Cooja Mote output window) and
+reports, for every sensor node:
+
+    generated       data messages the node originated (distinct msg_id)
+    delivered       of those, the ones the server (node 8) acknowledged
+    pdr             delivered / generated
+    retransmissions ACK timeouts ("[TIMER2] ... Going to retransmit")
+    copies          extra copies reaching the server: acks retransmitted
+                    plus duplicates discarded
+    discarded       duplicates the server suppressed
+    acked           messages whose ack made it back to the node
+    latency         first send by the node -> first arrival at the server
+    rtt             first send by the node -> first ack back at the node
+
+The log is split at line boundaries into chunks that a process pool
+parses independently; each chunk returns an Analysis of counters and
+mergeable latency histograms, and the partial analyses are merged in
+order.  A message is tracked by (node, msg_id) only while it is in
+flight: once its first send is older than STALE seconds it is settled,
+so a chunk keeps state for the messages of the last STALE seconds only
+and the 16-bit msg_id may wrap in long runs.  Messages sent in the
+first STALE seconds of a chunk, and arrivals or acks without a matching
+send there, are set aside and joined with the in-flight messages of the
+previous chunk when the two are merged.  Chunks are expected to span
+more than STALE seconds of log, which holds for any chunk size worth
+parallelising.
+
+    python coojalog.py ../resources/Cooja_log_file.txt
+    python coojalog.py long_run.txt --jobs 8 --chunk-mb 32
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+SERVER_NODE = 8
+STALE = 60.0
+CHUNK_SIZE = 32 * 1024 * 1024
+# Several minutes of log at SenseNet rates, well over STALE seconds.
+MIN_CHUNK_SIZE = 1024 * 1024
+
+_NUMBERS = re.compile(r"\d+")
+
+# Indices of an in-flight message entry.
+SENT, ARRIVED, ACKED = 0, 1, 2
+
+
+def seconds(stamp):
+    """"mm:ss.mmm" (or "h:mm:ss.mmm") to seconds."""
+    parts = stamp.split(":")
+    total = 0
+    for part in parts[:-1]:
+        total = total * 60 + int(part)
+    return total * 60 + float(parts[-1])
+
+
+class Latency(object):
+    """Millisecond histogram: count, mean, percentiles, max; mergeable."""
+
+    __slots__ = ("bins", "count", "total", "maximum")
+
+    def __init__(self):
+        self.bins = {}
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+
+    def add(self, value):
+        ms = int(round(value * 1000))
+        self.bins[ms] = self.bins.get(ms, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        for ms, n in other.bins.items():
+            self.bins[ms] = self.bins.get(ms, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.maximum is not None and (self.maximum is None or other.maximum > self.maximum):
+            self.maximum = other.maximum
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q):
+        """The q-th percentile (0-100) in seconds, to the millisecond."""
+        if not self.count:
+            return None
+        rank = max(1, int(-(-q * self.count // 100)))
+        seen = 0
+        for ms in sorted(self.bins):
+            seen += self.bins[ms]
+            if seen >= rank:
+                return ms / 1000.0
+        return self.maximum
+
+
+class NodeStats(object):
+    """Counters of one sensor node."""
+
+    COUNTERS = ("generated", "delivered", "acked", "retransmissions", "copies", "discarded")
+
+    __slots__ = COUNTERS + ("latency", "rtt")
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.latency = Latency()
+        self.rtt = Latency()
+
+    def merge(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latency.merge(other.latency)
+        self.rtt.merge(other.rtt)
+
+    @property
+    def pdr(self):
+        return self.delivered / float(self.generated) if self.generated else None
+
+
+class Analysis(object):
+    """Aggregates of a chunk of log, or of a whole log once merged."""
+
+    def __init__(self, server=SERVER_NODE, stale=STALE):
+        self.server = server
+        self.stale = stale
+        self.nodes = {}
+        self.lines = 0
+        self.malformed = 0
+        self.unmatched = 0
+        self.first = None
+        self.last = None
+        # (node, msg_id) -> [sent, arrived, acked] of messages in flight,
+        # and of the messages sent in the first stale seconds.
+        self.open = {}
+        self.head = {}
+        # (kind, key, time) of arrivals and acks near the start without a send.
+        self.orphans = []
+        self._swept = None
+
+    def node(self, node):
+        stats = self.nodes.get(node)
+        if stats is None:
+            stats = self.nodes[node] = NodeStats()
+        return stats
+
+    def feed(self, line):
+        """Account for one log line."""
+        try:
+            stamp, mote, text = line.split("\t", 2)
+            now = seconds(stamp)
+            node = int(mote[3:])
+        except ValueError:
+            self.malformed += 1
+            return
+        self.lines += 1
+        if self.first is None:
+            self.first = self._swept = now
+        self.last = now
+        if now - self._swept > self.stale / 4:
+            self._sweep(now)
+
+        if text.startswith("[RADIO_SEND]"):
+            if "a data message" in text:
+                _, msg_id, _, sender = [int(n) for n in _NUMBERS.findall(text)]
+                if sender == node:
+                    self._sent((node, msg_id), now)
+        elif text.startswith("[SERVER]"):
+            if text.startswith("[SERVER] Generating the ack"):
+                sender, msg_id = [int(n) for n in _NUMBERS.findall(text)]
+                self._event(ARRIVED, (sender, msg_id), now)
+            elif text.startswith("[SERVER] Retransmitting the ack"):
+                sender = int(_NUMBERS.findall(text)[0])
+                self.node(sender).copies += 1
+            elif "is a duplicate" in text:
+                sender = int(_NUMBERS.findall(text)[1])
+                stats = self.node(sender)
+                stats.copies += 1
+                stats.discarded += 1
+        elif text.startswith("[RADIO_REC]"):
+            if "Received ack for message" in text:
+                msg_id = int(_NUMBERS.findall(text)[1])
+                self._event(ACKED, (node, msg_id), now)
+        elif text.startswith("[TIMER2]") and "Going to retransmit" in text:
+            self.node(node).retransmissions += 1
+
+    def _sent(self, key, now):
+        entry = self.open.get(key)
+        if entry is not None:
+            # A retransmission, or the copy for the second gateway.
+            return
+        entry = [now, None, None]
+        if now - self.first <= self.stale:
+            self.head[key] = entry
+        self.open[key] = entry
+        self.node(key[0]).generated += 1
+
+    def _event(self, kind, key, now):
+        entry = self.open.get(key)
+        if entry is None:
+            if now - self.first <= self.stale:
+                self.orphans.append((kind, key, now))
+            else:
+                self.unmatched += 1
+        elif entry[kind] is None:
+            entry[kind] = now
+
+    def _sweep(self, now):
+        self._swept = now
+        for key in [key for key, entry in self.open.items() if now - entry[SENT] > self.stale]:
+            entry = self.open.pop(key)
+            if self.head.get(key) is not entry:
+                self._settle(key, entry)
+
+    def _settle(self, key, entry):
+        stats = self.node(key[0])
+        if entry[ARRIVED] is not None:
+            stats.delivered += 1
+            stats.latency.add(entry[ARRIVED] - entry[SENT])
+        if entry[ACKED] is not None:
+            stats.acked += 1
+            stats.rtt.add(entry[ACKED] - entry[SENT])
+
+    def merge(self, later):
+        """Fold the analysis of the chunk that follows this one into it."""
+        if later.first is None:
+            return self
+        if self.first is None:
+            self.first = later.first
+        tail = dict((key, entry) for key, entry in self.open.items()
+                    if self.head.get(key) is not entry)
+        for kind, key, when in later.orphans:
+            entry = tail.get(key)
+            if entry is None:
+                self.unmatched += 1
+            elif entry[kind] is None or when < entry[kind]:
+                entry[kind] = when
+        for key, entry in later.head.items():
+            earlier = tail.get(key)
+            if earlier is not None and entry[SENT] - earlier[SENT] <= self.stale:
+                # Still the message of the previous chunk.
+                later.node(key[0]).generated -= 1
+                for kind in (ARRIVED, ACKED):
+                    if earlier[kind] is None:
+                        earlier[kind] = entry[kind]
+            else:
+                self._settle(key, entry)
+            # Unless the msg_id wrapped and a newer message took the key.
+            if later.open.get(key) is entry:
+                del later.open[key]
+        for key, entry in tail.items():
+            self._settle(key, entry)
+        for node, stats in later.nodes.items():
+            self.node(node).merge(stats)
+        self.open = later.open
+        self.head = {}
+        self.lines += later.lines
+        self.malformed += later.malformed
+        self.unmatched += later.unmatched
+        self.last = later.last
+        return self
+
+    def finish(self):
+        """Settle every message still in flight at the end of the log."""
+        for key, entry in self.open.items():
+            self._settle(key, entry)
+        self.unmatched += len(self.orphans)
+        self.open, self.head, self.orphans = {}, {}, []
+        return self
+
+
+def chunks(path, size=CHUNK_SIZE):
+    """Byte ranges of about size bytes, ending at line boundaries."""
+    total = os.path.getsize(path)
+    ranges = []
+    f = open(path, "rb")
+    try:
+        start = 0
+        while start < total:
+            end = start + size
+            if end < total:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            end = min(end, total)
+            ranges.append((start, end))
+            start = end
+    finally:
+        f.close()
+    return ranges
+
+
+def analyze_chunk(args):
+    """Analysis of the lines of path between two byte offsets."""
+    path, start, end, server, stale = args
+    analysis = Analysis(server, stale)
+    f = open(path, "rb")
+    try:
+        f.seek(start)
+        data = f.read(end - start).decode("utf-8", "replace")
+    finally:
+        f.close()
+    feed = analysis.feed
+    for line in data.splitlines(True):
+        feed(line)
+    # Settle what went stale after the last sweep.
+    if analysis.last is not None:
+        analysis._sweep(analysis.last)
+    return analysis
+
+
+def analyze(path, jobs=None, chunk_size=CHUNK_SIZE, server=SERVER_NODE, stale=STALE):
+    """Analyse a whole log with a pool of jobs processes (1: in process)."""
+    chunk_size = max(chunk_size, MIN_CHUNK_SIZE)
+    tasks = [(path, start, end, server, stale) for start, end in chunks(path, chunk_size)]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(tasks))
+    if jobs <= 1:
+        partials = map(analyze_chunk, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs)
+        partials = pool.imap(analyze_chunk, tasks)
+    result = Analysis(server, stale)
+    try:
+        for partial in partials:
+            result = result.merge(partial)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return result.finish()
+
+
+def _ms(value):
+    return "-" if value is None else "%.0f" % (value * 1000)
+
+
+def report(analysis, out=sys.stdout):
+    out.write("%4s %9s %9s %7s %7s %7s %9s %7s %8s %8s %8s %8s %8s\n"
+              % ("node", "generated", "delivered", "pdr", "retx", "copies", "discarded", "acked",
+                 "lat_mean", "lat_p50", "lat_p95", "lat_max", "rtt_p95"))
+    for node in sorted(analysis.nodes):
+        s = analysis.nodes[node]
+        out.write("%4d %9d %9d %7s %7d %7d %9d %7d %8s %8s %8s %8s %8s\n"
+                  % (node, s.generated, s.delivered,
+                     "-" if s.pdr is None else "%.3f" % s.pdr,
+                     s.retransmissions, s.copies, s.discarded, s.acked,
+                     _ms(s.latency.mean), _ms(s.latency.percentile(50)),
+                     _ms(s.latency.percentile(95)), _ms(s.latency.maximum),
+                     _ms(s.rtt.percentile(95))))
+    out.write("latencies in ms; %d lines, %d malformed, %d unmatched arrivals/acks\n"
+              % (analysis.lines, analysis.malformed, analysis.unmatched))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delivery, retransmission and latency "
+                                     "statistics of a SenseNet Cooja log.")
+    parser.add_argument("log", help="Cooja log, e.g. ../resources/Cooja_log_file.txt")
+    parser.add_argument("--jobs", type=int, help="worker processes, default one per core")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_SIZE / 1048576.0)
+    parser.add_argument("--server", type=int, default=SERVER_NODE)
+    parser.add_argument("--stale", type=float, default=STALE,
+                        help="seconds after which a message is no longer in flight")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    analysis = analyze(args.log, args.jobs, int(args.chunk_mb * 1048576), args.server, args.stale)
+    elapsed = time.time() - start
+    report(analysis)
+    sys.stderr.write("%.2f s, %.0f lines/s\n" % (elapsed, analysis.lines / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
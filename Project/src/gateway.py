@@ -0,0 +1,361 @@
+"""
+Batching gateway from the Cooja serial-over-TCP feed to ThingSpeak MQTT.
+
+The Node-RED flow (node-red_flow.json) turns every fieldone/fieldtwo/
+fieldthree line of the server mote into its own "field1=...&MQTTPUBLISH=
+TRUE" message, one per reading, while a ThingSpeak channel only accepts
+one update every 15 seconds or so; most readings are then dropped or pile
+up.  This gateway reads the same feed (the serial socket server of mote
+8, localhost:60001) and parses the "[SERVER] Sending to NODE-RED the
+value V sent by node N." lines of SenseNetC.nc instead.  Readings go
+through a bounded queue into one pending update that merges the values
+of every sensor node, and a single multi-field update
+
+    field1=14&field2=92&field3=6&status=MQTTPUBLISH
+
+is published per interval.  Readings that arrive while an update is
+waiting for its slot are merged into it ("last" keeps the newest value
+of each field, "mean" and "max" combine them), so memory stays constant
+whatever the rate of the feed.  When the merger falls behind the queue
+fills up and the reader stops reading the socket, pushing back on Cooja.
+
+    python gateway.py --channel 2229789 --credentials credentials
+    python gateway.py --demo ../resources/Cooja_log_file.txt --interval 1
+
+--demo runs against local stand-ins: a TCP server replaying a Cooja log
+and an MQTT broker that prints what it receives.
+"""
+
+import argparse
+import asyncio
+import re
+import struct
+import sys
+import time
+
+FIELDS = {1: 1, 3: 2, 5: 3}
+MERGES = ("last", "mean", "max")
+DEFAULT_INTERVAL = 15.0
+
+_SERVER_LINE = re.compile(r"\[SERVER\] Sending to NODE-RED the value (\d+) sent by node (\d+)")
+
+_U16 = struct.Struct(">H")
+CONNECT, CONNACK, PUBLISH, PINGREQ, PINGRESP, DISCONNECT = 1, 2, 3, 12, 13, 14
+
+
+def parse_line(line):
+    """Return (node, value) of a [SERVER] reading line, or None.
+
+    Lines may carry the "mm:ss.mmm<TAB>ID:n<TAB>" prefix of a Cooja log.
+    """
+    m = _SERVER_LINE.search(line)
+    if m is None:
+        return None
+    return int(m.group(2)), int(m.group(1))
+
+
+def read_credentials(path):
+    """Read the "ID: ..." and "pw: ..." lines of a credentials file."""
+    values = {}
+    f = open(path, "r")
+    try:
+        for line in f:
+            key, sep, value = line.partition(":")
+            if sep:
+                values[key.strip().lower()] = value.strip()
+    finally:
+        f.close()
+    return values.get("id"), values.get("pw")
+
+
+class Update(object):
+    """The pending multi-field update, merging readings per field."""
+
+    def __init__(self, fields=FIELDS, merge="last"):
+        if merge not in MERGES:
+            raise ValueError("unknown merge %r, expected one of %s" % (merge, ", ".join(MERGES)))
+        self.fields = fields
+        self.merge = merge
+        self.values = {}
+        self.readings = 0
+
+    def add(self, node, value):
+        field = self.fields.get(node)
+        if field is None:
+            return False
+        old = self.values.get(field)
+        if old is None or self.merge == "last":
+            self.values[field] = (value, 1)
+        elif self.merge == "max":
+            self.values[field] = (max(old[0], value), 1)
+        else:
+            self.values[field] = (old[0] + value, old[1] + 1)
+        self.readings += 1
+        return True
+
+    def take(self):
+        """Return the payload of the pending update and start a new one."""
+        if not self.values:
+            return None
+        parts = []
+        for field in sorted(self.values):
+            total, count = self.values[field]
+            if count > 1:
+                parts.append("field%d=%s" % (field, ("%.2f" % (total / float(count))).rstrip("0")
+                                             .rstrip(".")))
+            else:
+                parts.append("field%d=%d" % (field, total))
+        self.values = {}
+        self.readings = 0
+        return "&".join(parts) + "&status=MQTTPUBLISH"
+
+
+def _packet(kind, flags, body):
+    length, n = bytearray(), len(body)
+    while True:
+        byte, n = n & 0x7f, n >> 7
+        length.append(byte | 0x80 if n else byte)
+        if not n:
+            break
+    return bytes(bytearray([kind << 4 | flags])) + bytes(length) + body
+
+
+def _string(text):
+    data = text.encode("utf-8")
+    return _U16.pack(len(data)) + data
+
+
+async def _read_packet(reader):
+    try:
+        first = (await reader.readexactly(1))[0]
+        length = shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return first >> 4, first & 0x0f, body
+
+
+class MQTTPublisher(object):
+    """Publish-only MQTT 3.1.1 client with username/password login."""
+
+    def __init__(self, client_id, username=None, password=None, keepalive=60):
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.reader = self.writer = None
+        self._tasks = []
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        flags = 0x02
+        payload = _string(self.client_id)
+        if self.username is not None:
+            flags |= 0x80
+            payload += _string(self.username)
+        if self.password is not None:
+            flags |= 0x40
+            payload += _string(self.password)
+        body = _string("MQTT") + bytes(bytearray([4, flags])) + _U16.pack(self.keepalive)
+        self.writer.write(_packet(CONNECT, 0, body + payload))
+        await self.writer.drain()
+        reply = await _read_packet(self.reader)
+        if reply is None or reply[0] != CONNACK or reply[2][1:2] != b"\x00":
+            raise ConnectionError("MQTT connection refused: %r" % (reply,))
+        self._tasks = [asyncio.ensure_future(self._ping()), asyncio.ensure_future(self._discard())]
+
+    async def _ping(self):
+        while True:
+            await asyncio.sleep(self.keepalive / 2.0)
+            self.writer.write(_packet(PINGREQ, 0, b""))
+
+    async def _discard(self):
+        # Nothing is subscribed; PINGRESPs are read only so they don't pile up.
+        while await _read_packet(self.reader) is not None:
+            pass
+
+    async def publish(self, topic, payload):
+        """Send one QoS 0 message; waits while the socket is backed up."""
+        self.writer.write(_packet(PUBLISH, 0, _string(topic) + payload.encode("utf-8")))
+        await self.writer.drain()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.writer is not None:
+            self.writer.write(_packet(DISCONNECT, 0, b""))
+            self.writer.close()
+            self.writer = None
+
+
+class Gateway(object):
+    """Cooja TCP lines in, one rate-limited ThingSpeak update per interval out."""
+
+    def __init__(self, publisher, topic, interval=DEFAULT_INTERVAL, queue_size=1024,
+                 fields=FIELDS, merge="last"):
+        self.publisher = publisher
+        self.topic = topic
+        self.interval = interval
+        self.queue = asyncio.Queue(queue_size)
+        self.update = Update(fields, merge)
+        self.lines = 0
+        self.readings = 0
+        self.published = 0
+        self.merged = 0
+
+    async def read(self, reader):
+        """Parse lines until EOF, blocking on the queue when it is full."""
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self.lines += 1
+            reading = parse_line(line.decode("utf-8", "replace"))
+            if reading is not None:
+                self.readings += 1
+                await self.queue.put(reading)
+        await self.queue.put(None)
+
+    async def merge(self):
+        while True:
+            reading = await self.queue.get()
+            if reading is None:
+                break
+            if self.update.add(*reading):
+                self.merged += 1
+
+    async def publish(self, stop):
+        """Publish the pending update every interval until stop is set."""
+        next_slot = time.time()
+        while True:
+            delay = next_slot - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(asyncio.shield(stop.wait()), delay)
+                except asyncio.TimeoutError:
+                    pass
+            final = stop.is_set()
+            payload = self.update.take()
+            if payload is not None:
+                await self.publisher.publish(self.topic, payload)
+                self.published += 1
+                next_slot = time.time() + self.interval
+            elif not final:
+                next_slot = time.time() + min(self.interval, 0.1)
+            if final:
+                break
+
+    async def run(self, host, port):
+        """Relay the feed at host:port until it closes; flush the last update."""
+        reader, writer = await asyncio.open_connection(host, port)
+        stop = asyncio.Event()
+        publisher = asyncio.ensure_future(self.publish(stop))
+        try:
+            await asyncio.gather(self.read(reader), self.merge())
+        finally:
+            writer.close()
+            stop.set()
+            await publisher
+
+
+async def serve_log(path, host="127.0.0.1", port=60001, rate=None):
+    """Stand-in for the Cooja serial socket server: replay a Cooja log.
+
+    The "time<TAB>ID:n<TAB>" prefixes are stripped; rate is in lines/s.
+    """
+    f = open(path, "r")
+    try:
+        lines = [line.rstrip("\n").split("\t")[-1] + "\n" for line in f]
+    finally:
+        f.close()
+
+    async def handle(reader, writer):
+        for i, line in enumerate(lines):
+            writer.write(line.encode("utf-8"))
+            if rate:
+                await writer.drain()
+                await asyncio.sleep(1.0 / rate)
+            elif i % 256 == 0:
+                await writer.drain()
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def serve_sink(host="127.0.0.1", port=1883, on_publish=None):
+    """Stand-in MQTT broker that accepts any login and collects publishes."""
+
+    async def handle(reader, writer):
+        while True:
+            message = await _read_packet(reader)
+            if message is None or message[0] == DISCONNECT:
+                break
+            kind, _, body = message
+            if kind == CONNECT:
+                writer.write(_packet(CONNACK, 0, b"\x00\x00"))
+            elif kind == PINGREQ:
+                writer.write(_packet(PINGRESP, 0, b""))
+            elif kind == PUBLISH and on_publish is not None:
+                (size,) = _U16.unpack_from(body)
+                on_publish(body[2:2 + size].decode("utf-8"), body[2 + size:].decode("utf-8"))
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def run(args):
+    servers = []
+    if args.demo:
+        servers.append(await serve_log(args.demo, args.host, args.port, args.rate))
+        servers.append(await serve_sink(args.broker, args.broker_port,
+                                        lambda topic, payload: print(topic, payload)))
+    client_id = username = password = None
+    if args.credentials:
+        client_id, password = read_credentials(args.credentials)
+        username = client_id
+    publisher = MQTTPublisher(client_id or "sensenet-gateway", username, password)
+    await publisher.connect(args.broker, args.broker_port)
+    gateway = Gateway(publisher, "channels/%s/publish" % args.channel, args.interval,
+                      args.queue_size, merge=args.merge)
+    start = time.time()
+    try:
+        await gateway.run(args.host, args.port)
+    finally:
+        await publisher.close()
+        for server in servers:
+            server.close()
+    print("%d lines, %d readings merged into %d updates in %.1f s"
+          % (gateway.lines, gateway.merged, gateway.published, time.time() - start))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cooja to ThingSpeak MQTT gateway.")
+    parser.add_argument("--host", default="localhost", help="Cooja serial socket server")
+    parser.add_argument("--port", type=int, default=60001)
+    parser.add_argument("--broker", default="mqtt3.thingspeak.com")
+    parser.add_argument("--broker-port", type=int, default=1883)
+    parser.add_argument("--channel", default="2229789")
+    parser.add_argument("--credentials", help='file with "ID: ..." and "pw: ..." lines')
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between updates (ThingSpeak rate limit)")
+    parser.add_argument("--merge", choices=MERGES, default="last")
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--demo", metavar="COOJA_LOG",
+                        help="replay COOJA_LOG through local TCP and MQTT stand-ins")
+    parser.add_argument("--rate", type=float, help="demo feed rate in lines/s")
+    args = parser.parse_args(argv)
+    if args.demo:
+        args.host = args.broker = "127.0.0.1"
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
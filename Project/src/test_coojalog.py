@@ -0,0 +1,82 @@
+"""
+Chunked analysis of a long log must match the analysis of the log as one
+chunk.  The log is Cooja_log_file.txt repeated with shifted times, so
+every msg_id comes back once per copy, as when the 16-bit msg_id wraps.
+
+    python -m unittest test_coojalog
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from coojalog import Analysis, NodeStats, analyze_chunk, chunks
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources",
+                   "Cooja_log_file.txt")
+COPIES = 10
+# Longer than one copy of the log, so a chunk sees msg_ids come back.
+COPY_SECONDS = 210
+
+
+def write_copies(path, copies=COPIES):
+    f = open(LOG, "r")
+    try:
+        lines = f.read().splitlines(True)
+    finally:
+        f.close()
+    out = open(path, "w")
+    try:
+        for k in range(copies):
+            for line in lines:
+                stamp, rest = line.split("\t", 1)
+                minutes, secs = stamp.split(":")
+                t = int(minutes) * 60 + float(secs) + COPY_SECONDS * k
+                out.write("%02d:%06.3f\t%s" % (t // 60, t % 60, rest))
+    finally:
+        out.close()
+
+
+def analyze_in_chunks(path, size):
+    result = Analysis()
+    for start, end in chunks(path, size):
+        result = result.merge(analyze_chunk((path, start, end, result.server, result.stale)))
+    return result.finish()
+
+
+def summary(analysis):
+    nodes = {}
+    for node, stats in analysis.nodes.items():
+        nodes[node] = tuple(getattr(stats, name) for name in NodeStats.COUNTERS) + (
+            stats.latency.bins, stats.rtt.bins)
+    return nodes, analysis.lines, analysis.unmatched
+
+
+class ChunkedAnalysisTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(prefix="coojalog_")
+        cls.path = os.path.join(cls.tmp, "copies.txt")
+        write_copies(cls.path)
+        cls.whole = summary(analyze_in_chunks(cls.path, os.path.getsize(cls.path)))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_whole_log(self):
+        nodes, lines, unmatched = self.whole
+        self.assertEqual(lines, 7758 * COPIES)
+        self.assertEqual(unmatched, 0)
+        self.assertEqual(nodes[2][:2], (70 * COPIES, 70 * COPIES))
+
+    def test_chunks_match_whole_log(self):
+        # About 5 minutes of log per chunk.
+        for size in (1000 * 1000, 1500 * 1000):
+            self.assertEqual(summary(analyze_in_chunks(self.path, size)), self.whole)
+
+
+if __name__ == "__main__":
+    unittest.main()